@@ -1,7 +1,9 @@
 import os
+from datetime import datetime, timedelta
 
 from cfgv import ValidationError
 from django.http import HttpResponse
+from django.utils import timezone
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import serializers, status
 from rest_framework.permissions import IsAuthenticated
@@ -11,11 +13,27 @@ from rest_framework.views import APIView
 from apps.containers.services.container_storage import (
     ContainerStorageService,
 )
-from apps.core.choices import ContainerSize, TransportType, ContainerState
+from apps.containers.services.container_storage_batch import (
+    ASSIGN_SERVICES,
+    BATCH_ACTIONS,
+    DISPATCH,
+    MAX_BATCH_VISITS,
+    PATCH,
+    PATCH_FIELDS,
+    ContainerStorageBatchService,
+)
+from apps.containers.services.dwell_estimator import DwellEstimatorService
+from apps.core.choices import (
+    ContainerCategory,
+    ContainerSize,
+    TransportType,
+    ContainerState,
+)
 from apps.core.models import Container
 from apps.core.pagination import LimitOffsetPagination, get_paginated_response
 from apps.core.utils import inline_serializer
 from apps.customers.models import Company
+from apps.customers.services import ContractPriceService
 
 
 class ContainerStorageRegisterApi(APIView):
@@ -27,6 +45,9 @@ class ContainerStorageRegisterApi(APIView):
         container_state = serializers.ChoiceField(
             required=True, choices=ContainerState.choices
         )
+        category = serializers.ChoiceField(
+            required=False, choices=ContainerCategory.choices
+        )
         container_owner = serializers.CharField(required=True, allow_blank=True)
         product_name = serializers.CharField(
             required=True, allow_null=True, allow_blank=True
@@ -40,7 +61,8 @@ class ContainerStorageRegisterApi(APIView):
         notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
         services = inline_serializer(
             fields={
-                "id": serializers.IntegerField(),
+                "id": serializers.IntegerField(required=False),
+                "service_id": serializers.IntegerField(required=False),
                 "date_from": serializers.DateTimeField(required=False),
                 "date_to": serializers.DateTimeField(required=False, allow_null=True),
             },
@@ -48,6 +70,16 @@ class ContainerStorageRegisterApi(APIView):
             required=True,
         )
 
+        def validate_services(self, services):
+            if any(
+                not service.get("id") and not service.get("service_id")
+                for service in services
+            ):
+                raise serializers.ValidationError(
+                    "Every service needs either an id or a service_id."
+                )
+            return services
+
         def validate_container_size(self, container_size: str) -> str:
             if container_size not in dict(ContainerSize.choices).keys():
                 raise serializers.ValidationError("Invalid container size")
@@ -76,6 +108,7 @@ class ContainerStorageRegisterApi(APIView):
             }
         )
         container_state = serializers.CharField(read_only=True)
+        category = serializers.CharField(read_only=True)
         transport_type = serializers.CharField(read_only=True)
         transport_number = serializers.CharField(read_only=True)
         product_name = serializers.CharField(read_only=True)
@@ -88,8 +121,12 @@ class ContainerStorageRegisterApi(APIView):
             }
         )
         entry_time = serializers.DateTimeField(read_only=True)
+        expected_exit_time = serializers.SerializerMethodField()
         notes = serializers.CharField(read_only=True)
 
+        def get_expected_exit_time(self, obj) -> datetime | None:
+            return DwellEstimatorService().get_expected_exit_time(obj)
+
     @extend_schema(
         summary="Register container entry",
         request=ContainerStorageRegisterSerializer,
@@ -334,8 +371,10 @@ class ContainerStorageListApi(APIView):
         )
 
         container_state = serializers.CharField(read_only=True)
+        category = serializers.CharField(read_only=True)
         entry_time = serializers.DateTimeField(read_only=True)
         exit_time = serializers.DateTimeField(read_only=True)
+        expected_exit_time = serializers.SerializerMethodField()
         storage_days = serializers.IntegerField(read_only=True)
         notes = serializers.CharField(read_only=True)
         free_days = serializers.IntegerField(
@@ -343,7 +382,11 @@ class ContainerStorageListApi(APIView):
         )
         services = serializers.SerializerMethodField(method_name="get_services")
 
+        def get_expected_exit_time(self, obj) -> datetime | None:
+            return DwellEstimatorService().get_expected_exit_time(obj)
+
         def get_services(self, obj):
+            prices = self.context["prices"]
             services = []
             for service in obj.services.all():
                 services.append(
@@ -359,7 +402,7 @@ class ContainerStorageListApi(APIView):
                             "unit_of_measure": service.contract_service.service.service_type.unit_of_measure,
                         },
                         "base_price": service.contract_service.service.base_price,
-                        "price": service.contract_service.price,
+                        "price": prices.get_instance_price(service),
                     }
                 )
             return services
@@ -382,13 +425,14 @@ class ContainerStorageListApi(APIView):
         container_storages = ContainerStorageService().get_all_containers_visits(
             filters=filters_serializer.validated_data
         )
-        return get_paginated_response(
-            pagination_class=self.Pagination,
-            serializer_class=self.ContainerStorageListSerializer,
-            queryset=container_storages,
-            request=request,
-            view=self,
+        paginator = self.Pagination()
+        page = paginator.paginate_queryset(container_storages, request, view=self)
+        serializer = self.ContainerStorageListSerializer(
+            page,
+            many=True,
+            context={"prices": ContractPriceService().load_visits(page)},
         )
+        return paginator.get_paginated_response(serializer.data)
 
 
 class ContainerStorageDetailApi(APIView):
@@ -431,8 +475,10 @@ class ContainerStorageDetailApi(APIView):
         )
 
         container_state = serializers.CharField(read_only=True)
+        category = serializers.CharField(read_only=True)
         entry_time = serializers.DateTimeField(read_only=True)
         exit_time = serializers.DateTimeField(read_only=True)
+        expected_exit_time = serializers.SerializerMethodField()
         storage_days = serializers.IntegerField(read_only=True)
         notes = serializers.CharField(read_only=True)
         free_days = serializers.IntegerField(
@@ -440,7 +486,11 @@ class ContainerStorageDetailApi(APIView):
         )
         services = serializers.SerializerMethodField(method_name="get_services")
 
+        def get_expected_exit_time(self, obj) -> datetime | None:
+            return DwellEstimatorService().get_expected_exit_time(obj)
+
         def get_services(self, obj):
+            prices = self.context["prices"]
             services = []
             for service in obj.services.all():
                 services.append(
@@ -456,7 +506,7 @@ class ContainerStorageDetailApi(APIView):
                             "unit_of_measure": service.contract_service.service.service_type.unit_of_measure,
                         },
                         "base_price": service.contract_service.service.base_price,
-                        "price": service.contract_service.price,
+                        "price": prices.get_instance_price(service),
                     }
                 )
             return services
@@ -469,7 +519,12 @@ class ContainerStorageDetailApi(APIView):
         container_storage_service = ContainerStorageService()
         container_storage = container_storage_service.get_container_visit(visit_id)
         return Response(
-            self.ContainerStorageDetailSerializer(container_storage).data,
+            self.ContainerStorageDetailSerializer(
+                container_storage,
+                context={
+                    "prices": ContractPriceService().load_visits([container_storage])
+                },
+            ).data,
             status=status.HTTP_200_OK,
         )
 
@@ -495,7 +550,10 @@ class ContainerStorageDispatchApi(APIView):
         )
         return Response(
             ContainerStorageDetailApi.ContainerStorageDetailSerializer(
-                container_storage
+                container_storage,
+                context={
+                    "prices": ContractPriceService().load_visits([container_storage])
+                },
             ).data,
             status=status.HTTP_200_OK,
         )
@@ -506,7 +564,8 @@ class ContainerStorageAvailableServicesApi(APIView):
         pass
 
     class ContainerStorageAvailableServicesOutputSerializer(serializers.Serializer):
-        id = serializers.IntegerField(read_only=True)
+        id = serializers.IntegerField(read_only=True, allow_null=True)
+        service_id = serializers.IntegerField(source="service.id", read_only=True)
         name = serializers.CharField(source="service.name", read_only=True)
         description = serializers.CharField(
             read_only=True, source="service.description"
@@ -549,6 +608,192 @@ class ContainerStorageAvailableServicesApi(APIView):
         )
 
 
+class ContainerStorageAvailableServicesBulkApi(APIView):
+    class FilterSerializer(serializers.Serializer):
+        visit_ids = serializers.ListField(
+            child=serializers.IntegerField(), min_length=1, max_length=100
+        )
+
+    class ContainerStorageAvailableServicesBulkOutputSerializer(serializers.Serializer):
+        visit_id = serializers.IntegerField(read_only=True)
+        services = ContainerStorageAvailableServicesApi.ContainerStorageAvailableServicesOutputSerializer(
+            many=True, read_only=True
+        )
+
+    @extend_schema(
+        summary="Get available services for a page of container visits",
+        parameters=[FilterSerializer],
+        responses=ContainerStorageAvailableServicesBulkOutputSerializer(many=True),
+    )
+    def get(self, request):
+        serializer = self.FilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        visit_ids = serializer.validated_data["visit_ids"]
+        services = ContainerStorageService().get_available_services_bulk(visit_ids)
+        return Response(
+            self.ContainerStorageAvailableServicesBulkOutputSerializer(
+                [
+                    {"visit_id": visit_id, "services": services[visit_id]}
+                    for visit_id in dict.fromkeys(visit_ids)
+                ],
+                many=True,
+            ).data
+        )
+
+
+class ContainerStorageBatchApi(APIView):
+    class ContainerStorageBatchFilterSerializer(
+        ContainerStorageListApi.FilterSerializer
+    ):
+        status = serializers.ChoiceField(
+            choices=["in_terminal", "left_terminal", "all"], required=False
+        )
+
+    class ContainerStorageBatchSerializer(serializers.Serializer):
+        visit_ids = serializers.ListField(
+            child=serializers.IntegerField(),
+            required=False,
+            max_length=MAX_BATCH_VISITS,
+        )
+        filters = serializers.DictField(required=False)
+        action = serializers.ChoiceField(choices=BATCH_ACTIONS)
+        services = inline_serializer(
+            many=True,
+            required=False,
+            fields={
+                "service_id": serializers.IntegerField(),
+                "date_from": serializers.DateField(required=False),
+                "date_to": serializers.DateField(required=False, allow_null=True),
+            },
+        )
+        exit_time = serializers.DateTimeField(required=False)
+        exit_transport_type = serializers.ChoiceField(
+            choices=TransportType.choices, required=False
+        )
+        exit_transport_number = serializers.CharField(required=False)
+        container_owner = serializers.CharField(required=False, allow_blank=True)
+        product_name = serializers.CharField(required=False, allow_blank=True)
+        container_state = serializers.ChoiceField(
+            choices=ContainerState.choices, required=False
+        )
+        category = serializers.ChoiceField(
+            choices=ContainerCategory.choices, required=False
+        )
+        notes = serializers.CharField(required=False, allow_blank=True)
+
+        def validate_filters(self, value):
+            serializer = ContainerStorageBatchApi.ContainerStorageBatchFilterSerializer(
+                data=value
+            )
+            serializer.is_valid(raise_exception=True)
+            return serializer.validated_data
+
+        def validate(self, attrs):
+            if bool(attrs.get("visit_ids")) == bool(attrs.get("filters")):
+                raise serializers.ValidationError(
+                    {"visit_ids": ["Select visits either by id or by filters."]}
+                )
+            action = attrs["action"]
+            if action == ASSIGN_SERVICES and not attrs.get("services"):
+                raise serializers.ValidationError(
+                    {"services": ["Required to assign services."]}
+                )
+            if action == DISPATCH:
+                missing = [
+                    field
+                    for field in (
+                        "exit_time",
+                        "exit_transport_type",
+                        "exit_transport_number",
+                    )
+                    if field not in attrs
+                ]
+                if missing:
+                    raise serializers.ValidationError(
+                        {field: ["Required to dispatch."] for field in missing}
+                    )
+            if action == PATCH and not any(field in attrs for field in PATCH_FIELDS):
+                raise serializers.ValidationError(
+                    {"action": [f"A patch sets one of {', '.join(PATCH_FIELDS)}."]}
+                )
+            return attrs
+
+    class ContainerStorageBatchOutputSerializer(serializers.Serializer):
+        action = serializers.CharField()
+        applied = serializers.IntegerField()
+        skipped = serializers.IntegerField()
+        results = inline_serializer(
+            many=True,
+            fields={
+                "visit_id": serializers.IntegerField(),
+                "status": serializers.CharField(),
+                "reason": serializers.CharField(allow_null=True),
+            },
+        )
+
+    @extend_schema(
+        summary="Apply one action to many container visits",
+        description=(
+            "Visits are picked by visit_ids or by the filters of the visit list. "
+            "The action assigns services, dispatches the visits or patches their "
+            "fields, all in one transaction, and every visit gets an outcome."
+        ),
+        request=ContainerStorageBatchSerializer,
+        responses=ContainerStorageBatchOutputSerializer,
+    )
+    def post(self, request):
+        serializer = self.ContainerStorageBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        result = ContainerStorageBatchService().run(
+            data["action"],
+            data,
+            visit_ids=data.get("visit_ids"),
+            filters=data.get("filters"),
+        )
+        return Response(
+            self.ContainerStorageBatchOutputSerializer(result).data,
+            status=status.HTTP_200_OK,
+        )
+
+
+class ContainerStorageExpectedExitApi(APIView):
+    class ContainerStorageProfileSerializer(serializers.Serializer):
+        company_id = serializers.IntegerField(required=False)
+        container_size = serializers.ChoiceField(choices=ContainerSize.choices)
+        container_state = serializers.ChoiceField(choices=ContainerState.choices)
+        transport_type = serializers.ChoiceField(
+            choices=TransportType.choices, required=False
+        )
+        product_name = serializers.CharField(required=False, allow_blank=True)
+        entry_time = serializers.DateTimeField(required=False)
+
+    class ContainerStorageExpectedExitOutputSerializer(serializers.Serializer):
+        expected_dwell_days = serializers.FloatField(read_only=True, allow_null=True)
+        expected_exit_time = serializers.DateTimeField(read_only=True, allow_null=True)
+
+    @extend_schema(
+        summary="Expected exit of a container before it is registered",
+        parameters=[ContainerStorageProfileSerializer],
+        responses=ContainerStorageExpectedExitOutputSerializer,
+    )
+    def get(self, request):
+        serializer = self.ContainerStorageProfileSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        entry_time = serializer.validated_data.pop("entry_time", timezone.now())
+        days = DwellEstimatorService().estimate_days(serializer.validated_data)
+        data = {
+            "expected_dwell_days": days,
+            "expected_exit_time": (
+                entry_time + timedelta(days=days) if days is not None else None
+            ),
+        }
+        return Response(
+            self.ContainerStorageExpectedExitOutputSerializer(data).data,
+            status=status.HTTP_200_OK,
+        )
+
+
 class ContainerStorageListByCustomerApi(APIView):
     class Pagination(LimitOffsetPagination):
         default_limit = 10
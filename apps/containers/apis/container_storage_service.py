@@ -30,9 +30,7 @@ class ContainerStorageServicesApi(APIView):
             decimal_places=2,
             read_only=True,
         )
-        price = serializers.DecimalField(
-            source="contract_service.price", max_digits=10, decimal_places=2
-        )
+        price = serializers.DecimalField(max_digits=10, decimal_places=2)
 
     def get(self, request, visit_id):
         services = ContainerStorageService().get_services(visit_id)
@@ -46,7 +44,15 @@ class ContainerStorageServicesCreateApi(APIView):
         date_from = serializers.DateField(required=False)
         date_to = serializers.DateField(required=False, allow_null=True)
         notes = serializers.CharField(required=False)
-        id = serializers.IntegerField()
+        id = serializers.IntegerField(required=False)
+        service_id = serializers.IntegerField(required=False)
+
+        def validate(self, attrs):
+            if not attrs.get("id") and not attrs.get("service_id"):
+                raise serializers.ValidationError(
+                    "Either id or service_id is required."
+                )
+            return attrs
 
     def post(self, request, visit_id):
         serializer = self.ContainerStorageServicesCreateSerializer(
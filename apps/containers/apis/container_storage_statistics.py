@@ -3,9 +3,17 @@ from rest_framework import serializers
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from apps.containers.services.company_dashboard import CompanyDashboardService
+from apps.containers.services.container_occupancy import (
+    DAY,
+    GROUP_FIELDS,
+    INTERVALS,
+    ContainerOccupancyService,
+)
 from apps.containers.services.container_storage_statistics import (
     ContainerStorageStatisticsService,
 )
+from apps.containers.services.dwell_statistics import DwellStatisticsService
 from apps.core.utils import inline_serializer
 
 
@@ -34,3 +42,112 @@ class ContainerStorageStatisticsApi(APIView):
         container_storage_service = ContainerStorageStatisticsService()
         statistics = container_storage_service.get_container_storage_statistics()
         return Response(self.ContainerStorageStatisticsSerializer(statistics).data)
+
+
+class ContainerOccupancyApi(APIView):
+    class FilterSerializer(serializers.Serializer):
+        date_from = serializers.DateField()
+        date_to = serializers.DateField()
+        interval = serializers.ChoiceField(choices=INTERVALS, default=DAY)
+        group_by = serializers.ChoiceField(
+            choices=list(GROUP_FIELDS), required=False, allow_null=True
+        )
+        company_id = serializers.IntegerField(required=False)
+
+    class ContainerOccupancyOutputSerializer(serializers.Serializer):
+        interval = serializers.CharField()
+        date_from = serializers.DateField()
+        date_to = serializers.DateField()
+        points = serializers.ListField(child=serializers.DateTimeField())
+        total = serializers.ListField(child=serializers.IntegerField())
+        groups = inline_serializer(
+            fields={
+                "key": serializers.CharField(),
+                "teu": serializers.ListField(child=serializers.IntegerField()),
+            },
+            many=True,
+        )
+
+    @extend_schema(
+        summary="TEU on the terminal per day or hour over a period",
+        parameters=[FilterSerializer],
+        responses=ContainerOccupancyOutputSerializer,
+    )
+    def get(self, request, *args, **kwargs):
+        serializer = self.FilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        series = ContainerOccupancyService().get_series(**serializer.validated_data)
+        return Response(self.ContainerOccupancyOutputSerializer(series).data)
+
+
+class DwellStatisticsApi(APIView):
+    class FilterSerializer(serializers.Serializer):
+        date_from = serializers.DateField()
+        date_to = serializers.DateField()
+        company_id = serializers.IntegerField(required=False)
+
+    class DwellStatisticsOutputSerializer(serializers.Serializer):
+        company_id = serializers.IntegerField(allow_null=True)
+        date_from = serializers.DateField()
+        date_to = serializers.DateField()
+        months = inline_serializer(
+            fields={
+                "month": serializers.DateField(),
+                "sizes": inline_serializer(
+                    fields={
+                        "container_size": serializers.CharField(),
+                        "count": serializers.IntegerField(),
+                        "p50": serializers.FloatField(),
+                        "p90": serializers.FloatField(),
+                        "p99": serializers.FloatField(),
+                    },
+                    many=True,
+                ),
+            },
+            many=True,
+        )
+
+    @extend_schema(
+        summary="Monthly dwell-day percentiles per container size",
+        parameters=[FilterSerializer],
+        responses=DwellStatisticsOutputSerializer,
+    )
+    def get(self, request, *args, **kwargs):
+        serializer = self.FilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        statistics = DwellStatisticsService().get_statistics(
+            **serializer.validated_data
+        )
+        return Response(self.DwellStatisticsOutputSerializer(statistics).data)
+
+
+class CompanyDashboardApi(APIView):
+    class CompanyDashboardOutputSerializer(serializers.Serializer):
+        company_id = serializers.IntegerField()
+        period_days = serializers.IntegerField()
+        in_terminal = serializers.IntegerField()
+        teu_in_terminal = serializers.IntegerField()
+        arrivals = serializers.IntegerField()
+        dispatches = serializers.IntegerField()
+        average_dwell_days = serializers.FloatField(allow_null=True)
+        overdue = serializers.IntegerField()
+        accrued_charges = serializers.DecimalField(max_digits=14, decimal_places=2)
+        watchlist_computed_at = serializers.DateTimeField(allow_null=True)
+        active_contract = inline_serializer(
+            fields={
+                "id": serializers.IntegerField(),
+                "name": serializers.CharField(),
+                "start_date": serializers.DateField(),
+                "end_date": serializers.DateField(allow_null=True),
+                "free_days": serializers.IntegerField(allow_null=True),
+            },
+            allow_null=True,
+        )
+
+    @extend_schema(
+        summary="Key figures of a company",
+        responses=CompanyDashboardOutputSerializer,
+    )
+    def get(self, request, company_id):
+        dashboard = CompanyDashboardService().get_dashboard(company_id)
+        return Response(self.CompanyDashboardOutputSerializer(dashboard).data)
@@ -0,0 +1,59 @@
+from drf_spectacular.utils import extend_schema
+from rest_framework import serializers
+from rest_framework.views import APIView
+
+from apps.containers.services.free_days_watchlist import FreeDaysWatchlistService
+from apps.core.pagination import LimitOffsetPagination, get_paginated_response
+from apps.core.utils import inline_serializer
+
+
+class FreeDaysWatchlistApi(APIView):
+    class Pagination(LimitOffsetPagination):
+        default_limit = 50
+        max_limit = 100
+
+    class FilterSerializer(serializers.Serializer):
+        company_id = serializers.IntegerField(required=False)
+        within_days = serializers.IntegerField(min_value=0, default=0)
+
+    class FreeDaysWatchlistOutputSerializer(serializers.Serializer):
+        visit_id = serializers.IntegerField(read_only=True)
+        company = inline_serializer(
+            fields={
+                "id": serializers.IntegerField(read_only=True),
+                "name": serializers.CharField(read_only=True),
+            }
+        )
+        contract_id = serializers.IntegerField(read_only=True, allow_null=True)
+        container_name = serializers.CharField(read_only=True)
+        container_size = serializers.CharField(read_only=True)
+        container_state = serializers.CharField(read_only=True)
+        category = serializers.CharField(read_only=True)
+        entry_time = serializers.DateTimeField(read_only=True)
+        storage_days = serializers.IntegerField(read_only=True)
+        free_days = serializers.IntegerField(read_only=True)
+        overdue_days = serializers.IntegerField(read_only=True)
+        daily_rate = serializers.DecimalField(
+            max_digits=12, decimal_places=2, read_only=True
+        )
+        accrued_charge = serializers.DecimalField(
+            max_digits=14, decimal_places=2, read_only=True
+        )
+        computed_at = serializers.DateTimeField(read_only=True)
+
+    @extend_schema(
+        summary="In-terminal containers past their free days or close to it",
+        parameters=[FilterSerializer],
+        responses=FreeDaysWatchlistOutputSerializer(many=True),
+    )
+    def get(self, request):
+        serializer = self.FilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        queryset = FreeDaysWatchlistService().get_watchlist(**serializer.validated_data)
+        return get_paginated_response(
+            pagination_class=self.Pagination,
+            serializer_class=self.FreeDaysWatchlistOutputSerializer,
+            queryset=queryset,
+            request=request,
+            view=self,
+        )
@@ -0,0 +1,28 @@
+import factory
+from django.utils import timezone
+
+from apps.containers.models import ContainerStorage
+from apps.core.choices import ContainerSize, ContainerState, TransportType
+from apps.core.models import Container
+from apps.customers.factories import CompanyFactory
+
+
+class ContainerFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = Container
+        django_get_or_create = ("name",)
+
+    name = factory.Sequence(lambda n: f"TEST{n:07d}")
+    size = ContainerSize.TWENTY
+
+
+class ContainerStorageFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = ContainerStorage
+
+    container = factory.SubFactory(ContainerFactory)
+    company = factory.SubFactory(CompanyFactory)
+    container_state = ContainerState.LOADED
+    transport_type = TransportType.WAGON
+    transport_number = factory.Sequence(lambda n: f"{n:08d}")
+    entry_time = factory.LazyFunction(timezone.now)
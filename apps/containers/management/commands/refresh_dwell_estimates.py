@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+
+from apps.containers.services.dwell_estimator import DwellEstimatorService
+
+
+class Command(BaseCommand):
+    help = "Recompute expected dwell times from finished container visits"
+
+    def handle(self, *args, **kwargs):
+        estimates = DwellEstimatorService().refresh()
+        self.stdout.write(
+            self.style.SUCCESS(f"Stored {len(estimates)} dwell estimates.")
+        )
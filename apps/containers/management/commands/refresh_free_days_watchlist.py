@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+
+from apps.containers.services.free_days_watchlist import FreeDaysWatchlistService
+
+
+class Command(BaseCommand):
+    help = "Recompute free days and overdue charges of containers in the terminal"
+
+    def handle(self, *args, **kwargs):
+        entries = FreeDaysWatchlistService().refresh()
+        self.stdout.write(
+            self.style.SUCCESS(f"Stored {len(entries)} watchlist entries.")
+        )
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.7 on 2026-10-19 10:54
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('containers', '0008_alter_containerserviceinstance_options_and_more'),
+        ('customers', '0008_companycontract_free_days'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DwellEstimate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.PositiveSmallIntegerField()),
+                ('container_size', models.CharField(blank=True, default='', max_length=4)),
+                ('container_state', models.CharField(blank=True, default='', max_length=10)),
+                ('transport_type', models.CharField(blank=True, default='', max_length=255)),
+                ('product_name', models.CharField(blank=True, default='', max_length=255)),
+                ('median_days', models.FloatField()),
+                ('sample_size', models.PositiveIntegerField()),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('company', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='dwell_estimates', to='customers.company')),
+            ],
+            options={
+                'verbose_name': 'Dwell Estimate',
+                'verbose_name_plural': 'Dwell Estimates',
+                'db_table': 'dwell_estimate',
+            },
+        ),
+    ]
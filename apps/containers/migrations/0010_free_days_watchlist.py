@@ -0,0 +1,47 @@
+# Generated by Django 5.0.7 on 2026-10-19 11:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('containers', '0009_dwell_estimate'),
+        ('customers', '0008_companycontract_free_days'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='containerstorage',
+            name='category',
+            field=models.CharField(choices=[('import', 'Import'), ('export', 'Export'), ('transit', 'Transit')], default='import', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='FreeDaysWatchlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('container_name', models.CharField(max_length=12)),
+                ('container_size', models.CharField(max_length=4)),
+                ('container_state', models.CharField(max_length=10)),
+                ('category', models.CharField(max_length=10)),
+                ('entry_time', models.DateTimeField()),
+                ('storage_days', models.IntegerField()),
+                ('free_days', models.PositiveIntegerField()),
+                ('overdue_days', models.IntegerField()),
+                ('daily_rate', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('accrued_charge', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='watchlist_entries', to='customers.company')),
+                ('contract', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='customers.companycontract')),
+                ('visit', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='watchlist_entry', to='containers.containerstorage')),
+            ],
+            options={
+                'verbose_name': 'Free Days Watchlist Entry',
+                'verbose_name_plural': 'Free Days Watchlist',
+                'db_table': 'free_days_watchlist',
+                'indexes': [models.Index(fields=['overdue_days'], name='free_days_w_overdue_a18a69_idx'), models.Index(fields=['company', 'overdue_days'], name='free_days_w_company_1672c9_idx')],
+            },
+        ),
+    ]
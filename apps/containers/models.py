@@ -1,11 +1,45 @@
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
-from apps.core.choices import TransportType, ContainerState
+from apps.core.choices import ContainerCategory, TransportType, ContainerState
 from apps.core.models import BaseModel, Container
-from apps.customers.models import ContractService
+from apps.customers.models import COMPANY_DASHBOARD_STAMP_KEY, ContractService
+
+# Stamp of the cached dwell statistics of a company (or "all") and exit month.
+DWELL_STATISTICS_STAMP_KEY = "dwell_statistics_stamp:{company}:{month}"
+
+
+def get_dwell_statistics_stamp_keys(company_id, exit_time):
+    """
+    Stamp keys of the cached dwell statistics a finished visit contributes to.
+    """
+    # Assigned values are only converted on save, so strings can show up here.
+    exit_time = models.DateTimeField().to_python(exit_time)
+    if exit_time is None:
+        return []
+    if timezone.is_naive(exit_time):
+        exit_time = timezone.make_aware(exit_time)
+    month = timezone.localtime(exit_time).strftime("%Y-%m")
+    return [
+        DWELL_STATISTICS_STAMP_KEY.format(company=company, month=month)
+        for company in (company_id, "all")
+    ]
+
+
+def get_counter_state(visit):
+    """
+    Company a visit counts for and whether it counts as in the terminal.
+    """
+    return visit.__dict__.get("company_id"), visit.__dict__.get("exit_time") is None
 
 
 class ContainerStorage(BaseModel):
@@ -21,6 +55,12 @@ class ContainerStorage(BaseModel):
         blank=True,
     )
     container_state = models.CharField(choices=ContainerState.choices, max_length=10)
+    # Picks the free days of the contract along with size and state.
+    category = models.CharField(
+        choices=ContainerCategory.choices,
+        max_length=10,
+        default=ContainerCategory.IMPORT,
+    )
     company = models.ForeignKey(
         "customers.Company", on_delete=models.CASCADE, related_name="container_visits"
     )
@@ -70,6 +110,17 @@ class ContainerStorage(BaseModel):
         if self.exit_time and self.exit_time < self.entry_time:
             raise ValidationError(_("Exit time must be after entry time."))
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_exit_time = instance.__dict__.get("exit_time")
+        instance.loaded_counter_state = get_counter_state(instance)
+        instance.loaded_company_id = instance.__dict__.get("company_id")
+        instance.loaded_dwell_stamp_keys = get_dwell_statistics_stamp_keys(
+            instance.__dict__.get("company_id"), instance.__dict__.get("exit_time")
+        )
+        return instance
+
     def save(self, *args, **kwargs):
         self.clean()
         if self.container_location:
@@ -147,3 +198,204 @@ class ContainerServiceInstance(BaseModel):
 
     def __str__(self):
         return f"{self.contract_service.service} for {self.container_storage.container} at {self.performed_at}"
+
+
+class DwellEstimate(models.Model):
+    """
+    Median dwell of finished visits sharing a profile. ``level`` is the number of
+    profile fields that were matched; coarser levels back up the finer ones.
+    """
+
+    level = models.PositiveSmallIntegerField()
+    company = models.ForeignKey(
+        "customers.Company",
+        on_delete=models.CASCADE,
+        related_name="dwell_estimates",
+        null=True,
+        blank=True,
+    )
+    container_size = models.CharField(max_length=4, blank=True, default="")
+    container_state = models.CharField(max_length=10, blank=True, default="")
+    transport_type = models.CharField(max_length=255, blank=True, default="")
+    product_name = models.CharField(max_length=255, blank=True, default="")
+    median_days = models.FloatField()
+    sample_size = models.PositiveIntegerField()
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "dwell_estimate"
+        verbose_name = "Dwell Estimate"
+        verbose_name_plural = "Dwell Estimates"
+
+    def __str__(self):
+        return f"{self.median_days} days ({self.sample_size} visits)"
+
+
+class FreeDaysWatchlistEntry(models.Model):
+    """
+    In-terminal visit with its free days and overdue days as of ``computed_at``;
+    rebuilt nightly by ``refresh_free_days_watchlist``. Negative ``overdue_days``
+    count the days left before the free days run out.
+    """
+
+    visit = models.OneToOneField(
+        ContainerStorage, on_delete=models.CASCADE, related_name="watchlist_entry"
+    )
+    company = models.ForeignKey(
+        "customers.Company",
+        on_delete=models.CASCADE,
+        related_name="watchlist_entries",
+    )
+    contract = models.ForeignKey(
+        "customers.CompanyContract",
+        on_delete=models.SET_NULL,
+        related_name="+",
+        null=True,
+        blank=True,
+    )
+    container_name = models.CharField(max_length=12)
+    container_size = models.CharField(max_length=4)
+    container_state = models.CharField(max_length=10)
+    category = models.CharField(max_length=10)
+    entry_time = models.DateTimeField()
+    storage_days = models.IntegerField()
+    free_days = models.PositiveIntegerField()
+    overdue_days = models.IntegerField()
+    daily_rate = models.DecimalField(max_digits=12, decimal_places=2)
+    accrued_charge = models.DecimalField(max_digits=14, decimal_places=2)
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "free_days_watchlist"
+        verbose_name = "Free Days Watchlist Entry"
+        verbose_name_plural = "Free Days Watchlist"
+        indexes = [
+            models.Index(fields=["overdue_days"]),
+            models.Index(fields=["company", "overdue_days"]),
+        ]
+
+    def __str__(self):
+        return f"{self.container_name} - {self.overdue_days} days overdue"
+
+
+@receiver(post_save, sender=ContainerStorage)
+@receiver(post_delete, sender=ContainerStorage)
+def invalidate_dwell_statistics(sender, instance, **kwargs):
+    # Covers the month the visit left in before this change as well.
+    keys = get_dwell_statistics_stamp_keys(instance.company_id, instance.exit_time)
+    cache.delete_many(set(keys) | set(getattr(instance, "loaded_dwell_stamp_keys", [])))
+    instance.loaded_dwell_stamp_keys = keys
+
+
+def update_company_counters(visit, old_state, new_state, activity=None):
+    """
+    Move a visit's share of the company counters from ``old_state`` to
+    ``new_state``, either of which is ``None`` for a visit that is not counted,
+    with one ``UPDATE`` per company involved.
+    """
+    from apps.locations.services.stack_model import get_columns_needed
+
+    teu = get_columns_needed(visit.container.size)
+    deltas = defaultdict(Counter)
+    for state, sign in ((old_state, -1), (new_state, 1)):
+        if state is None:
+            continue
+        company_id, in_terminal = state
+        deltas[company_id]["visits_count"] += sign
+        if in_terminal:
+            deltas[company_id]["visits_in_terminal"] += sign
+            deltas[company_id]["teu_in_terminal"] += sign * teu
+
+    apply_company_counters(
+        deltas, {new_state[0]: activity} if new_state and activity is not None else {}
+    )
+
+
+def apply_company_counters(deltas, activity=None):
+    """
+    Add ``{company_id: Counter}`` deltas to the company counters and move their
+    last activity forward to ``{company_id: moment}``, with one ``UPDATE`` per
+    company involved. Counters stop at zero, so drift left to the reconciliation
+    never makes a visit fail to save.
+    """
+    from apps.customers.models import Company
+
+    activity = activity or {}
+    for company_id in deltas.keys() | activity.keys():
+        changes = {
+            field: F(field) + value if value > 0 else Greatest(F(field) + value, 0)
+            for field, value in deltas.get(company_id, {}).items()
+            if value
+        }
+        moment = models.DateTimeField().to_python(activity.get(company_id))
+        if moment is not None:
+            if timezone.is_naive(moment):
+                moment = timezone.make_aware(moment)
+            value = Value(moment, output_field=models.DateTimeField())
+            changes["last_activity_at"] = Greatest(
+                Coalesce("last_activity_at", value), value
+            )
+        if changes:
+            Company.objects.filter(id=company_id).update(**changes)
+
+
+@receiver(post_save, sender=ContainerStorage)
+def count_saved_visit(sender, instance, created, **kwargs):
+    old = getattr(instance, "loaded_counter_state", None)
+    new = get_counter_state(instance)
+    instance.loaded_counter_state = new
+    # Visits saved without being loaded first are left to the reconciliation.
+    if (old is None and not created) or old == new:
+        return
+    update_company_counters(
+        instance, old, new, instance.entry_time if new[1] else instance.exit_time
+    )
+
+
+@receiver(post_delete, sender=ContainerStorage)
+def count_deleted_visit(sender, instance, **kwargs):
+    old = getattr(instance, "loaded_counter_state", None)
+    update_company_counters(instance, old or get_counter_state(instance), None)
+
+
+@receiver(post_save, sender=Container)
+def count_resized_container(sender, instance, created, **kwargs):
+    """
+    Move the TEU of the container's visits in the terminal to its new size, which
+    every later change of those visits counts with.
+    """
+    from apps.locations.services.stack_model import get_columns_needed
+
+    old_size = getattr(instance, "loaded_size", None)
+    instance.loaded_size = instance.size
+    if created or old_size is None:
+        return
+    teu = get_columns_needed(instance.size) - get_columns_needed(old_size)
+    if not teu:
+        return
+    deltas = defaultdict(Counter)
+    for company_id in ContainerStorage.objects.filter(
+        container=instance, exit_time__isnull=True
+    ).values_list("company_id", flat=True):
+        deltas[company_id]["teu_in_terminal"] += teu
+    apply_company_counters(deltas)
+    cache.delete_many(
+        [
+            COMPANY_DASHBOARD_STAMP_KEY.format(company=company_id)
+            for company_id in deltas
+        ]
+    )
+
+
+@receiver(post_save, sender=ContainerStorage)
+@receiver(post_delete, sender=ContainerStorage)
+def invalidate_company_dashboard(sender, instance, **kwargs):
+    # Covers the company the visit belonged to before this change as well.
+    companies = {instance.company_id, getattr(instance, "loaded_company_id", None)}
+    cache.delete_many(
+        [
+            COMPANY_DASHBOARD_STAMP_KEY.format(company=company_id)
+            for company_id in companies - {None}
+        ]
+    )
+    instance.loaded_company_id = instance.company_id
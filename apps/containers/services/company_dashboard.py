@@ -0,0 +1,111 @@
+import uuid
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import (
+    Avg,
+    Case,
+    Count,
+    DecimalField,
+    Max,
+    Q,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+
+from apps.containers.models import ContainerStorage
+from apps.containers.services.dwell_statistics import DWELL
+from apps.customers.models import COMPANY_DASHBOARD_STAMP_KEY, Company
+from apps.customers.services import ActiveContractService
+from apps.locations.services.stack_model import TWENTY_FOOT_SIZES
+
+PERIOD_DAYS = 30
+# The period slides with time, so figures are never kept for long.
+COMPANY_DASHBOARD_CACHE_TIMEOUT = 60 * 5
+
+
+class CompanyDashboardService:
+    """
+    The figures of a company page: boxes and TEU in the terminal, arrivals,
+    dispatches and average dwell over the last ``PERIOD_DAYS`` days, and the
+    overdue boxes and accrued storage charges of the free-days watchlist as of
+    its last refresh, next to the active contract.
+
+    The visit figures are conditional aggregates of one query over the
+    company's visits and the contract comes from ``ActiveContractService``; the
+    company itself is only looked up when the figures are not cached. The result is cached per
+    company under a stamp cleared whenever one of its visits or contracts
+    changes or the watchlist is refreshed.
+    """
+
+    def get_dashboard(self, company_id, now=None):
+        key = f"company_dashboard:{company_id}:{self._get_stamp(company_id)}"
+        dashboard = cache.get(key)
+        if dashboard is None:
+            company = get_object_or_404(Company.objects.only("id"), id=company_id)
+            dashboard = {
+                "company_id": company.id,
+                **self.get_visit_figures(company.id, now),
+                "active_contract": self.get_active_contract(company.id),
+            }
+            cache.set(key, dashboard, COMPANY_DASHBOARD_CACHE_TIMEOUT)
+        return dashboard
+
+    def get_visit_figures(self, company_id, now=None):
+        now = now or timezone.now()
+        since = now - timedelta(days=PERIOD_DAYS)
+        in_terminal = Q(exit_time__isnull=True)
+        dispatched = Q(exit_time__gte=since, exit_time__lte=now)
+        figures = ContainerStorage.objects.filter(company_id=company_id).aggregate(
+            in_terminal=Count("id", filter=in_terminal),
+            teu_in_terminal=Coalesce(
+                Sum(
+                    Case(
+                        When(container__size__in=TWENTY_FOOT_SIZES, then=1), default=2
+                    ),
+                    filter=in_terminal,
+                ),
+                0,
+            ),
+            arrivals=Count("id", filter=Q(entry_time__gte=since, entry_time__lte=now)),
+            dispatches=Count("id", filter=dispatched),
+            average_dwell=Avg(DWELL, filter=dispatched),
+            overdue=Count(
+                "id", filter=in_terminal & Q(watchlist_entry__overdue_days__gt=0)
+            ),
+            accrued_charges=Coalesce(
+                Sum("watchlist_entry__accrued_charge", filter=in_terminal),
+                Value(0),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ),
+            watchlist_computed_at=Max("watchlist_entry__computed_at"),
+        )
+        average_dwell = figures.pop("average_dwell")
+        figures["average_dwell_days"] = (
+            round(average_dwell.total_seconds() / 86400, 2)
+            if average_dwell is not None
+            else None
+        )
+        figures["period_days"] = PERIOD_DAYS
+        return figures
+
+    def get_active_contract(self, company_id):
+        contract = ActiveContractService().get_active_contract(company_id)
+        if contract is None:
+            return None
+        return {
+            field: contract[field]
+            for field in ("id", "name", "start_date", "end_date", "free_days")
+        }
+
+    def _get_stamp(self, company_id):
+        stamp_key = COMPANY_DASHBOARD_STAMP_KEY.format(company=company_id)
+        stamp = cache.get(stamp_key)
+        if stamp is None:
+            cache.add(stamp_key, uuid.uuid4().hex, None)
+            stamp = cache.get(stamp_key)
+        return stamp
@@ -1,7 +1,8 @@
+from collections import defaultdict
 from typing import List, Dict, Any
 
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import F
 from django.shortcuts import get_object_or_404
 from rest_framework.exceptions import ValidationError
 
@@ -10,11 +11,16 @@ from apps.containers.models import (
     ContainerStorage,
     ContainerServiceInstance,
 )
-from apps.core.choices import ContainerSize, ContainerState
+from apps.core.choices import ContainerCategory
 from apps.core.services.container import ContainerService
-from apps.customers.models import ContractService
-from apps.customers.services import CompanyService
-from apps.locations.services import ContainerLocationService
+from apps.customers.services import (
+    ActiveContractService,
+    CompanyService,
+    ContractPriceService,
+    ContractServiceMatrixService,
+    ContractTariffService,
+)
+from apps.locations.services.container_location import ContainerLocationService
 
 
 class ContainerStorageService:
@@ -95,7 +101,7 @@ class ContainerStorageService:
         filters = filters or {}
 
         qs = ContainerStorage.objects.select_related(
-            "container", "company"
+            "container", "company", "contract"
         ).prefetch_related(
             "images",
             "documents",
@@ -114,7 +120,7 @@ class ContainerStorageService:
     def get_all_containers_visits_by_company(self, company_id, filters=None):
         filters = filters or {}
         qs = ContainerStorage.objects.filter(company_id=company_id).select_related(
-            "container", "company"
+            "container", "company", "contract"
         )
 
         status = filters.pop("status", "all")
@@ -143,34 +149,62 @@ class ContainerStorageService:
     def get_services(self, visit_id):
         visit = self.get_container_visit(visit_id)
 
-        return ContainerServiceInstance.objects.filter(container_storage=visit)
+        services = list(
+            ContainerServiceInstance.objects.filter(
+                container_storage=visit
+            ).select_related("contract_service__service__service_type")
+        )
+        # The price a service was performed at, not the contract's current one.
+        prices = ContractPriceService()
+        for service in services:
+            service.price = prices.get_instance_price(service)
+        return services
 
     def get_available_services(self, visit_id):
-        visit = self.get_container_visit(visit_id)
-        active_contract = visit.company.contracts.filter(is_active=True).first()
+        visit = get_object_or_404(self._get_service_profiles(), id=visit_id)
+        return self._get_available_services([visit])[visit_id]
+
+    def get_available_services_bulk(self, visit_ids):
+        """
+        Services of their company's active contract that apply to each visit's
+        container size and state, minus one-time services it already used.
+        """
+        visits = list(self._get_service_profiles().filter(id__in=visit_ids))
+        missing = sorted(set(visit_ids) - {visit["id"] for visit in visits})
+        if missing:
+            raise ValidationError({"visit_ids": [f"Visits {missing} do not exist."]})
+        return self._get_available_services(visits)
+
+    def _get_service_profiles(self):
+        return ContainerStorage.objects.values(
+            "id", "company_id", "container_state", container_size=F("container__size")
+        )
+
+    def _get_available_services(self, visits):
+        used = defaultdict(set)
+        for visit_id, service_id in ContainerServiceInstance.objects.filter(
+            container_storage_id__in=[visit["id"] for visit in visits],
+            contract_service__service__multiple_usage=False,
+        ).values_list("container_storage_id", "contract_service__service_id"):
+            used[visit_id].add(service_id)
 
-        container_services = ContractService.objects.filter(
-            container_instance_services__container_storage=visit,
+        contract_ids = ActiveContractService().get_active_contract_ids(
+            {visit["company_id"] for visit in visits}
         )
-        services_for_one_time = container_services.filter(
-            service__multiple_usage=False
-        ).values_list("id", flat=True)
-
-        services = (
-            ContractService.objects.exclude(id__in=services_for_one_time)
-            .filter(
-                contract=active_contract,
-            )
-            .filter(
-                Q(service__container_size=visit.container.size)
-                | Q(service__container_size=ContainerSize.ANY),
-                Q(service__container_state=visit.container_state)
-                | Q(service__container_state=ContainerState.ANY),
-            )
-            .distinct()
+        matrices = ContractServiceMatrixService().get_matrices(
+            set(contract_ids.values())
         )
-
-        return services
+        result = {}
+        for visit in visits:
+            matrix = matrices[contract_ids[visit["company_id"]]]
+            result[visit["id"]] = [
+                service
+                for service in matrix.get(
+                    (visit["container_size"], visit["container_state"]), []
+                )
+                if service["service"]["id"] not in used[visit["id"]]
+            ]
+        return result
 
     def create_service_instances(self, visit_id, services):
         visit = self.get_container_visit(visit_id)
@@ -196,6 +230,7 @@ class ContainerStorageService:
             transport_type=data["transport_type"],
             transport_number=data["transport_number"],
             container_state=data["container_state"],
+            category=data.get("category", ContainerCategory.IMPORT),
             entry_time=data["entry_time"],
             notes=data.get("notes", ""),
             exit_time=data.get("exit_time", None),
@@ -203,10 +238,35 @@ class ContainerStorageService:
         )
 
     def _create_service_instances(self, storage_entry, services):
+        contract_service_ids = self._get_contract_service_ids(storage_entry, services)
         for service in services:
+            service_id = service.pop("service_id", None)
             ContainerServiceInstance.objects.create(
-                contract_service_id=service.pop("id"),
+                contract_service_id=service.pop("id", None)
+                or contract_service_ids[service_id],
                 container_storage=storage_entry,
                 date_from=service.pop("date_from", None),
                 date_to=service.pop("date_to", None),
             )
+
+    def _get_contract_service_ids(self, storage_entry, services):
+        """
+        Contract services of the terminal services picked by ``service_id``,
+        under the visit's contract or its company's active one.
+        """
+        service_ids = {
+            service["service_id"] for service in services if service.get("service_id")
+        }
+        if not service_ids:
+            return {}
+        contract_id = (
+            storage_entry.contract_id
+            or ActiveContractService().get_active_contract_ids(
+                [storage_entry.company_id]
+            )[storage_entry.company_id]
+        )
+        if contract_id is None:
+            raise ValidationError({"services": ["The company has no active contract."]})
+        return ContractTariffService().get_contract_service_ids(
+            contract_id, service_ids
+        )
@@ -0,0 +1,235 @@
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from apps.containers.filters import ContainerStorageFilter
+from apps.containers.models import (
+    ContainerServiceInstance,
+    ContainerStorage,
+    apply_company_counters,
+    get_dwell_statistics_stamp_keys,
+)
+from apps.containers.services.container_storage import ContainerStorageService
+from apps.core.choices import YardChangeAction
+from apps.customers.models import COMPANY_DASHBOARD_STAMP_KEY
+from apps.customers.services import ActiveContractService, ContractTariffService
+from apps.locations.models import (
+    ContainerLocation,
+    YardChange,
+    bump_yard_versions,
+    sequence_yard_changes_on_commit,
+)
+from apps.locations.services.stack_model import get_columns_needed
+
+ASSIGN_SERVICES = "assign_services"
+DISPATCH = "dispatch"
+PATCH = "patch"
+BATCH_ACTIONS = (ASSIGN_SERVICES, DISPATCH, PATCH)
+# Fields a patch may set; none of them feeds counters, statistics or the yard.
+PATCH_FIELDS = (
+    "container_owner",
+    "product_name",
+    "container_state",
+    "category",
+    "notes",
+)
+MAX_BATCH_VISITS = 1000
+
+APPLIED = "applied"
+SKIPPED = "skipped"
+
+
+class ContainerStorageBatchService:
+    """
+    One action applied to many visits, picked by id or by the filters of the
+    visit list: assigning services, dispatching or patching fields.
+
+    The visits are read in one query and locked, each action writes with
+    set-based ``UPDATE`` and ``bulk_create`` statements, and all of it runs in
+    one transaction. Those statements send no signals, so the company counters,
+    the cached dwell statistics and dashboards and the yard change feed are
+    kept up to date here. Every visit gets an outcome: applied, or skipped with
+    the reason.
+    """
+
+    def run(self, action, data, visit_ids=None, filters=None):
+        with transaction.atomic():
+            visits, outcomes = self.get_visits(visit_ids, filters)
+            if action == ASSIGN_SERVICES:
+                outcomes.update(self.assign_services(visits, data["services"]))
+            elif action == DISPATCH:
+                outcomes.update(self.dispatch(visits, data))
+            else:
+                outcomes.update(self.patch(visits, data))
+
+        results = [
+            {"visit_id": visit_id, "status": status, "reason": reason}
+            for visit_id, (status, reason) in outcomes.items()
+        ]
+        return {
+            "action": action,
+            "applied": sum(result["status"] == APPLIED for result in results),
+            "skipped": sum(result["status"] == SKIPPED for result in results),
+            "results": results,
+        }
+
+    def get_visits(self, visit_ids=None, filters=None):
+        """
+        The selected visits, locked, and outcomes of ids that do not exist.
+        """
+        if visit_ids:
+            ids = list(dict.fromkeys(visit_ids))
+        else:
+            filters = dict(filters or {})
+            queryset = ContainerStorage.objects.all()
+            status = filters.pop("status", "all")
+            if status == "in_terminal":
+                queryset = queryset.filter(exit_time__isnull=True)
+            elif status == "left_terminal":
+                queryset = queryset.filter(exit_time__isnull=False)
+            # Filters on services join many rows per visit.
+            ids = list(
+                dict.fromkeys(
+                    ContainerStorageFilter(filters, queryset=queryset)
+                    .qs.order_by("id")
+                    .values_list("id", flat=True)
+                )
+            )
+        if len(ids) > MAX_BATCH_VISITS:
+            raise ValidationError(
+                {"visits": [f"A batch is limited to {MAX_BATCH_VISITS} visits."]}
+            )
+
+        found = {
+            visit["id"]: visit
+            for visit in ContainerStorage.objects.filter(id__in=ids)
+            .select_for_update(of=("self",))
+            .values(
+                "id",
+                "company_id",
+                "contract_id",
+                "container_state",
+                "container_location_id",
+                "entry_time",
+                "exit_time",
+                container_size=F("container__size"),
+            )
+        }
+        # Outcomes follow the order of the selection.
+        outcomes = {
+            visit_id: None
+            if visit_id in found
+            else (SKIPPED, "The visit does not exist.")
+            for visit_id in ids
+        }
+        return [found[visit_id] for visit_id in ids if visit_id in found], outcomes
+
+    def assign_services(self, visits, services):
+        """
+        Add terminal services to every visit whose contract offers them for its
+        size and state, leaving out one-time services a visit already used.
+        """
+        available = ContainerStorageService().get_available_services_bulk(
+            [visit["id"] for visit in visits]
+        )
+        contract_ids = ActiveContractService().get_active_contract_ids(
+            {visit["company_id"] for visit in visits}
+        )
+        requested = {service["service_id"]: service for service in services}
+
+        outcomes, assignments = {}, defaultdict(list)
+        for visit in visits:
+            contract_id = visit["contract_id"] or contract_ids[visit["company_id"]]
+            offered = {entry["service"]["id"] for entry in available[visit["id"]]}
+            service_ids = [
+                service_id for service_id in requested if service_id in offered
+            ]
+            if contract_id is None:
+                outcomes[visit["id"]] = (SKIPPED, "The company has no active contract.")
+            elif not service_ids:
+                outcomes[visit["id"]] = (SKIPPED, "No requested service is available.")
+            else:
+                assignments[contract_id].append((visit["id"], service_ids))
+                outcomes[visit["id"]] = (APPLIED, None)
+
+        instances = []
+        tariffs = ContractTariffService()
+        for contract_id, visit_services in assignments.items():
+            contract_service_ids = tariffs.get_contract_service_ids(
+                contract_id,
+                {
+                    service_id
+                    for _, service_ids in visit_services
+                    for service_id in service_ids
+                },
+            )
+            instances.extend(
+                ContainerServiceInstance(
+                    container_storage_id=visit_id,
+                    contract_service_id=contract_service_ids[service_id],
+                    date_from=requested[service_id].get("date_from"),
+                    date_to=requested[service_id].get("date_to"),
+                )
+                for visit_id, service_ids in visit_services
+                for service_id in service_ids
+            )
+        ContainerServiceInstance.objects.bulk_create(instances, batch_size=1000)
+        return outcomes
+
+    def dispatch(self, visits, data):
+        exit_time = data["exit_time"]
+        outcomes, dispatched = {}, []
+        for visit in visits:
+            if visit["exit_time"] is not None:
+                outcomes[visit["id"]] = (SKIPPED, "The visit was already dispatched.")
+            elif exit_time < visit["entry_time"]:
+                outcomes[visit["id"]] = (SKIPPED, "Exit time must be after entry time.")
+            else:
+                dispatched.append(visit)
+                outcomes[visit["id"]] = (APPLIED, None)
+        if not dispatched:
+            return outcomes
+
+        ContainerStorage.objects.filter(
+            id__in=[visit["id"] for visit in dispatched]
+        ).update(
+            exit_time=exit_time,
+            exit_transport_type=data["exit_transport_type"],
+            exit_transport_number=data["exit_transport_number"],
+            updated_at=timezone.now(),
+        )
+
+        deltas = defaultdict(Counter)
+        for visit in dispatched:
+            delta = deltas[visit["company_id"]]
+            delta["visits_in_terminal"] -= 1
+            delta["teu_in_terminal"] -= get_columns_needed(visit["container_size"])
+        apply_company_counters(deltas, dict.fromkeys(deltas, exit_time))
+
+        locations = ContainerLocation.objects.filter(
+            id__in=[visit["container_location_id"] for visit in dispatched]
+        )
+        changes = YardChange.objects.bulk_create(
+            YardChange.from_location(location, YardChangeAction.DISPATCHED)
+            for location in locations
+        )
+        sequence_yard_changes_on_commit()
+        bump_yard_versions([change.yard_id for change in changes])
+
+        stamp_keys = set()
+        for company_id in deltas:
+            stamp_keys.update(get_dwell_statistics_stamp_keys(company_id, exit_time))
+            stamp_keys.add(COMPANY_DASHBOARD_STAMP_KEY.format(company=company_id))
+        transaction.on_commit(lambda: cache.delete_many(stamp_keys))
+        return outcomes
+
+    def patch(self, visits, data):
+        changes = {field: data[field] for field in PATCH_FIELDS if field in data}
+        ContainerStorage.objects.filter(
+            id__in=[visit["id"] for visit in visits]
+        ).update(**changes, updated_at=timezone.now())
+        return {visit["id"]: (APPLIED, None) for visit in visits}
@@ -0,0 +1,155 @@
+import statistics
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.containers.models import ContainerStorage, DwellEstimate
+
+DWELL_ESTIMATES_CACHE_KEY = "dwell_estimates_stamp"
+# Only finished visits this recent describe today's customers.
+HISTORY_DAYS = 365
+# Groups with fewer finished visits are too noisy and fall back to a coarser one.
+MIN_SAMPLE_SIZE = 5
+
+PROFILE_FIELDS = (
+    "company_id",
+    "container_size",
+    "container_state",
+    "transport_type",
+    "product_name",
+)
+# From the most specific profile to the terminal-wide median; each level keeps
+# the leading fields of PROFILE_FIELDS and treats the rest as "any".
+PROFILE_LEVELS = (5, 4, 3, 2, 0)
+
+
+def get_profile(values, level):
+    """
+    Lookup key of a profile at ``level``, the number of ``PROFILE_FIELDS`` kept;
+    the others become "any". Below level 3 the company is dropped as well, so
+    the last fallbacks are terminal-wide.
+    """
+    company_id, *rest = (values.get(field) or "" for field in PROFILE_FIELDS)
+    if level < 3:
+        company_id = None
+        kept = rest[:level]
+    else:
+        kept = rest[: level - 1]
+    return (level, company_id or None, *kept, *[""] * (4 - len(kept)))
+
+
+class DwellEstimatorService:
+    """
+    Expected exit times for visits, from the median dwell of finished visits with
+    the same company, size, state, transport type and product.
+
+    Estimates are precomputed into ``DwellEstimate`` by ``refresh`` (run nightly
+    with ``refresh_dwell_estimates``). Every process keeps the table as a dict,
+    so an estimate costs a handful of dictionary lookups.
+    """
+
+    _lookup = None
+    _stamp = None
+
+    @transaction.atomic
+    def refresh(self, now=None):
+        now = now or timezone.now()
+        samples = defaultdict(list)
+        for visit in ContainerStorage.objects.filter(
+            exit_time__isnull=False, exit_time__gte=now - timedelta(days=HISTORY_DAYS)
+        ).values(
+            "company_id",
+            "container_state",
+            "transport_type",
+            "product_name",
+            "entry_time",
+            "exit_time",
+            container_size=F("container__size"),
+        ):
+            dwell_days = (visit["exit_time"] - visit["entry_time"]).total_seconds()
+            dwell_days = max(dwell_days / 86400, 0)
+            for level in PROFILE_LEVELS:
+                samples[get_profile(visit, level)].append(dwell_days)
+
+        estimates = []
+        for profile, values in samples.items():
+            level, company_id, size, state, transport_type, product_name = profile
+            # The terminal-wide median is kept whatever its size, as last resort.
+            if len(values) < MIN_SAMPLE_SIZE and level > 0:
+                continue
+            estimates.append(
+                DwellEstimate(
+                    level=level,
+                    company_id=company_id,
+                    container_size=size,
+                    container_state=state,
+                    transport_type=transport_type,
+                    product_name=product_name,
+                    median_days=round(statistics.median(values), 2),
+                    sample_size=len(values),
+                    computed_at=now,
+                )
+            )
+
+        DwellEstimate.objects.all().delete()
+        DwellEstimate.objects.bulk_create(estimates)
+        transaction.on_commit(lambda: cache.delete(DWELL_ESTIMATES_CACHE_KEY))
+        return estimates
+
+    def get_lookup(self):
+        stamp = cache.get(DWELL_ESTIMATES_CACHE_KEY)
+        if stamp is None:
+            cache.add(DWELL_ESTIMATES_CACHE_KEY, uuid.uuid4().hex, None)
+            stamp = cache.get(DWELL_ESTIMATES_CACHE_KEY)
+        if (
+            DwellEstimatorService._lookup is None
+            or stamp != DwellEstimatorService._stamp
+        ):
+            DwellEstimatorService._lookup = {
+                (
+                    estimate["level"],
+                    estimate["company_id"],
+                    estimate["container_size"],
+                    estimate["container_state"],
+                    estimate["transport_type"],
+                    estimate["product_name"],
+                ): estimate["median_days"]
+                for estimate in DwellEstimate.objects.values(
+                    "level", *PROFILE_FIELDS, "median_days"
+                )
+            }
+            DwellEstimatorService._stamp = stamp
+        return DwellEstimatorService._lookup
+
+    def estimate_days(self, profile):
+        """
+        Expected dwell in days for a profile dict with the ``PROFILE_FIELDS``,
+        or ``None`` before the first refresh.
+        """
+        lookup = self.get_lookup()
+        for level in PROFILE_LEVELS:
+            days = lookup.get(get_profile(profile, level))
+            if days is not None:
+                return days
+        return None
+
+    def get_expected_exit_time(self, visit):
+        if visit.exit_time is not None:
+            return visit.exit_time
+        days = self.estimate_days(
+            {
+                "company_id": visit.company_id,
+                "container_size": visit.container.size,
+                "container_state": visit.container_state,
+                "transport_type": visit.transport_type,
+                "product_name": visit.product_name,
+            }
+        )
+        if days is None:
+            return None
+        return visit.entry_time + timedelta(days=days)
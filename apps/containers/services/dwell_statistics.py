@@ -0,0 +1,197 @@
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, time
+
+import numpy as np
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import (
+    Aggregate,
+    Count,
+    DateField,
+    DurationField,
+    ExpressionWrapper,
+    F,
+)
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from apps.containers.models import (
+    DWELL_STATISTICS_STAMP_KEY,
+    ContainerStorage,
+)
+
+PERCENTILES = (50, 90, 99)
+# Ten years of monthly figures is more than any negotiation looks back.
+MAX_MONTHS = 120
+CHUNK_SIZE = 5000
+# Entries are invalidated through their stamp; the timeout only bounds memory.
+DWELL_STATISTICS_CACHE_TIMEOUT = 60 * 60 * 24
+
+DWELL = ExpressionWrapper(
+    F("exit_time") - F("entry_time"), output_field=DurationField()
+)
+
+
+class PercentileCont(Aggregate):
+    """
+    Continuous percentile of an ordered set, as PostgreSQL's ``percentile_cont``.
+    """
+
+    function = "PERCENTILE_CONT"
+    template = "%(function)s(%(fraction)s) WITHIN GROUP (ORDER BY %(expressions)s)"
+
+    def __init__(self, expression, fraction, **extra):
+        super().__init__(expression, fraction=float(fraction), **extra)
+
+
+def get_month_start(month):
+    return timezone.make_aware(datetime.combine(month, time.min))
+
+
+def get_next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+class DwellStatisticsService:
+    """
+    Monthly p50/p90/p99 dwell days of finished visits per container size,
+    terminal-wide or for one company, grouped by the month a visit left.
+
+    PostgreSQL computes the percentiles with ``percentile_cont``; other databases
+    stream the dwell times and hand them to NumPy, whose default linear
+    interpolation gives the same figures. Every (company, month) is cached on its
+    own under a stamp that changes whenever a visit leaving in that month is
+    saved or deleted, so only the months that changed are recomputed. Queryset
+    ``update`` calls bypass that and leave cached months stale until they expire.
+    """
+
+    def get_statistics(self, date_from, date_to, company_id=None):
+        months = self.get_months(date_from, date_to)
+        company = company_id or "all"
+        stamps = self._get_stamps(company, months)
+        keys = {
+            month: f"dwell_statistics:{company}:{month:%Y-%m}:{stamps[month]}"
+            for month in months
+        }
+        cached = cache.get_many(keys.values())
+        missing = [month for month in months if keys[month] not in cached]
+        if missing:
+            computed = self.compute(missing[0], get_next_month(missing[-1]), company_id)
+            fresh = {keys[month]: computed.get(month, []) for month in missing}
+            cache.set_many(fresh, DWELL_STATISTICS_CACHE_TIMEOUT)
+            cached.update(fresh)
+
+        return {
+            "company_id": company_id,
+            "date_from": date_from,
+            "date_to": date_to,
+            "months": [
+                {"month": month, "sizes": cached[keys[month]]} for month in months
+            ],
+        }
+
+    def get_months(self, date_from, date_to):
+        if date_to < date_from:
+            raise ValidationError({"date_to": ["Must not be before date_from."]})
+        months = [date_from.replace(day=1)]
+        while get_next_month(months[-1]) <= date_to:
+            months.append(get_next_month(months[-1]))
+            if len(months) > MAX_MONTHS:
+                raise ValidationError(
+                    {"date_to": [f"The period is limited to {MAX_MONTHS} months."]}
+                )
+        return months
+
+    def compute(self, month_from, month_to, company_id=None):
+        """
+        Percentiles per size of visits leaving from ``month_from`` up to, not
+        including, ``month_to``, as ``{month: [size rows]}``.
+        """
+        queryset = ContainerStorage.objects.filter(
+            exit_time__gte=get_month_start(month_from),
+            exit_time__lt=get_month_start(month_to),
+        )
+        if company_id:
+            queryset = queryset.filter(company_id=company_id)
+
+        if connection.vendor == "postgresql":
+            rows = self._compute_in_database(queryset)
+        else:
+            rows = self._compute_in_python(queryset)
+
+        result = defaultdict(list)
+        for row in sorted(rows, key=lambda row: (row["month"], row["container_size"])):
+            result[row.pop("month")].append(row)
+        return result
+
+    def _compute_in_database(self, queryset):
+        rows = (
+            queryset.values(
+                month=TruncMonth("exit_time", output_field=DateField()),
+                container_size=F("container__size"),
+            )
+            .annotate(
+                count=Count("id"),
+                **{
+                    f"p{percentile}": PercentileCont(
+                        DWELL, percentile / 100, output_field=DurationField()
+                    )
+                    for percentile in PERCENTILES
+                },
+            )
+            .order_by()
+        )
+        return [
+            {
+                **row,
+                **{
+                    f"p{percentile}": self._to_days(
+                        row[f"p{percentile}"].total_seconds()
+                    )
+                    for percentile in PERCENTILES
+                },
+            }
+            for row in rows
+        ]
+
+    def _compute_in_python(self, queryset):
+        samples = defaultdict(list)
+        for size, entry_time, exit_time in queryset.values_list(
+            "container__size", "entry_time", "exit_time"
+        ).iterator(chunk_size=CHUNK_SIZE):
+            month = timezone.localtime(exit_time).date().replace(day=1)
+            samples[(month, size)].append((exit_time - entry_time).total_seconds())
+
+        rows = []
+        for (month, size), seconds in samples.items():
+            values = np.percentile(np.asarray(seconds), PERCENTILES)
+            rows.append(
+                {
+                    "month": month,
+                    "container_size": size,
+                    "count": len(seconds),
+                    **{
+                        f"p{percentile}": self._to_days(value)
+                        for percentile, value in zip(PERCENTILES, values)
+                    },
+                }
+            )
+        return rows
+
+    def _get_stamps(self, company, months):
+        stamp_keys = {
+            month: DWELL_STATISTICS_STAMP_KEY.format(
+                company=company, month=f"{month:%Y-%m}"
+            )
+            for month in months
+        }
+        stamps = cache.get_many(stamp_keys.values())
+        for key in set(stamp_keys.values()) - stamps.keys():
+            cache.add(key, uuid.uuid4().hex, None)
+            stamps[key] = cache.get(key)
+        return {month: stamps[key] for month, key in stamp_keys.items()}
+
+    def _to_days(self, seconds):
+        return round(float(seconds) / 86400, 2)
@@ -0,0 +1,222 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import (
+    Case,
+    DateTimeField,
+    DecimalField,
+    DurationField,
+    ExpressionWrapper,
+    F,
+    Func,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from apps.containers.models import ContainerStorage, FreeDaysWatchlistEntry
+from apps.core.choices import ContainerSize, ContainerState, MeasurementUnit
+from apps.core.models import FreeDayCombination, TerminalService
+from apps.customers.models import (
+    COMPANY_DASHBOARD_STAMP_KEY,
+    CompanyContract,
+    ContractFreeDay,
+    ContractService,
+)
+
+WATCHLIST_FIELDS = (
+    "company_id",
+    "container_name",
+    "container_size",
+    "container_state",
+    "category",
+    "entry_time",
+    "storage_days",
+    "free_days",
+    "overdue_days",
+    "daily_rate",
+    "accrued_charge",
+)
+
+
+class DurationDays(Func):
+    """
+    Whole days in a duration, rounded down like ``timedelta.days``.
+    """
+
+    output_field = IntegerField()
+    template = "FLOOR(EXTRACT(EPOCH FROM %(expressions)s) / 86400)::integer"
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # SQLite keeps durations as integer microseconds.
+        return self.as_sql(
+            compiler,
+            connection,
+            template="(%(expressions)s / 86400000000)",
+            **extra_context,
+        )
+
+
+class FreeDaysWatchlistService:
+    """
+    In-terminal visits past their free days, or about to be.
+
+    Free days and the daily storage rate of every open visit are resolved in one
+    query: the visit's contract, or else the company's active one that has not
+    ended, gives the ``ContractFreeDay`` of the visit's size, state and
+    category, then the contract's own ``free_days``, then the combination's
+    default. The rate is the contract price, or else the base price, of a
+    per-day service for the size and state, "any" matching as a fallback.
+    ``refresh`` stores the result in ``FreeDaysWatchlistEntry``, which the
+    watchlist is read from.
+    """
+
+    def get_queryset(self, now=None):
+        now = now or timezone.now()
+        contract_id = OuterRef("resolved_contract_id")
+        combination = {
+            "container_size": OuterRef("container__size"),
+            "container_state": OuterRef("container_state"),
+            "category": OuterRef("category"),
+        }
+        daily_rates = (
+            TerminalService.objects.filter(
+                Q(container_size=OuterRef("container__size"))
+                | Q(container_size=ContainerSize.ANY),
+                Q(container_state=OuterRef("container_state"))
+                | Q(container_state=ContainerState.ANY),
+                service_type__unit_of_measure=MeasurementUnit.DAY,
+            )
+            .annotate(
+                rate=Coalesce(
+                    Subquery(
+                        ContractService.objects.filter(
+                            contract_id=OuterRef(contract_id), service_id=OuterRef("id")
+                        ).values("price")[:1]
+                    ),
+                    "base_price",
+                )
+            )
+            # Exact size and state before "any".
+            .order_by(
+                Case(When(container_size=ContainerSize.ANY, then=1), default=0),
+                Case(When(container_state=ContainerState.ANY, then=1), default=0),
+                "id",
+            )
+            .values("rate")[:1]
+        )
+
+        return (
+            ContainerStorage.objects.filter(exit_time__isnull=True)
+            .annotate(
+                resolved_contract_id=Coalesce(
+                    "contract_id",
+                    Subquery(
+                        CompanyContract.objects.filter(
+                            Q(end_date__isnull=True)
+                            | Q(end_date__gte=timezone.localdate(now)),
+                            company_id=OuterRef("company_id"),
+                            is_active=True,
+                            start_date__lte=timezone.localdate(now),
+                        )
+                        .order_by("-start_date", "-id")
+                        .values("id")[:1]
+                    ),
+                ),
+            )
+            .annotate(
+                container_name=F("container__name"),
+                container_size=F("container__size"),
+                free_days=Coalesce(
+                    Subquery(
+                        ContractFreeDay.objects.filter(
+                            contract_id=contract_id,
+                            **{
+                                f"free_day_combination__{field}": value
+                                for field, value in combination.items()
+                            },
+                        ).values("free_days")[:1]
+                    ),
+                    Subquery(
+                        CompanyContract.objects.filter(id=contract_id).values(
+                            "free_days"
+                        )[:1]
+                    ),
+                    Subquery(
+                        FreeDayCombination.objects.filter(**combination).values(
+                            "default_free_days"
+                        )[:1]
+                    ),
+                    0,
+                ),
+                daily_rate=Coalesce(
+                    Subquery(daily_rates),
+                    Value(0),
+                    output_field=DecimalField(max_digits=12, decimal_places=2),
+                ),
+                # As in ``ContainerStorage.storage_days``, the entry day is day one.
+                storage_days=DurationDays(
+                    ExpressionWrapper(
+                        Value(now, output_field=DateTimeField()) - F("entry_time"),
+                        output_field=DurationField(),
+                    )
+                )
+                + 1,
+            )
+            .annotate(
+                overdue_days=F("storage_days") - F("free_days"),
+                accrued_charge=ExpressionWrapper(
+                    Greatest(F("overdue_days"), Value(0)) * F("daily_rate"),
+                    output_field=DecimalField(max_digits=14, decimal_places=2),
+                ),
+            )
+        )
+
+    @transaction.atomic
+    def refresh(self, now=None):
+        now = now or timezone.now()
+        entries = [
+            FreeDaysWatchlistEntry(
+                visit_id=row.pop("id"),
+                contract_id=row.pop("resolved_contract_id"),
+                computed_at=now,
+                **row,
+            )
+            for row in self.get_queryset(now).values(
+                "id", "resolved_contract_id", *WATCHLIST_FIELDS
+            )
+        ]
+        companies = {entry.company_id for entry in entries} | set(
+            FreeDaysWatchlistEntry.objects.values_list("company_id", flat=True)
+        )
+        FreeDaysWatchlistEntry.objects.all().delete()
+        entries = FreeDaysWatchlistEntry.objects.bulk_create(entries, batch_size=1000)
+        # Company dashboards show the overdue figures of the watchlist.
+        transaction.on_commit(
+            lambda: cache.delete_many(
+                [
+                    COMPANY_DASHBOARD_STAMP_KEY.format(company=company_id)
+                    for company_id in companies
+                ]
+            )
+        )
+        return entries
+
+    def get_watchlist(self, company_id=None, within_days=0):
+        """
+        Stored entries overdue, or overdue within ``within_days`` days, worst first.
+        """
+        queryset = (
+            FreeDaysWatchlistEntry.objects.filter(
+                overdue_days__gt=-within_days, visit__exit_time__isnull=True
+            )
+            .select_related("company")
+            .order_by("-overdue_days", "entry_time", "id")
+        )
+        if company_id:
+            queryset = queryset.filter(company_id=company_id)
+        return queryset
@@ -9,7 +9,10 @@ from apps.containers.apis.container_storage import (
     ContainerStorageDetailApi,
     ContainerStorageDispatchApi,
     ContainerStorageAvailableServicesApi,
+    ContainerStorageAvailableServicesBulkApi,
+    ContainerStorageBatchApi,
     ContainerStorageRegisterBatchApi,
+    ContainerStorageExpectedExitApi,
 )
 from apps.containers.apis.container_storage_files import (
     ContainerStorageAddImageApi,
@@ -27,8 +30,13 @@ from apps.containers.apis.container_storage_service import (
     ContainerStorageServiceUpdateApi,
 )
 from apps.containers.apis.container_storage_statistics import (
+    CompanyDashboardApi,
+    ContainerOccupancyApi,
     ContainerStorageStatisticsApi,
+    DwellStatisticsApi,
 )
+from apps.containers.apis.free_days_watchlist import FreeDaysWatchlistApi
+
 
 files_patterns = [
     path(
@@ -69,6 +77,21 @@ statistics_patterns = [
         ContainerStorageStatisticsApi.as_view(),
         name="container_storage_register_by_id",
     ),
+    path(
+        "occupancy/",
+        ContainerOccupancyApi.as_view(),
+        name="container_storage_occupancy",
+    ),
+    path(
+        "dwell/",
+        DwellStatisticsApi.as_view(),
+        name="container_storage_dwell_statistics",
+    ),
+    path(
+        "company/<int:company_id>/",
+        CompanyDashboardApi.as_view(),
+        name="container_storage_company_dashboard",
+    ),
 ]
 report_patterns = [
     path(
@@ -89,6 +112,26 @@ urlpatterns = [
         ContainerStorageRegisterBatchApi.as_view(),
         name="container_storage_register_batch",
     ),
+    path(
+        "container_visit/expected_exit/",
+        ContainerStorageExpectedExitApi.as_view(),
+        name="container_storage_expected_exit",
+    ),
+    path(
+        "container_visit/available_services/",
+        ContainerStorageAvailableServicesBulkApi.as_view(),
+        name="container_storage_available_services_bulk",
+    ),
+    path(
+        "container_visit/batch/",
+        ContainerStorageBatchApi.as_view(),
+        name="container_storage_batch",
+    ),
+    path(
+        "container_visit/free_days_watchlist/",
+        FreeDaysWatchlistApi.as_view(),
+        name="container_storage_free_days_watchlist",
+    ),
     path(
         "container_visit/<int:visit_id>/available_services/",
         ContainerStorageAvailableServicesApi.as_view(),
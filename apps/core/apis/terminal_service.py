@@ -6,6 +6,7 @@ from rest_framework.views import APIView
 from apps.core.choices import ContainerSize, ContainerState
 from apps.core.models import TerminalServiceType, TerminalService
 from apps.core.pagination import LimitOffsetPagination, get_paginated_response
+from apps.core.services.price_list import PriceListImportService
 from apps.core.services.terminal_service import (
     TerminalServiceService,
     TerminalServiceTypeService,
@@ -202,6 +203,53 @@ class TerminalServiceDeleteApi(APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class TerminalServiceImportApi(APIView):
+    class TerminalServiceImportSerializer(serializers.Serializer):
+        file = serializers.FileField()
+        preview = serializers.BooleanField(default=False)
+
+    class TerminalServiceImportOutputSerializer(serializers.Serializer):
+        created = serializers.IntegerField()
+        updated = serializers.IntegerField()
+        unchanged = serializers.IntegerField()
+        changes = inline_serializer(
+            many=True,
+            fields={
+                "name": serializers.CharField(),
+                "container_size": serializers.CharField(),
+                "container_state": serializers.CharField(),
+                "action": serializers.CharField(),
+                "old_base_price": serializers.DecimalField(
+                    max_digits=12, decimal_places=2, allow_null=True
+                ),
+                "base_price": serializers.DecimalField(max_digits=12, decimal_places=2),
+            },
+        )
+
+    @extend_schema(
+        summary="Import terminal services and base prices from a price list",
+        description=(
+            "Accepts an xlsx or CSV file with the columns name, container_size, "
+            "container_state and base_price, and optionally service_type, "
+            "description and multiple_usage. With preview, returns the changes "
+            "without applying them."
+        ),
+        request=TerminalServiceImportSerializer,
+        responses=TerminalServiceImportOutputSerializer,
+    )
+    def post(self, request):
+        serializer = self.TerminalServiceImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = PriceListImportService().import_price_list(
+            serializer.validated_data["file"],
+            preview=serializer.validated_data["preview"],
+        )
+        return Response(
+            self.TerminalServiceImportOutputSerializer(result).data,
+            status=status.HTTP_200_OK,
+        )
+
+
 class TerminalServiceTypeListApi(APIView):
     class FilterSerializer(serializers.Serializer):
         name = serializers.CharField(required=False)
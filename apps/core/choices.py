@@ -22,8 +22,21 @@ class ContainerState(TextChoices):
     ANY = "any", _("any")
 
 
+class ContainerCategory(TextChoices):
+    IMPORT = "import", _("Import")
+    EXPORT = "export", _("Export")
+    TRANSIT = "transit", _("Transit")
+
+
 class MeasurementUnit(TextChoices):
     CONTAINER = "container", _("container")
     DAY = "day", _("day")
     OPERATION = "operation", _("operation")
     UNIT = ("unit",)
+
+
+class YardChangeAction(TextChoices):
+    CREATED = "created", _("created")
+    MOVED = "moved", _("moved")
+    DELETED = "deleted", _("deleted")
+    DISPATCHED = "dispatched", _("dispatched")
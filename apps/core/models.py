@@ -1,8 +1,6 @@
 from django.core.validators import MinValueValidator
 from django.db import models
 from django.utils.translation import gettext_lazy as _
-from django.db.models.signals import post_save
-from django.dispatch import receiver
 from apps.core.choices import ContainerSize, ContainerState, MeasurementUnit
 
 
@@ -30,6 +28,12 @@ class Container(models.Model):
     def __str__(self):
         return f"{self.name} ({self.get_size_display()})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_size = instance.__dict__.get("size")
+        return instance
+
     @property
     def in_storage(self):
         return self.storages.filter(exit_time__isnull=True).exists()
@@ -101,26 +105,3 @@ class FreeDayCombination(BaseModel):
 
     def __str__(self):
         return f"{self.get_container_size_display()} - {self.get_container_state_display()} - {self.get_category_display()}"
-
-
-@receiver(post_save, sender=TerminalService)
-def create_contract_services(sender, instance, created, **kwargs):
-    if created:
-        from apps.customers.models import CompanyContract, ContractService
-
-        # Get all company contracts
-        company_contracts = CompanyContract.objects.all()
-        contract_services = []
-
-        for contract in company_contracts:
-            contract_services.append(
-                ContractService(
-                    contract=contract,
-                    service=instance,
-                    price=instance.base_price,
-                    quantity=1,
-                )
-            )
-
-        # Bulk create the ContractService instances
-        ContractService.objects.bulk_create(contract_services)
@@ -0,0 +1,205 @@
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+from zipfile import BadZipFile
+
+from django.core.cache import cache
+from django.db import transaction
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+from rest_framework.exceptions import ValidationError
+
+from apps.core.choices import ContainerSize, ContainerState
+from apps.core.models import TerminalService, TerminalServiceType
+from apps.customers.models import (
+    CONTRACT_TARIFF_STAMP_KEY,
+    SERVICE_MATRIX_CACHE_KEY,
+    follow_base_prices,
+)
+
+KEY_FIELDS = ("name", "container_size", "container_state")
+VALUE_FIELDS = ("base_price", "service_type", "description", "multiple_usage")
+CREATED = "created"
+UPDATED = "updated"
+BATCH_SIZE = 500
+TRUE_VALUES = ("1", "true", "yes", "y")
+FALSE_VALUES = ("0", "false", "no", "n", "")
+
+
+class PriceListImportService:
+    """
+    Terminal services and base prices from an xlsx or CSV price list.
+
+    The first row names the columns: ``name``, ``container_size``,
+    ``container_state`` and ``base_price`` are required, ``service_type`` (by
+    name), ``description`` and ``multiple_usage`` are optional and left alone
+    on existing services when missing. Rows are matched to services by name,
+    size and state; new and changed services are written with one upsert per
+    batch, and contract rows following a changed base price move along in one
+    ``UPDATE``. Contracts only store overrides, so new services need nothing
+    copied into them.
+    """
+
+    def import_price_list(self, file, preview=False):
+        rows, columns = self.read(file)
+        entries = self.validate(rows, columns)
+        existing = {
+            tuple(getattr(service, field) for field in KEY_FIELDS): service
+            for service in TerminalService.objects.all()
+        }
+
+        changes = []
+        services = []
+        base_prices = {}
+        for entry in entries:
+            key = tuple(entry[field] for field in KEY_FIELDS)
+            service = existing.get(key)
+            values = {field: entry[field] for field in VALUE_FIELDS if field in entry}
+            if service is None:
+                action, old_price = CREATED, None
+            elif any(
+                getattr(service, self._attname(field)) != value
+                for field, value in values.items()
+            ):
+                action, old_price = UPDATED, service.base_price
+                if old_price != entry["base_price"]:
+                    base_prices[service.id] = (old_price, entry["base_price"])
+            else:
+                continue
+            changes.append(
+                {
+                    **dict(zip(KEY_FIELDS, key)),
+                    "action": action,
+                    "old_base_price": old_price,
+                    "base_price": entry["base_price"],
+                }
+            )
+            services.append(
+                TerminalService(
+                    **dict(zip(KEY_FIELDS, key)),
+                    **{self._attname(field): value for field, value in values.items()},
+                )
+            )
+
+        result = {
+            "created": sum(change["action"] == CREATED for change in changes),
+            "updated": sum(change["action"] == UPDATED for change in changes),
+            "unchanged": len(entries) - len(changes),
+            "changes": changes,
+        }
+        if preview or not services:
+            return result
+
+        with transaction.atomic():
+            TerminalService.objects.bulk_create(
+                services,
+                update_conflicts=True,
+                unique_fields=KEY_FIELDS,
+                update_fields=[
+                    self._attname(field) for field in VALUE_FIELDS if field in columns
+                ]
+                + ["updated_at"],
+                batch_size=BATCH_SIZE,
+            )
+            # ``bulk_create`` sends none of the signals that keep contracts and
+            # cached tariffs in line with the services.
+            follow_base_prices(base_prices)
+            transaction.on_commit(
+                lambda: cache.delete_many(
+                    [SERVICE_MATRIX_CACHE_KEY, CONTRACT_TARIFF_STAMP_KEY]
+                )
+            )
+        return result
+
+    def read(self, file):
+        """
+        The data rows of a price list as dicts, and its column names.
+        """
+        try:
+            if file.name.lower().endswith(".csv"):
+                text = file.read().decode("utf-8-sig")
+                rows = list(csv.reader(io.StringIO(text)))
+            else:
+                workbook = load_workbook(file, read_only=True, data_only=True)
+                rows = list(workbook.active.iter_rows(values_only=True))
+        except (BadZipFile, InvalidFileException, UnicodeDecodeError, csv.Error):
+            raise ValidationError({"file": ["Not a readable xlsx or CSV file."]})
+        if not rows:
+            raise ValidationError({"file": ["The file is empty."]})
+
+        columns = [str(column or "").strip().lower() for column in rows[0]]
+        missing = [
+            column for column in (*KEY_FIELDS, "base_price") if column not in columns
+        ]
+        if missing:
+            raise ValidationError({"file": [f"Missing columns: {', '.join(missing)}."]})
+        return [
+            dict(zip(columns, row))
+            for row in rows[1:]
+            if any(value not in (None, "") for value in row)
+        ], set(columns)
+
+    def validate(self, rows, columns):
+        service_types = dict(TerminalServiceType.objects.values_list("name", "id"))
+        entries, errors, seen = [], {}, {}
+        # Row numbers as in the file, after the header.
+        for number, row in enumerate(rows, start=2):
+            entry, row_errors = {}, {}
+            name = str(row.get("name") or "").strip()
+            if not name:
+                row_errors["name"] = ["Required."]
+            entry["name"] = name
+            for field, choices in (
+                ("container_size", ContainerSize),
+                ("container_state", ContainerState),
+            ):
+                value = self._to_choice(row.get(field), choices)
+                if value is None:
+                    row_errors[field] = [f"Must be one of {', '.join(choices.values)}."]
+                entry[field] = value
+            try:
+                entry["base_price"] = Decimal(str(row.get("base_price"))).quantize(
+                    Decimal("0.01")
+                )
+                if entry["base_price"] < 0:
+                    row_errors["base_price"] = ["Cannot be negative."]
+            except InvalidOperation:
+                row_errors["base_price"] = ["Must be a number."]
+            if "service_type" in columns:
+                service_type = str(row.get("service_type") or "").strip()
+                entry["service_type"] = service_types.get(service_type)
+                if service_type and entry["service_type"] is None:
+                    row_errors["service_type"] = [
+                        f"Service type {service_type} does not exist."
+                    ]
+            if "description" in columns:
+                entry["description"] = str(row.get("description") or "").strip()
+            if "multiple_usage" in columns:
+                value = str(row.get("multiple_usage") or "").strip().lower()
+                entry["multiple_usage"] = value in TRUE_VALUES
+                if value not in TRUE_VALUES + FALSE_VALUES:
+                    row_errors["multiple_usage"] = ["Must be yes or no."]
+
+            key = tuple(entry[field] for field in KEY_FIELDS)
+            if not row_errors and key in seen:
+                row_errors["name"] = [f"Repeats row {seen[key]}."]
+            seen.setdefault(key, number)
+            if row_errors:
+                errors[number] = row_errors
+            entries.append(entry)
+
+        if errors:
+            raise ValidationError({"rows": errors})
+        return entries
+
+    def _to_choice(self, value, choices):
+        # Sizes read from a spreadsheet cell may come back as numbers.
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        value = str(value or "").strip().lower()
+        return next(
+            (choice for choice in choices.values if choice.lower() == value), None
+        )
+
+    def _attname(self, field):
+        return "service_type_id" if field == "service_type" else field
@@ -17,6 +17,7 @@ from apps.core.apis.terminal_service import (
     TerminalServiceCreateApi,
     TerminalServiceUpdateApi,
     TerminalServiceDeleteApi,
+    TerminalServiceImportApi,
 )
 
 containers_patterns = [
@@ -42,6 +43,7 @@ terminal_services_patterns = [
         name="terminal_service_detail",
     ),
     path("create/", TerminalServiceCreateApi.as_view(), name="terminal_service_create"),
+    path("import/", TerminalServiceImportApi.as_view(), name="terminal_service_import"),
     path(
         "<int:service_id>/update/",
         TerminalServiceUpdateApi.as_view(),
@@ -7,6 +7,7 @@ from .models import (
     CompanyUser,
     CompanyContract,
     ContractService,
+    ContractServicePrice,
     ContractFreeDay,
 )
 
@@ -72,3 +73,4 @@ admin.site.register(ContractFreeDay)
 
 admin.site.register(CompanyContract)
 admin.site.register(ContractService)
+admin.site.register(ContractServicePrice)
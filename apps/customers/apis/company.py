@@ -4,7 +4,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from apps.core.pagination import LimitOffsetPagination, get_paginated_response
-from apps.customers.services import CompanyService
+from apps.customers.services import ActiveContractService, CompanyService
 
 
 class CompanyCreateApi(APIView):
@@ -78,19 +78,22 @@ class CompanyListApi(APIView):
         id = serializers.IntegerField(read_only=True)
         name = serializers.CharField(read_only=True)
         address = serializers.CharField(read_only=True)
-        containers_count = serializers.IntegerField(read_only=True)
+        containers_count = serializers.IntegerField(
+            source="visits_count", read_only=True
+        )
+        visits_in_terminal = serializers.IntegerField(read_only=True)
+        teu_in_terminal = serializers.IntegerField(read_only=True)
+        last_activity_at = serializers.DateTimeField(read_only=True)
         active_contract = serializers.SerializerMethodField("get_active_contract")
 
         def get_active_contract(self, obj):
-            if hasattr(obj, "active_contract_list") and obj.active_contract_list:
-                contract = obj.active_contract_list[0]
-                return {
-                    "id": contract.id,
-                    "name": contract.name,
-                    "start_date": contract.start_date,
-                    "end_date": contract.end_date,
-                }
-            return None
+            contract = ActiveContractService().get_active_contract(obj.id)
+            if contract is None:
+                return None
+            return {
+                field: contract[field]
+                for field in ("id", "name", "start_date", "end_date")
+            }
 
     @extend_schema(summary="List companies", responses=CompanyListOutputSerializer)
     def get(self, request):
@@ -1,11 +1,20 @@
+from decimal import Decimal
+
 from drf_spectacular.utils import extend_schema
 from rest_framework import serializers, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from apps.core.pagination import get_paginated_response, LimitOffsetPagination
+from apps.core.choices import ContainerSize, ContainerState
+from apps.core.utils import inline_serializer
 from apps.customers.services import (
+    ABSOLUTE,
+    PERCENTAGE,
+    PRICE_RULES,
+    CompanyService,
     CompanyContractService,
+    ContractPriceUpdateService,
     ContractServiceService,
     ContractFreeDayService,
 )
@@ -30,6 +39,70 @@ class CompanyContractCreateApi(APIView):
         return Response(status=status.HTTP_201_CREATED)
 
 
+class CompanyContractCloneApi(APIView):
+    class CompanyContractCloneSerializer(serializers.Serializer):
+        company_id = serializers.IntegerField(required=False)
+        name = serializers.CharField(required=True)
+        start_date = serializers.DateField(required=True)
+        end_date = serializers.DateField(required=False, allow_null=True)
+        is_active = serializers.BooleanField(required=True)
+        free_days = serializers.IntegerField(required=False, allow_null=True)
+
+        def validate_company_id(self, value):
+            CompanyService().get_company_by_id(value)
+            return value
+
+    class CompanyContractCloneOutputSerializer(serializers.Serializer):
+        id = serializers.IntegerField(read_only=True)
+        company_id = serializers.IntegerField(read_only=True)
+        name = serializers.CharField(read_only=True)
+        start_date = serializers.DateField(read_only=True)
+        end_date = serializers.DateField(read_only=True)
+        is_active = serializers.BooleanField(read_only=True)
+        free_days = serializers.IntegerField(read_only=True)
+
+    @extend_schema(
+        summary="Create a contract with the prices and free days of another one",
+        request=CompanyContractCloneSerializer,
+        responses=CompanyContractCloneOutputSerializer,
+    )
+    def post(self, request, contract_id):
+        serializer = self.CompanyContractCloneSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        contract = CompanyContractService().clone_contract(
+            contract_id, serializer.validated_data
+        )
+        return Response(
+            data=self.CompanyContractCloneOutputSerializer(contract).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class CompanyContractRenewApi(APIView):
+    class CompanyContractRenewSerializer(serializers.Serializer):
+        name = serializers.CharField(required=True)
+        start_date = serializers.DateField(required=True)
+        end_date = serializers.DateField(required=False, allow_null=True)
+
+    @extend_schema(
+        summary="Renew a contract into a new active one with the same tariff",
+        request=CompanyContractRenewSerializer,
+        responses=CompanyContractCloneApi.CompanyContractCloneOutputSerializer,
+    )
+    def post(self, request, contract_id):
+        serializer = self.CompanyContractRenewSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        contract = CompanyContractService().renew_contract(
+            contract_id, serializer.validated_data
+        )
+        return Response(
+            data=CompanyContractCloneApi.CompanyContractCloneOutputSerializer(
+                contract
+            ).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+
 class CompanyContractDetailApi(APIView):
     class CompanyContractDetailSerializer(serializers.Serializer):
         id = serializers.IntegerField(read_only=True)
@@ -124,7 +197,8 @@ class CompanyServiceListByContractApi(APIView):
         container_state = serializers.CharField(required=False)
 
     class CompanyServicesByContractListSerializer(serializers.Serializer):
-        id = serializers.IntegerField(read_only=True)
+        id = serializers.IntegerField(read_only=True, allow_null=True)
+        service_id = serializers.IntegerField(source="service.id", read_only=True)
         name = serializers.CharField(source="service.name", read_only=True)
         description = serializers.CharField(
             source="service.description", read_only=True
@@ -139,13 +213,10 @@ class CompanyServiceListByContractApi(APIView):
         base_price = serializers.FloatField(source="service.base_price", read_only=True)
         multiple_usage = serializers.BooleanField(source="service.multiple_usage")
         price = serializers.FloatField(read_only=True)
+        is_override = serializers.BooleanField(read_only=True)
 
         def get_service_type(self, obj):
-            return {
-                "id": obj.service.service_type.id,
-                "name": obj.service.service_type.name,
-                "unit_of_measure": obj.service.service_type.unit_of_measure,
-            }
+            return obj["service"]["service_type"]
 
     @extend_schema(
         request=FilterSerializer, responses=CompanyServicesByContractListSerializer
@@ -177,7 +248,8 @@ class CompanyActiveServiceListByCompanyApi(APIView):
         container_state = serializers.CharField(required=False)
 
     class CompanyActiveServiceListByCompanySerializer(serializers.Serializer):
-        id = serializers.IntegerField(read_only=True)
+        id = serializers.IntegerField(read_only=True, allow_null=True)
+        service_id = serializers.IntegerField(source="service.id", read_only=True)
         name = serializers.CharField(source="service.name", read_only=True)
         description = serializers.CharField(
             source="service.description", read_only=True
@@ -192,13 +264,10 @@ class CompanyActiveServiceListByCompanyApi(APIView):
         base_price = serializers.FloatField(source="service.base_price", read_only=True)
         multiple_usage = serializers.BooleanField(source="service.multiple_usage")
         price = serializers.FloatField(read_only=True)
+        is_override = serializers.BooleanField(read_only=True)
 
         def get_service_type(self, obj):
-            return {
-                "id": obj.service.service_type.id,
-                "name": obj.service.service_type.name,
-                "unit_of_measure": obj.service.service_type.unit_of_measure,
-            }
+            return obj["service"]["service_type"]
 
     @extend_schema(
         request=FilterSerializer, responses=CompanyActiveServiceListByCompanySerializer
@@ -248,6 +317,133 @@ class CompanyServiceUpdateApi(APIView):
         )
 
 
+class ContractServicePriceApi(APIView):
+    class ContractServicePriceSerializer(serializers.Serializer):
+        price = serializers.DecimalField(
+            max_digits=12, decimal_places=2, min_value=Decimal(0), required=True
+        )
+
+    class ContractServicePriceOutputSerializer(serializers.Serializer):
+        id = serializers.IntegerField(read_only=True, allow_null=True)
+        service_id = serializers.IntegerField(source="service.id", read_only=True)
+        base_price = serializers.DecimalField(
+            source="service.base_price",
+            max_digits=12,
+            decimal_places=2,
+            read_only=True,
+        )
+        price = serializers.DecimalField(
+            max_digits=12, decimal_places=2, read_only=True
+        )
+        is_override = serializers.BooleanField(read_only=True)
+
+    @extend_schema(
+        summary="Set the price of a terminal service under a contract",
+        description="A price equal to the base price removes the override.",
+        request=ContractServicePriceSerializer,
+        responses=ContractServicePriceOutputSerializer,
+    )
+    def put(self, request, contract_id, service_id):
+        serializer = self.ContractServicePriceSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        entry = ContractServiceService().set_price(
+            contract_id, service_id, serializer.validated_data["price"]
+        )
+        return Response(
+            data=self.ContractServicePriceOutputSerializer(entry).data,
+            status=status.HTTP_200_OK,
+        )
+
+
+class ContractServiceBulkPriceApi(APIView):
+    class ContractServiceBulkPriceSerializer(serializers.Serializer):
+        company_ids = serializers.ListField(
+            child=serializers.IntegerField(), required=False
+        )
+        contract_ids = serializers.ListField(
+            child=serializers.IntegerField(), required=False
+        )
+        active_only = serializers.BooleanField(default=False)
+        service_ids = serializers.ListField(
+            child=serializers.IntegerField(), required=False
+        )
+        service_type_id = serializers.IntegerField(required=False)
+        container_size = serializers.ChoiceField(
+            choices=ContainerSize.choices, required=False
+        )
+        container_state = serializers.ChoiceField(
+            choices=ContainerState.choices, required=False
+        )
+        rule = serializers.ChoiceField(choices=PRICE_RULES)
+        value = serializers.DecimalField(
+            max_digits=12, decimal_places=2, required=False
+        )
+        round_to = serializers.DecimalField(
+            max_digits=12, decimal_places=2, min_value=Decimal("0.01"), required=False
+        )
+        preview = serializers.BooleanField(default=False)
+
+        def validate(self, attrs):
+            rule, value = attrs["rule"], attrs.get("value")
+            if rule in (ABSOLUTE, PERCENTAGE) and value is None:
+                raise serializers.ValidationError(
+                    {"value": [f"Required by the {rule} rule."]}
+                )
+            if rule == ABSOLUTE and value < 0:
+                raise serializers.ValidationError(
+                    {"value": ["Prices cannot be negative."]}
+                )
+            if rule == PERCENTAGE and value < -100:
+                raise serializers.ValidationError(
+                    {"value": ["Prices cannot drop by more than 100%."]}
+                )
+            if rule not in (ABSOLUTE, PERCENTAGE) and not attrs.get("round_to"):
+                raise serializers.ValidationError(
+                    {"round_to": ["Required by the rounding rule."]}
+                )
+            return attrs
+
+    class ContractServiceBulkPriceOutputSerializer(serializers.Serializer):
+        updated = serializers.IntegerField()
+        changes = inline_serializer(
+            many=True,
+            fields={
+                "contract_id": serializers.IntegerField(),
+                "contract_name": serializers.CharField(),
+                "company_name": serializers.CharField(),
+                "service_id": serializers.IntegerField(),
+                "service_name": serializers.CharField(),
+                "old_price": serializers.DecimalField(max_digits=12, decimal_places=2),
+                "new_price": serializers.DecimalField(max_digits=12, decimal_places=2),
+            },
+        )
+
+    @extend_schema(
+        summary="Change the contract prices of many services with one rule",
+        description=(
+            "With preview, returns the price changes without applying them. "
+            "Empty selections match all contracts or services."
+        ),
+        request=ContractServiceBulkPriceSerializer,
+        responses=ContractServiceBulkPriceOutputSerializer,
+    )
+    def post(self, request):
+        serializer = self.ContractServiceBulkPriceSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        result = ContractPriceUpdateService().update_prices(
+            data,
+            data["rule"],
+            value=data.get("value"),
+            round_to=data.get("round_to"),
+            preview=data["preview"],
+        )
+        return Response(
+            self.ContractServiceBulkPriceOutputSerializer(result).data,
+            status=status.HTTP_200_OK,
+        )
+
+
 class ContractFreeDaysListApi(APIView):
     class Pagination(LimitOffsetPagination):
         default_limit = 100
@@ -260,7 +456,10 @@ class ContractFreeDaysListApi(APIView):
         free_days = serializers.IntegerField(required=False)
 
     class CompanyFreeDaysListSerializer(serializers.Serializer):
-        id = serializers.IntegerField(read_only=True)
+        id = serializers.IntegerField(read_only=True, allow_null=True)
+        free_day_combination_id = serializers.IntegerField(
+            source="free_day_combination.id", read_only=True
+        )
         container_size = serializers.CharField(
             source="free_day_combination.container_size", read_only=True
         )
@@ -271,6 +470,7 @@ class ContractFreeDaysListApi(APIView):
             source="free_day_combination.category", read_only=True
         )
         free_days = serializers.IntegerField(read_only=True)
+        is_override = serializers.BooleanField(read_only=True)
 
     @extend_schema(responses=CompanyFreeDaysListSerializer)
     def get(self, request, contract_id):
@@ -308,3 +508,33 @@ class CompanyFreeDaysUpdateApi(APIView):
             data=self.CompanyFreeDaysUpdateSerializer(free_day).data,
             status=status.HTTP_200_OK,
         )
+
+
+class ContractCombinationFreeDaysApi(APIView):
+    class ContractCombinationFreeDaysSerializer(serializers.Serializer):
+        free_days = serializers.IntegerField(required=True, min_value=0)
+
+    class ContractCombinationFreeDaysOutputSerializer(serializers.Serializer):
+        id = serializers.IntegerField(read_only=True, allow_null=True)
+        free_day_combination_id = serializers.IntegerField(
+            source="free_day_combination.id", read_only=True
+        )
+        free_days = serializers.IntegerField(read_only=True)
+        is_override = serializers.BooleanField(read_only=True)
+
+    @extend_schema(
+        summary="Set the free days of a combination under a contract",
+        description="Free days equal to the contract's default remove the override.",
+        request=ContractCombinationFreeDaysSerializer,
+        responses=ContractCombinationFreeDaysOutputSerializer,
+    )
+    def put(self, request, contract_id, combination_id):
+        serializer = self.ContractCombinationFreeDaysSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        entry = ContractFreeDayService().set_free_days(
+            contract_id, combination_id, serializer.validated_data["free_days"]
+        )
+        return Response(
+            data=self.ContractCombinationFreeDaysOutputSerializer(entry).data,
+            status=status.HTTP_200_OK,
+        )
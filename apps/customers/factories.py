@@ -0,0 +1,12 @@
+import factory
+
+from apps.customers.models import Company
+
+
+class CompanyFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = Company
+        django_get_or_create = ("name",)
+
+    name = factory.Sequence(lambda n: f"Company {n}")
+    address = factory.Faker("address")
@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+
+from apps.customers.services import CompanyCounterService
+
+
+class Command(BaseCommand):
+    help = "Recount the visit counters of companies and correct any drift"
+
+    def handle(self, *args, **kwargs):
+        drifted = CompanyCounterService().reconcile()
+        self.stdout.write(
+            self.style.SUCCESS(f"Corrected the counters of {len(drifted)} companies.")
+        )
@@ -0,0 +1,73 @@
+# Generated by Django 5.0.7 on 2026-10-19 11:13
+
+from django.db import migrations
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+
+def compact_contract_overrides(apps, schema_editor):
+    # Rows repeating the defaults were copied in when contracts were created;
+    # only the ones visits still refer to have to stay.
+    ContractService = apps.get_model('customers', 'ContractService')
+    ContractFreeDay = apps.get_model('customers', 'ContractFreeDay')
+    ContainerServiceInstance = apps.get_model('containers', 'ContainerServiceInstance')
+
+    ContractService.objects.filter(price=F('service__base_price'), quantity=1).exclude(
+        id__in=ContainerServiceInstance.objects.values('contract_service_id')
+    ).exclude(containers__isnull=False).exclude(
+        dispatched_containers__isnull=False
+    ).delete()
+    ContractFreeDay.objects.alias(
+        default=Coalesce('contract__free_days', 'free_day_combination__default_free_days')
+    ).filter(free_days=F('default')).delete()
+
+
+def expand_contract_overrides(apps, schema_editor):
+    # Every contract used to hold a row for every service and combination.
+    CompanyContract = apps.get_model('customers', 'CompanyContract')
+    ContractService = apps.get_model('customers', 'ContractService')
+    ContractFreeDay = apps.get_model('customers', 'ContractFreeDay')
+    TerminalService = apps.get_model('core', 'TerminalService')
+    FreeDayCombination = apps.get_model('core', 'FreeDayCombination')
+
+    services = list(TerminalService.objects.all())
+    combinations = list(FreeDayCombination.objects.all())
+    for contract in CompanyContract.objects.iterator():
+        priced = set(
+            ContractService.objects.filter(contract=contract).values_list('service_id', flat=True)
+        )
+        ContractService.objects.bulk_create(
+            ContractService(contract=contract, service=service, price=service.base_price, quantity=1)
+            for service in services
+            if service.id not in priced
+        )
+        overridden = set(
+            ContractFreeDay.objects.filter(contract=contract).values_list(
+                'free_day_combination_id', flat=True
+            )
+        )
+        ContractFreeDay.objects.bulk_create(
+            ContractFreeDay(
+                contract=contract,
+                free_day_combination=combination,
+                free_days=(
+                    contract.free_days
+                    if contract.free_days is not None
+                    else combination.default_free_days
+                ),
+            )
+            for combination in combinations
+            if combination.id not in overridden
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0008_companycontract_free_days'),
+        ('containers', '0010_free_days_watchlist'),
+    ]
+
+    operations = [
+        migrations.RunPython(compact_contract_overrides, expand_contract_overrides),
+    ]
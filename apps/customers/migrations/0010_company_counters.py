@@ -0,0 +1,68 @@
+# Generated by Django 5.0.7 on 2026-10-19 11:20
+
+from django.db import migrations, models
+from django.db.models import Case, Count, Max, Q, Sum, When
+from django.db.models.functions import Coalesce, Greatest
+
+
+def count_visits(apps, schema_editor):
+    Company = apps.get_model('customers', 'Company')
+
+    in_terminal = Q(container_visits__exit_time__isnull=True)
+    companies = list(Company.objects.annotate(
+        actual_visits_count=Count('container_visits'),
+        actual_visits_in_terminal=Count('container_visits', filter=in_terminal),
+        actual_teu_in_terminal=Coalesce(
+            Sum(
+                Case(
+                    When(container_visits__container__size__in=['20', '20HC'], then=1),
+                    default=2,
+                ),
+                filter=in_terminal,
+            ),
+            0,
+        ),
+        actual_last_activity_at=Greatest(
+            Coalesce(
+                Max('container_visits__exit_time'), Max('container_visits__entry_time')
+            ),
+            Max('container_visits__entry_time'),
+        ),
+    ))
+    fields = ['visits_count', 'visits_in_terminal', 'teu_in_terminal', 'last_activity_at']
+    for company in companies:
+        for field in fields:
+            setattr(company, field, getattr(company, f'actual_{field}'))
+    Company.objects.bulk_update(companies, fields, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0009_compact_contract_overrides'),
+        ('containers', '0010_free_days_watchlist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='last_activity_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='teu_in_terminal',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='visits_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='visits_in_terminal',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_visits, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.0.7 on 2026-10-19 11:26
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def record_current_prices(apps, schema_editor):
+    # Earlier prices were not kept; the current one is taken to have applied
+    # since the row was created.
+    ContractService = apps.get_model('customers', 'ContractService')
+    ContractServicePrice = apps.get_model('customers', 'ContractServicePrice')
+
+    ContractServicePrice.objects.bulk_create(
+        (
+            ContractServicePrice(
+                contract_service_id=contract_service_id,
+                price=price,
+                effective_from=created_at,
+            )
+            for contract_service_id, price, created_at in ContractService.objects.values_list(
+                'id', 'price', 'created_at'
+            ).iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0010_company_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContractServicePrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(0)])),
+                ('effective_from', models.DateTimeField(default=django.utils.timezone.now)),
+                ('contract_service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prices', to='customers.contractservice')),
+            ],
+            options={
+                'verbose_name': 'Contract Service Price',
+                'verbose_name_plural': 'Contract Service Prices',
+                'db_table': 'contract_service_price',
+                'ordering': ['effective_from', 'id'],
+                'indexes': [models.Index(fields=['contract_service', 'effective_from'], name='contract_se_contrac_a7e08d_idx')],
+            },
+        ),
+        migrations.RunPython(record_current_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.7 on 2026-10-19 11:30
+
+from django.db import migrations, models
+from django.db.models import Case, Q, When
+from django.utils import timezone
+
+
+def keep_one_active_contract(apps, schema_editor):
+    # Of several active contracts of a company, the one running today stays
+    # active, else the one that started last.
+    CompanyContract = apps.get_model('customers', 'CompanyContract')
+
+    today = timezone.localdate()
+    running = Q(start_date__lte=today) & (Q(end_date__isnull=True) | Q(end_date__gte=today))
+    kept = set()
+    deactivated = []
+    for contract_id, company_id in CompanyContract.objects.filter(is_active=True).order_by(
+        'company_id', Case(When(running, then=0), default=1), '-start_date', '-id'
+    ).values_list('id', 'company_id'):
+        if company_id in kept:
+            deactivated.append(contract_id)
+        kept.add(company_id)
+    CompanyContract.objects.filter(id__in=deactivated).update(is_active=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0011_contract_service_price'),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_one_active_contract, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='companycontract',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('company',), name='unique_active_contract_per_company', violation_error_message='The company already has an active contract.'),
+        ),
+    ]
@@ -1,13 +1,56 @@
+import operator
+from functools import reduce
+
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator, MinValueValidator
 from django.db import models, transaction
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.text import slugify
 
-from apps.core.models import BaseModel, TerminalService, FreeDayCombination
+from apps.core.models import (
+    BaseModel,
+    TerminalService,
+    TerminalServiceType,
+    FreeDayCombination,
+)
 from apps.users.models import CustomUser
 
+# Changes whenever contract services or contract activation change, telling every
+# process to rebuild its service applicability matrices.
+SERVICE_MATRIX_CACHE_KEY = "service_matrix_stamp"
+# Part of every cached contract tariff key; changes whenever a default or an
+# override does.
+CONTRACT_TARIFF_STAMP_KEY = "contract_tariff_stamp"
+# Changes whenever a price of one of the contract's services is recorded,
+# telling every process to reload the contract's price history.
+CONTRACT_PRICE_STAMP_KEY = "contract_price_stamp:{contract}"
+# Changes whenever a contract is saved or deleted, telling every process to
+# reload the active contract of every company.
+ACTIVE_CONTRACT_STAMP_KEY = "active_contract_stamp"
+# Stamp of the cached dashboard figures of a company.
+COMPANY_DASHBOARD_STAMP_KEY = "company_dashboard_stamp:{company}"
+
+
+def clear_stamp(*keys):
+    """
+    Clear cache stamps now and again on commit, so that a process reloading in
+    between does not keep what it read before the change was visible.
+    """
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def clear_contract_price_stamps(contract_ids):
+    clear_stamp(
+        *[
+            CONTRACT_PRICE_STAMP_KEY.format(contract=contract_id)
+            for contract_id in contract_ids
+        ]
+    )
+
 
 class Company(BaseModel):
     name = models.CharField(
@@ -18,6 +61,12 @@ class Company(BaseModel):
     )
     address = models.TextField(blank=True)
     slug = models.SlugField(max_length=255, unique=True, db_index=True)
+    # Kept up to date by the visit signals; ``reconcile_company_counters``
+    # corrects drift from bulk changes.
+    visits_count = models.PositiveIntegerField(default=0)
+    visits_in_terminal = models.PositiveIntegerField(default=0)
+    teu_in_terminal = models.PositiveIntegerField(default=0)
+    last_activity_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         verbose_name_plural = "Companies"
@@ -77,7 +126,7 @@ class CompanyContract(BaseModel):
         constraints = [
             models.UniqueConstraint(
                 fields=["company", "start_date"], name="unique_company_start_date"
-            )
+            ),
         ]
         db_table = "customer_contract"
         verbose_name = "Customer Contract"
@@ -87,20 +136,13 @@ class CompanyContract(BaseModel):
         return f"Contract with {self.company} from {self.start_date}"
 
 
-@receiver(post_save, sender=CompanyContract)
-def link_free_day_combinations(sender, instance, created, **kwargs):
-    if created:
-        with transaction.atomic():
-            free_day_combinations = FreeDayCombination.objects.all()
-            for combination in free_day_combinations:
-                ContractFreeDay.objects.get_or_create(
-                    contract=instance,
-                    free_day_combination=combination,
-                    defaults={"free_days": instance.free_days or 0},
-                )
-
-
 class ContractService(BaseModel):
+    """
+    Price of a terminal service under a contract, where it differs from the
+    service's ``base_price``. A row at the base price only exists while visits
+    refer to it, and follows the base price when that changes.
+    """
+
     contract = models.ForeignKey(
         CompanyContract, on_delete=models.CASCADE, related_name="services"
     )
@@ -120,8 +162,66 @@ class ContractService(BaseModel):
     def __str__(self):
         return f"{self.service} for {self.contract.company} at {self.price}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_price = instance.__dict__.get("price")
+        return instance
+
+
+class ContractServicePrice(models.Model):
+    """
+    Price of a contract service from ``effective_from`` until the next row of
+    the same contract service, so that changing a price leaves the services
+    performed before the change at the old one.
+    """
+
+    contract_service = models.ForeignKey(
+        ContractService, on_delete=models.CASCADE, related_name="prices"
+    )
+    price = models.DecimalField(
+        max_digits=12, decimal_places=2, validators=[MinValueValidator(0)]
+    )
+    effective_from = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["effective_from", "id"]
+        db_table = "contract_service_price"
+        verbose_name = "Contract Service Price"
+        verbose_name_plural = "Contract Service Prices"
+        indexes = [models.Index(fields=["contract_service", "effective_from"])]
+
+    def __str__(self):
+        return f"{self.price} from {self.effective_from}"
+
+
+def record_contract_prices(contract_services, effective_from=None):
+    """
+    Add the current price of every contract service in a queryset to its
+    history, effective from now, in one ``INSERT``.
+    """
+    effective_from = effective_from or timezone.now()
+    rows = list(contract_services.values_list("id", "contract_id", "price"))
+    ContractServicePrice.objects.bulk_create(
+        (
+            ContractServicePrice(
+                contract_service_id=contract_service_id,
+                price=price,
+                effective_from=effective_from,
+            )
+            for contract_service_id, _, price in rows
+        ),
+        batch_size=1000,
+    )
+    clear_contract_price_stamps({contract_id for _, contract_id, _ in rows})
+
 
 class ContractFreeDay(BaseModel):
+    """
+    Free days of a combination under a contract, where they differ from the
+    contract's own ``free_days`` or, without those, the combination's default.
+    """
+
     contract = models.ForeignKey(
         CompanyContract, on_delete=models.CASCADE, related_name="contract_free_days"
     )
@@ -137,3 +237,97 @@ class ContractFreeDay(BaseModel):
 
     def __str__(self):
         return f"{self.contract.name} - {self.free_day_combination} - {self.free_days} days"
+
+
+@receiver(post_save, sender=CompanyContract)
+@receiver(post_delete, sender=CompanyContract)
+@receiver(post_save, sender=ContractService)
+@receiver(post_delete, sender=ContractService)
+@receiver(post_save, sender=TerminalService)
+@receiver(post_delete, sender=TerminalService)
+@receiver(post_save, sender=TerminalServiceType)
+@receiver(post_delete, sender=TerminalServiceType)
+@receiver(post_save, sender=ContractFreeDay)
+@receiver(post_delete, sender=ContractFreeDay)
+@receiver(post_save, sender=FreeDayCombination)
+@receiver(post_delete, sender=FreeDayCombination)
+def invalidate_contract_tariffs(sender, instance, **kwargs):
+    cache.delete_many([SERVICE_MATRIX_CACHE_KEY, CONTRACT_TARIFF_STAMP_KEY])
+
+
+def follow_base_prices(changes):
+    """
+    Move the contract services at the old base price of terminal services to
+    the new one, for ``{service_id: (old_price, new_price)}``, in one ``UPDATE``.
+    """
+    if not changes:
+        return
+    following_ids = list(
+        ContractService.objects.filter(
+            reduce(
+                operator.or_,
+                (
+                    models.Q(service_id=service_id, price=old_price)
+                    for service_id, (old_price, _) in changes.items()
+                ),
+            )
+        ).values_list("id", flat=True)
+    )
+    ContractService.objects.filter(id__in=following_ids).update(
+        price=models.Case(
+            *(
+                models.When(service_id=service_id, then=models.Value(new_price))
+                for service_id, (_, new_price) in changes.items()
+            ),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        )
+    )
+    record_contract_prices(ContractService.objects.filter(id__in=following_ids))
+
+
+@receiver(pre_save, sender=TerminalService)
+def follow_base_price(sender, instance, **kwargs):
+    """
+    Rows at the old base price are not overrides, so they move along with it.
+    """
+    if instance.pk is None:
+        return
+    old_price = (
+        TerminalService.objects.filter(pk=instance.pk)
+        .values_list("base_price", flat=True)
+        .first()
+    )
+    if old_price is not None and old_price != instance.base_price:
+        follow_base_prices({instance.pk: (old_price, instance.base_price)})
+
+
+@receiver(post_save, sender=ContractService)
+def record_contract_price(sender, instance, created, **kwargs):
+    price = instance._meta.get_field("price").to_python(instance.price)
+    if created or price != getattr(instance, "loaded_price", price):
+        ContractServicePrice.objects.create(contract_service=instance, price=price)
+    instance.loaded_price = price
+
+
+@receiver(post_save, sender=ContractServicePrice)
+@receiver(post_delete, sender=ContractServicePrice)
+def invalidate_contract_prices(sender, instance, **kwargs):
+    if sender._meta.get_field("contract_service").is_cached(instance):
+        contract_ids = [instance.contract_service.contract_id]
+    else:
+        contract_ids = ContractService.objects.filter(
+            id=instance.contract_service_id
+        ).values_list("contract_id", flat=True)
+    clear_contract_price_stamps(contract_ids)
+
+
+@receiver(post_save, sender=CompanyContract)
+@receiver(post_delete, sender=CompanyContract)
+def invalidate_active_contracts(sender, instance, **kwargs):
+    clear_stamp(ACTIVE_CONTRACT_STAMP_KEY)
+
+
+@receiver(post_save, sender=CompanyContract)
+@receiver(post_delete, sender=CompanyContract)
+def invalidate_company_dashboard(sender, instance, **kwargs):
+    cache.delete(COMPANY_DASHBOARD_STAMP_KEY.format(company=instance.company_id))
@@ -1,17 +1,64 @@
+import uuid
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
 from django.db import transaction, IntegrityError
-from django.db.models import Count, Subquery, OuterRef, Prefetch
+from django.db.models import (
+    Case,
+    Count,
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    FilteredRelation,
+    Q,
+    Subquery,
+    Max,
+    Sum,
+    Value,
+    When,
+    prefetch_related_objects,
+)
+from django.db.models.functions import Coalesce, Greatest, Round
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 
-from apps.core.models import TerminalService
-from apps.customers.filters import CompanyFilter, CompanyServiceFilter, FreeDaysFilter
+from apps.core.choices import ContainerSize, ContainerState
+from apps.core.models import FreeDayCombination, TerminalService
+from apps.customers.filters import CompanyFilter
+from apps.locations.services.stack_model import TWENTY_FOOT_SIZES
 from apps.customers.models import (
+    ACTIVE_CONTRACT_STAMP_KEY,
+    CONTRACT_PRICE_STAMP_KEY,
+    CONTRACT_TARIFF_STAMP_KEY,
+    SERVICE_MATRIX_CACHE_KEY,
     Company,
     CompanyContract,
     ContractService,
     ContractFreeDay,
+    ContractServicePrice,
+    record_contract_prices,
+)
+
+# Tariffs are invalidated through their stamp; the timeout only bounds memory.
+CONTRACT_TARIFF_CACHE_TIMEOUT = 60 * 60 * 24
+
+COUNTER_FIELDS = (
+    "visits_count",
+    "visits_in_terminal",
+    "teu_in_terminal",
+    "last_activity_at",
 )
 
+ABSOLUTE = "absolute"
+PERCENTAGE = "percentage"
+ROUNDING = "rounding"
+PRICE_RULES = (ABSOLUTE, PERCENTAGE, ROUNDING)
+PRICE_FIELD = DecimalField(max_digits=12, decimal_places=2)
+
 
 class CompanyService:
     def create_company(self, name, address):
@@ -26,24 +73,9 @@ class CompanyService:
 
     def get_all_companies(self, filters):
         filters = filters or {}
-        qs = (
-            Company.objects.annotate(
-                containers_count=Count("container_visits"),
-                active_contract=Subquery(
-                    CompanyContract.objects.filter(
-                        company=OuterRef("pk"), is_active=True
-                    ).values("pk")[:1]
-                ),
-            )
-            .prefetch_related(
-                Prefetch(
-                    "contracts",
-                    queryset=CompanyContract.objects.filter(is_active=True),
-                    to_attr="active_contract_list",
-                )
-            )
-            .order_by("-id")
-        )
+        # Visit figures come from the counters kept on every company, and the
+        # active contract from ``ActiveContractService``.
+        qs = Company.objects.order_by("-id")
 
         return CompanyFilter(filters, queryset=qs).qs
 
@@ -58,26 +90,151 @@ class CompanyService:
         company.delete()
 
 
+class CompanyCounterService:
+    """
+    Recounts the visit counters of companies from their visits and corrects
+    the ones that drifted, e.g. through queryset updates that send no signals.
+    Counts that change while it runs can be overwritten, so it is meant for
+    quiet hours.
+    """
+
+    def get_actual_counters(self):
+        in_terminal = Q(container_visits__exit_time__isnull=True)
+        return Company.objects.annotate(
+            actual_visits_count=Count("container_visits"),
+            actual_visits_in_terminal=Count("container_visits", filter=in_terminal),
+            actual_teu_in_terminal=Coalesce(
+                Sum(
+                    Case(
+                        When(
+                            container_visits__container__size__in=TWENTY_FOOT_SIZES,
+                            then=1,
+                        ),
+                        default=2,
+                    ),
+                    filter=in_terminal,
+                ),
+                0,
+            ),
+            actual_last_activity_at=Greatest(
+                Coalesce(
+                    Max("container_visits__exit_time"),
+                    Max("container_visits__entry_time"),
+                ),
+                Max("container_visits__entry_time"),
+            ),
+        )
+
+    @transaction.atomic
+    def reconcile(self):
+        drifted = []
+        for company in self.get_actual_counters():
+            changed = False
+            for field in COUNTER_FIELDS:
+                actual = getattr(company, f"actual_{field}")
+                if getattr(company, field) != actual:
+                    setattr(company, field, actual)
+                    changed = True
+            if changed:
+                drifted.append(company)
+        Company.objects.bulk_update(drifted, COUNTER_FIELDS, batch_size=1000)
+        return drifted
+
+
 class CompanyContractService:
     @transaction.atomic
     def create_contract(self, company_id, data):
-        try:
-            customer_contract = CompanyContract.objects.create(
-                company_id=company_id, **data
+        if data.get("is_active", True):
+            self._check_no_overlapping_contract(
+                company_id, data["start_date"], data.get("end_date")
             )
-            services = TerminalService.objects.all()
-            for service in services:
-                ContractServiceService().create(
-                    customer_contract.id, service.id, service.base_price
-                )
-            return customer_contract
-        except Exception as e:
-            # Log the exception if needed
-            raise e
+        contract = CompanyContract(company_id=company_id, **data)
+        contract.full_clean()
+        # Prices and free days default to the terminal's; only overrides are stored.
+        return self._save_new_contract(contract)
+
+    @transaction.atomic
+    def clone_contract(self, contract_id, data):
+        """
+        A new contract with the prices and free days of an existing one, for
+        the same company unless ``data`` has a ``company_id``.
+
+        Only overrides are copied, each table in one ``INSERT``, so cloning
+        costs the same few queries whatever the size of the tariff.
+        """
+        source = get_object_or_404(CompanyContract, id=contract_id)
+        data = {"company_id": source.company_id, "free_days": source.free_days, **data}
+        if CompanyContract.objects.filter(name=data["name"]).exists():
+            raise ValidationError(
+                {"name": ["A contract with this name already exists."]}
+            )
+        if CompanyContract.objects.filter(
+            company_id=data["company_id"], start_date=data["start_date"]
+        ).exists():
+            raise ValidationError(
+                {"start_date": ["The company already has a contract from this date."]}
+            )
+        if data.get("is_active", True):
+            self._check_no_overlapping_contract(
+                data["company_id"], data["start_date"], data.get("end_date")
+            )
+
+        contract = self._save_new_contract(CompanyContract(**data))
+        ContractService.objects.bulk_create(
+            ContractService(
+                contract=contract,
+                service_id=service_id,
+                price=price,
+                quantity=quantity,
+            )
+            # Rows at the base price only anchor the source's visits.
+            for service_id, price, quantity in ContractService.objects.filter(
+                contract=source
+            )
+            .exclude(price=F("service__base_price"))
+            .values_list("service_id", "price", "quantity")
+        )
+        record_contract_prices(ContractService.objects.filter(contract=contract))
+        ContractFreeDay.objects.bulk_create(
+            ContractFreeDay(
+                contract=contract,
+                free_day_combination_id=combination_id,
+                free_days=free_days,
+            )
+            for combination_id, free_days in source.contract_free_days.values_list(
+                "free_day_combination_id", "free_days"
+            )
+        )
+        # ``bulk_create`` sends no signals.
+        transaction.on_commit(
+            lambda: cache.delete_many(
+                [SERVICE_MATRIX_CACHE_KEY, CONTRACT_TARIFF_STAMP_KEY]
+            )
+        )
+        return contract
+
+    @transaction.atomic
+    def renew_contract(self, contract_id, data):
+        """
+        Clone a contract into the next period. The renewal is active from its
+        start date, and the renewed contract stays in force until the day before,
+        unless it ended earlier, so a renewal can be signed ahead of time.
+        """
+        source = get_object_or_404(CompanyContract, id=contract_id)
+        if data["start_date"] <= source.start_date:
+            raise ValidationError(
+                {"start_date": ["A renewal must start after the renewed contract."]}
+            )
+        last_day = data["start_date"] - timedelta(days=1)
+        if source.end_date is None or source.end_date > last_day:
+            source.end_date = last_day
+            source.save(update_fields=["end_date", "updated_at"])
+        return self.clone_contract(source.id, {**data, "is_active": True})
 
     def get_by_id(self, contract_id):
         return get_object_or_404(CompanyContract, id=contract_id)
 
+    @transaction.atomic
     def update_contract(self, contract_id, data):
         contract = get_object_or_404(CompanyContract, id=contract_id)
 
@@ -86,6 +243,13 @@ class CompanyContractService:
 
         for key, value in data.items():
             setattr(contract, key, value)
+        if contract.is_active:
+            self._check_no_overlapping_contract(
+                contract.company_id,
+                contract.start_date,
+                contract.end_date,
+                exclude_id=contract.id,
+            )
 
         try:
             # Attempt to save the contract
@@ -116,6 +280,103 @@ class CompanyContractService:
     def get_all_by_company(self, company_id):
         return CompanyContract.objects.filter(company_id=company_id)
 
+    def _check_no_overlapping_contract(
+        self, company_id, start_date, end_date=None, exclude_id=None
+    ):
+        """
+        Active contracts of a company cover separate periods, so that on any day
+        at most one of them applies; ``end_date`` of ``None`` runs open-ended.
+
+        Must run in the transaction that saves the contract: it locks the company
+        row, so that concurrent saves for one company check one after the other.
+        """
+        get_object_or_404(Company.objects.select_for_update(), id=company_id)
+        contracts = CompanyContract.objects.filter(
+            Q(end_date__isnull=True) | Q(end_date__gte=start_date),
+            company_id=company_id,
+            is_active=True,
+        ).exclude(id=exclude_id)
+        if end_date is not None:
+            contracts = contracts.filter(start_date__lte=end_date)
+        overlapping = contracts.order_by("start_date").first()
+        if overlapping is not None:
+            raise ValidationError(
+                {
+                    "is_active": [
+                        f"The company already has an active contract for these "
+                        f"dates, {overlapping.name}."
+                    ]
+                }
+            )
+
+    def _save_new_contract(self, contract):
+        try:
+            contract.save()
+        except IntegrityError:
+            # Another request took the name or start date since the check.
+            raise ValidationError(
+                {"name": ["A contract with this name or start date already exists."]}
+            )
+        return contract
+
+
+class ActiveContractService:
+    """
+    The contract in force for every company: the active one whose period,
+    ``start_date`` to ``end_date`` inclusive, covers the day.
+
+    All contracts flagged active are read in one query into a process-local map
+    of ``{company_id: [contract, ...]}``, reloaded when a contract is saved or
+    deleted, so resolving the contract of any number of companies needs no query
+    at all. Active contracts of a company never overlap, so a renewal can be
+    flagged active ahead of its start and takes over on that day. Callers must
+    not modify the dicts they get back.
+    """
+
+    _contracts = None
+    _stamp = None
+
+    def get_contracts(self):
+        stamp = cache.get(ACTIVE_CONTRACT_STAMP_KEY)
+        if stamp is None:
+            cache.add(ACTIVE_CONTRACT_STAMP_KEY, uuid.uuid4().hex, None)
+            stamp = cache.get(ACTIVE_CONTRACT_STAMP_KEY)
+        if (
+            ActiveContractService._contracts is None
+            or stamp != ActiveContractService._stamp
+        ):
+            contracts = defaultdict(list)
+            for contract in (
+                CompanyContract.objects.filter(is_active=True)
+                .order_by("start_date")
+                .values(
+                    "id", "company_id", "name", "start_date", "end_date", "free_days"
+                )
+            ):
+                contracts[contract["company_id"]].append(contract)
+            ActiveContractService._contracts = dict(contracts)
+            ActiveContractService._stamp = stamp
+        return ActiveContractService._contracts
+
+    def get_active_contract(self, company_id, today=None):
+        today = today or timezone.localdate()
+        for contract in self.get_contracts().get(company_id, ()):
+            if contract["start_date"] <= today and not self.has_ended(contract, today):
+                return contract
+        return None
+
+    def get_active_contract_ids(self, company_ids, today=None):
+        today = today or timezone.localdate()
+        contract_ids = {}
+        for company_id in company_ids:
+            contract = self.get_active_contract(company_id, today)
+            contract_ids[company_id] = contract["id"] if contract else None
+        return contract_ids
+
+    def has_ended(self, contract, today=None):
+        end_date = contract["end_date"]
+        return end_date is not None and end_date < (today or timezone.localdate())
+
 
 class ContractServiceService:
     def create(self, contract_id, service_id, price=0):
@@ -124,9 +385,12 @@ class ContractServiceService:
         )
 
     def get_services_by_contract(self, contract_id, filters=None):
-        filters = filters or {}
-        qs = ContractService.objects.filter(contract_id=contract_id)
-        return CompanyServiceFilter(filters, queryset=qs).qs
+        """
+        Every terminal service with its price under the contract.
+        """
+        contract = get_object_or_404(CompanyContract, id=contract_id)
+        tariff = ContractTariffService().get_tariff(contract.id)
+        return self._filter(tariff["services"], filters or {})
 
     def update_service(self, contract_id, service_id, data):
         service = get_object_or_404(
@@ -138,19 +402,52 @@ class ContractServiceService:
         return service
 
     def get_active_services_by_company(self, company_id, filters):
-        filters = filters or {}
-        qs = ContractService.objects.filter(
-            contract__company_id=company_id,
-            contract__is_active=True,
-        )
-        return CompanyServiceFilter(filters, queryset=qs).qs
+        contract_id = ActiveContractService().get_active_contract_ids([company_id])[
+            company_id
+        ]
+        if contract_id is None:
+            return []
+        tariff = ContractTariffService().get_tariff(contract_id)
+        return self._filter(tariff["services"], filters or {})
+
+    def set_price(self, contract_id, service_id, price):
+        return ContractTariffService().set_service_price(contract_id, service_id, price)
+
+    def _filter(self, services, filters):
+        # A service for "any" size or state matches every one of them.
+        return [
+            entry
+            for entry in services
+            if all(
+                entry["service"][field] in (filters[field], "any")
+                for field in ("container_size", "container_state")
+                if filters.get(field)
+            )
+        ]
 
 
 class ContractFreeDayService:
     def get_free_days_by_contract(self, contract_id, filters=None):
+        """
+        Free days of every combination under the contract.
+        """
         filters = filters or {}
-        qs = ContractFreeDay.objects.filter(contract_id=contract_id)
-        return FreeDaysFilter(filters, queryset=qs).qs
+        contract = get_object_or_404(CompanyContract, id=contract_id)
+        tariff = ContractTariffService().get_tariff(contract.id)
+        return [
+            entry
+            for entry in tariff["free_days"]
+            if all(
+                entry["free_day_combination"][field] == filters[field]
+                for field in ("container_size", "container_state", "category")
+                if filters.get(field)
+            )
+        ]
+
+    def set_free_days(self, contract_id, combination_id, free_days):
+        return ContractTariffService().set_free_days(
+            contract_id, combination_id, free_days
+        )
 
     def update_free_day(self, contract_id, free_day_id, data):
         free_day = get_object_or_404(
@@ -160,3 +457,551 @@ class ContractFreeDayService:
             setattr(free_day, key, value)
         free_day.save()
         return free_day
+
+
+class ContractServiceMatrixService:
+    """
+    Contract tariff services applicable to every (container size, container
+    state) of a contract, with their prices.
+
+    A service for "any" size or state is listed under each of them. The matrices
+    are kept per process and filled lazily; changing a contract, a contract
+    service, a terminal service or a service type clears the shared stamp in the
+    cache and every process drops its copy. The matrices are shared, so callers
+    must not modify the service dicts they get back.
+    """
+
+    _matrices = {}
+    _stamp = None
+
+    def get_matrices(self, contract_ids):
+        self._sync()
+        matrices = ContractServiceMatrixService._matrices
+        missing = {
+            contract_id for contract_id in contract_ids if contract_id is not None
+        } - matrices.keys()
+        if missing:
+            tariffs = ContractTariffService().get_tariffs(missing)
+            for contract_id in missing:
+                matrix = defaultdict(list)
+                for entry in tariffs[contract_id]["services"]:
+                    service = entry["service"]
+                    for size in self._expand(service["container_size"], ContainerSize):
+                        for state in self._expand(
+                            service["container_state"], ContainerState
+                        ):
+                            matrix[(size, state)].append(entry)
+                matrices[contract_id] = dict(matrix)
+        return {
+            contract_id: matrices.get(contract_id, {}) for contract_id in contract_ids
+        }
+
+    def get_applicable_services(self, company_id, container_size, container_state):
+        contract_id = ActiveContractService().get_active_contract_ids([company_id])[
+            company_id
+        ]
+        matrix = self.get_matrices([contract_id])[contract_id]
+        return matrix.get((container_size, container_state), [])
+
+    def _sync(self):
+        stamp = cache.get(SERVICE_MATRIX_CACHE_KEY)
+        if stamp is None:
+            cache.add(SERVICE_MATRIX_CACHE_KEY, uuid.uuid4().hex, None)
+            stamp = cache.get(SERVICE_MATRIX_CACHE_KEY)
+        if stamp != ContractServiceMatrixService._stamp:
+            ContractServiceMatrixService._matrices = {}
+            ContractServiceMatrixService._stamp = stamp
+
+    def _expand(self, value, choices):
+        if value == choices.ANY:
+            return [choice for choice in choices.values if choice != choices.ANY]
+        return [value]
+
+
+class ContractTariffService:
+    """
+    The services and free days of a contract: the terminal's defaults merged
+    with the contract's overrides.
+
+    Only ``ContractService`` and ``ContractFreeDay`` rows that differ from the
+    defaults are stored, plus the ``ContractService`` rows visits refer to. Each
+    half of a tariff is resolved in one query, a left join of the defaults with
+    the contract's overrides, and the merged tariff is cached per contract
+    under a stamp that changes with any default or override. Service entries
+    have the ``ContractService`` id, or ``None`` while the contract has no row
+    for the service; ``get_contract_service_ids`` creates the missing rows when
+    a visit needs one.
+    """
+
+    def get_tariff(self, contract_id):
+        return self.get_tariffs([contract_id])[contract_id]
+
+    def get_tariffs(self, contract_ids):
+        stamp = self._get_stamp()
+        keys = {
+            contract_id: f"contract_tariff:{contract_id}:{stamp}"
+            for contract_id in contract_ids
+        }
+        cached = cache.get_many(keys.values())
+        fresh = {
+            keys[contract_id]: {
+                "services": self._get_services(contract_id),
+                "free_days": self._get_free_days(contract_id),
+            }
+            for contract_id in contract_ids
+            if keys[contract_id] not in cached
+        }
+        if fresh:
+            cache.set_many(fresh, CONTRACT_TARIFF_CACHE_TIMEOUT)
+            cached.update(fresh)
+        return {contract_id: cached[key] for contract_id, key in keys.items()}
+
+    def get_contract_service_ids(self, contract_id, service_ids):
+        """
+        ``ContractService`` ids of terminal services under the contract, as
+        ``{service_id: contract_service_id}``, adding rows at the base price
+        for services the contract does not override.
+        """
+        service_ids = set(service_ids)
+        rows = ContractService.objects.filter(
+            contract_id=contract_id, service_id__in=service_ids
+        )
+        ids = dict(rows.values_list("service_id", "id"))
+        missing = service_ids - ids.keys()
+        if missing:
+            prices = dict(
+                TerminalService.objects.filter(id__in=missing).values_list(
+                    "id", "base_price"
+                )
+            )
+            unknown = sorted(missing - prices.keys())
+            if unknown:
+                raise ValidationError(
+                    {"service_id": [f"Services {unknown} do not exist."]}
+                )
+            ContractService.objects.bulk_create(
+                [
+                    ContractService(
+                        contract_id=contract_id, service_id=service_id, price=price
+                    )
+                    for service_id, price in prices.items()
+                ],
+                ignore_conflicts=True,
+            )
+            # ``bulk_create`` sends no signals, and the new ids belong in the tariff.
+            record_contract_prices(
+                rows.filter(service_id__in=prices, prices__isnull=True)
+            )
+            cache.delete_many([SERVICE_MATRIX_CACHE_KEY, CONTRACT_TARIFF_STAMP_KEY])
+            ids = dict(rows.values_list("service_id", "id"))
+        return ids
+
+    @transaction.atomic
+    def set_service_price(self, contract_id, service_id, price):
+        contract = get_object_or_404(CompanyContract, id=contract_id)
+        service = get_object_or_404(TerminalService, id=service_id)
+        price = Decimal(str(price))
+        override = ContractService.objects.filter(
+            contract=contract, service=service
+        ).first()
+        if override is None:
+            if price != service.base_price:
+                ContractService.objects.create(
+                    contract=contract, service=service, price=price
+                )
+        elif price == service.base_price and not self._is_referenced(override):
+            override.delete()
+        else:
+            override.price = price
+            override.save()
+        return self._get_entry(contract.id, "services", "service", service.id)
+
+    @transaction.atomic
+    def set_free_days(self, contract_id, combination_id, free_days):
+        contract = get_object_or_404(CompanyContract, id=contract_id)
+        combination = get_object_or_404(FreeDayCombination, id=combination_id)
+        default = (
+            contract.free_days
+            if contract.free_days is not None
+            else combination.default_free_days
+        )
+        if free_days == default:
+            ContractFreeDay.objects.filter(
+                contract=contract, free_day_combination=combination
+            ).delete()
+        else:
+            ContractFreeDay.objects.update_or_create(
+                contract=contract,
+                free_day_combination=combination,
+                defaults={"free_days": free_days},
+            )
+        return self._get_entry(
+            contract.id, "free_days", "free_day_combination", combination.id
+        )
+
+    def _get_stamp(self):
+        stamp = cache.get(CONTRACT_TARIFF_STAMP_KEY)
+        if stamp is None:
+            cache.add(CONTRACT_TARIFF_STAMP_KEY, uuid.uuid4().hex, None)
+            stamp = cache.get(CONTRACT_TARIFF_STAMP_KEY)
+        return stamp
+
+    def _get_entry(self, contract_id, part, key, default_id):
+        return next(
+            entry
+            for entry in self.get_tariff(contract_id)[part]
+            if entry[key]["id"] == default_id
+        )
+
+    def _is_referenced(self, contract_service):
+        return (
+            contract_service.container_instance_services.exists()
+            or contract_service.containers.exists()
+            or contract_service.dispatched_containers.exists()
+        )
+
+    def _get_services(self, contract_id):
+        rows = (
+            TerminalService.objects.annotate(
+                override=FilteredRelation(
+                    "contractservice",
+                    condition=Q(contractservice__contract_id=contract_id),
+                )
+            )
+            .values(
+                "id",
+                "name",
+                "description",
+                "container_size",
+                "container_state",
+                "base_price",
+                "multiple_usage",
+                "service_type_id",
+                "service_type__name",
+                "service_type__unit_of_measure",
+                contract_service_id=F("override__id"),
+                price=Coalesce("override__price", "base_price"),
+            )
+            .order_by("-id")
+        )
+        return [
+            {
+                "id": row["contract_service_id"],
+                "price": row["price"],
+                "is_override": row["price"] != row["base_price"],
+                "service": {
+                    "id": row["id"],
+                    "name": row["name"],
+                    "description": row["description"],
+                    "container_size": row["container_size"],
+                    "container_state": row["container_state"],
+                    "base_price": row["base_price"],
+                    "multiple_usage": row["multiple_usage"],
+                    "service_type": {
+                        "id": row["service_type_id"],
+                        "name": row["service_type__name"],
+                        "unit_of_measure": row["service_type__unit_of_measure"],
+                    }
+                    if row["service_type_id"]
+                    else None,
+                },
+            }
+            for row in rows
+        ]
+
+    def _get_free_days(self, contract_id):
+        rows = (
+            FreeDayCombination.objects.annotate(
+                override=FilteredRelation(
+                    "contract_free_days",
+                    condition=Q(contract_free_days__contract_id=contract_id),
+                )
+            )
+            .values(
+                "id",
+                "container_size",
+                "container_state",
+                "category",
+                "default_free_days",
+                contract_free_day_id=F("override__id"),
+                free_days=Coalesce(
+                    "override__free_days",
+                    Subquery(
+                        CompanyContract.objects.filter(id=contract_id).values(
+                            "free_days"
+                        )[:1]
+                    ),
+                    "default_free_days",
+                ),
+            )
+            .order_by("container_size", "container_state", "category")
+        )
+        return [
+            {
+                "id": row["contract_free_day_id"],
+                "free_days": row["free_days"],
+                "is_override": row["contract_free_day_id"] is not None,
+                "free_day_combination": {
+                    "id": row["id"],
+                    "container_size": row["container_size"],
+                    "container_state": row["container_state"],
+                    "category": row["category"],
+                    "default_free_days": row["default_free_days"],
+                },
+            }
+            for row in rows
+        ]
+
+
+class ContractPriceService:
+    """
+    Price of a contract service as of a moment, from its ``ContractServicePrice``
+    history.
+
+    Histories are kept in a process-local index per contract of
+    ``{contract_service_id: ([effective_from, ...], [price, ...])}``, each
+    reloaded in one query when its contract's stamp changes, so a price change
+    only reloads the contract it belongs to and every lookup is a binary search.
+    An instance checks the stamp of a contract once, so one is meant to serve a
+    whole request. A moment before the first
+    recorded price gets the first one: rows are only recorded from when they
+    were created, and visits never refer to a row before it exists.
+    """
+
+    # {contract_id: (stamp, {contract_service_id: (moments, prices)})}
+    _histories = {}
+
+    def __init__(self):
+        self.checked_contract_ids = set()
+
+    def load(self, contract_ids):
+        """
+        Bring the histories of the contracts up to date, with one cache read
+        for their stamps and one query for those that changed.
+        """
+        keys = {
+            CONTRACT_PRICE_STAMP_KEY.format(contract=contract_id): contract_id
+            for contract_id in set(contract_ids) - self.checked_contract_ids
+        }
+        if not keys:
+            return
+        stamps = cache.get_many(keys)
+        for key in keys.keys() - stamps.keys():
+            cache.add(key, uuid.uuid4().hex, None)
+        stamps.update(cache.get_many(keys.keys() - stamps.keys()))
+
+        stale = {
+            contract_id: stamps.get(key)
+            for key, contract_id in keys.items()
+            if ContractPriceService._histories.get(contract_id, (None,))[0]
+            != stamps.get(key)
+        }
+        if stale:
+            histories = {contract_id: {} for contract_id in stale}
+            for (
+                contract_id,
+                contract_service_id,
+                effective_from,
+                price,
+            ) in (
+                ContractServicePrice.objects.filter(
+                    contract_service__contract_id__in=stale
+                )
+                .order_by("contract_service_id", "effective_from", "id")
+                .values_list(
+                    "contract_service__contract_id",
+                    "contract_service_id",
+                    "effective_from",
+                    "price",
+                )
+            ):
+                moments, prices = histories[contract_id].setdefault(
+                    contract_service_id, ([], [])
+                )
+                moments.append(effective_from)
+                prices.append(price)
+            for contract_id, stamp in stale.items():
+                ContractPriceService._histories[contract_id] = (
+                    stamp,
+                    histories[contract_id],
+                )
+        self.checked_contract_ids.update(keys.values())
+
+    def load_visits(self, visits):
+        """
+        Load the contracts of every service performed on ``visits`` at once, for
+        serializing a page of them. Their services are prefetched along the way.
+        """
+        prefetch_related_objects(
+            visits, "services__contract_service__service__service_type"
+        )
+        self.load(
+            {
+                service.contract_service.contract_id
+                for visit in visits
+                for service in visit.services.all()
+            }
+        )
+        return self
+
+    def get_price(self, contract_id, contract_service_id, at, default=None):
+        self.load([contract_id])
+        history = ContractPriceService._histories[contract_id][1].get(
+            contract_service_id
+        )
+        if history is None:
+            return default
+        moments, prices = history
+        return prices[max(bisect_right(moments, at) - 1, 0)]
+
+    def get_instance_price(self, instance):
+        """
+        Price of a ``ContainerServiceInstance`` at the time it was performed.
+        """
+        return self.get_price(
+            instance.contract_service.contract_id,
+            instance.contract_service_id,
+            instance.performed_at,
+            default=instance.contract_service.price,
+        )
+
+
+class ContractPriceUpdateService:
+    """
+    Contract prices of many services changed at once by one rule: a new
+    ``absolute`` price, a ``percentage`` up or down, or just ``rounding`` to a
+    step such as 0.5 or 5, which can also finish either of the other two.
+
+    Contracts are picked by company or id, services by id, type, size or state;
+    an empty selection means all of them. The rule applies to the price a
+    contract actually pays: its override, or else the base price. Only the
+    prices the rule changes are read, in the same statements for a preview and
+    for an update, which writes them with one upsert. Overrides left at the base
+    price that no visit refers to are removed again, and the cached tariffs are
+    dropped together.
+    """
+
+    def update_prices(self, filters, rule, value=None, round_to=None, preview=False):
+        with transaction.atomic():
+            contracts, services = self._get_scope(filters)
+            changes = self.get_changes(contracts, services, rule, value, round_to)
+            if preview or not changes:
+                return {"updated": len(changes), "changes": changes if preview else []}
+
+            rows = ContractService.objects.bulk_create(
+                [
+                    ContractService(
+                        contract_id=change["contract_id"],
+                        service_id=change["service_id"],
+                        price=change["new_price"],
+                    )
+                    for change in changes
+                ],
+                update_conflicts=True,
+                unique_fields=["contract", "service"],
+                update_fields=["price", "updated_at"],
+                batch_size=1000,
+            )
+            changed = ContractService.objects.filter(id__in=[row.id for row in rows])
+            record_contract_prices(changed)
+            self._remove_default_rows(changed)
+            transaction.on_commit(
+                lambda: cache.delete_many(
+                    [SERVICE_MATRIX_CACHE_KEY, CONTRACT_TARIFF_STAMP_KEY]
+                )
+            )
+        return {"updated": len(changes), "changes": []}
+
+    def get_changes(self, contracts, services, rule, value=None, round_to=None):
+        """
+        Contract prices the rule changes, ordered by contract and service.
+
+        Overrides are computed row by row; the new base price of a service is
+        computed once and applies to every picked contract without an override.
+        """
+        changes = list(
+            ContractService.objects.filter(contract__in=contracts, service__in=services)
+            .annotate(new_price=self._get_new_price(F("price"), rule, value, round_to))
+            .exclude(price=F("new_price"))
+            .values(
+                "contract_id",
+                "service_id",
+                "new_price",
+                contract_name=F("contract__name"),
+                company_name=F("contract__company__name"),
+                service_name=F("service__name"),
+                old_price=F("price"),
+            )
+        )
+        defaults = {
+            service.pop("id"): service
+            for service in services.annotate(
+                new_price=self._get_new_price(F("base_price"), rule, value, round_to)
+            )
+            .exclude(base_price=F("new_price"))
+            .values(
+                "id", "new_price", service_name=F("name"), old_price=F("base_price")
+            )
+        }
+        if defaults:
+            overridden = set(
+                ContractService.objects.filter(
+                    contract__in=contracts, service_id__in=defaults
+                ).values_list("contract_id", "service_id")
+            )
+            changes.extend(
+                {
+                    "contract_id": contract["id"],
+                    "service_id": service_id,
+                    "contract_name": contract["name"],
+                    "company_name": contract["company_name"],
+                    **service,
+                }
+                for contract in contracts.values(
+                    "id", "name", company_name=F("company__name")
+                )
+                for service_id, service in defaults.items()
+                if (contract["id"], service_id) not in overridden
+            )
+        return sorted(
+            changes, key=lambda change: (change["contract_id"], change["service_id"])
+        )
+
+    def _get_scope(self, filters):
+        contracts = CompanyContract.objects.all()
+        if filters.get("company_ids"):
+            contracts = contracts.filter(company_id__in=filters["company_ids"])
+        if filters.get("contract_ids"):
+            contracts = contracts.filter(id__in=filters["contract_ids"])
+        if filters.get("active_only"):
+            contracts = contracts.filter(is_active=True)
+
+        services = TerminalService.objects.all()
+        if filters.get("service_ids"):
+            services = services.filter(id__in=filters["service_ids"])
+        if filters.get("service_type_id"):
+            services = services.filter(service_type_id=filters["service_type_id"])
+        for field in ("container_size", "container_state"):
+            if filters.get(field):
+                services = services.filter(**{field: filters[field]})
+        return contracts, services
+
+    def _remove_default_rows(self, contract_services):
+        contract_services.filter(price=F("service__base_price")).exclude(
+            container_instance_services__isnull=False
+        ).exclude(containers__isnull=False).exclude(
+            dispatched_containers__isnull=False
+        ).delete()
+
+    def _get_new_price(self, price, rule, value, round_to):
+        if rule == ABSOLUTE:
+            price = Value(value, output_field=PRICE_FIELD)
+        elif rule == PERCENTAGE:
+            price = price * Value(1 + value / 100, output_field=PRICE_FIELD)
+        if round_to:
+            step = Value(round_to, output_field=PRICE_FIELD)
+            price = Round(price / step) * step
+        return ExpressionWrapper(
+            Greatest(Round(price, 2), Value(0, output_field=PRICE_FIELD)),
+            output_field=PRICE_FIELD,
+        )
@@ -9,6 +9,8 @@ from apps.customers.apis.company import (
 )
 from apps.customers.apis.company_contract import (
     CompanyContractCreateApi,
+    CompanyContractCloneApi,
+    CompanyContractRenewApi,
     CompanyContractByCompanyListApi,
     CompanyServiceListByContractApi,
     CompanyContractUpdateApi,
@@ -18,6 +20,9 @@ from apps.customers.apis.company_contract import (
     CompanyActiveServiceListByCompanyApi,
     ContractFreeDaysListApi,
     CompanyFreeDaysUpdateApi,
+    ContractServicePriceApi,
+    ContractServiceBulkPriceApi,
+    ContractCombinationFreeDaysApi,
 )
 
 contract_patterns = [
@@ -26,6 +31,16 @@ contract_patterns = [
         CompanyContractCreateApi.as_view(),
         name="company_contract_create",
     ),
+    path(
+        "<int:contract_id>/clone/",
+        CompanyContractCloneApi.as_view(),
+        name="company_contract_clone",
+    ),
+    path(
+        "<int:contract_id>/renew/",
+        CompanyContractRenewApi.as_view(),
+        name="company_contract_renew",
+    ),
     path(
         "list/by_company/<int:company_id>/",
         CompanyContractByCompanyListApi.as_view(),
@@ -61,6 +76,21 @@ contract_patterns = [
         CompanyServiceUpdateApi.as_view(),
         name="company_contract_update",
     ),
+    path(
+        "services/bulk_price/",
+        ContractServiceBulkPriceApi.as_view(),
+        name="contract_service_bulk_price",
+    ),
+    path(
+        "<int:contract_id>/tariff/services/<int:service_id>/",
+        ContractServicePriceApi.as_view(),
+        name="contract_service_price",
+    ),
+    path(
+        "<int:contract_id>/tariff/free_days/<int:combination_id>/",
+        ContractCombinationFreeDaysApi.as_view(),
+        name="contract_combination_free_days",
+    ),
     path(
         "<int:contract_id>/free_days/list/",
         ContractFreeDaysListApi.as_view(),
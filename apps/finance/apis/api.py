@@ -7,6 +7,7 @@ from rest_framework.views import APIView
 
 from ..services.container_storage_finance import ContainerFinanceService
 from ...customers.models import ContractService
+from ...customers.services import ContractPriceService
 
 
 from rest_framework.response import Response
@@ -50,9 +51,10 @@ class ContainerStorageFinanceList(APIView):
             service_names = self.context.get("service_names", [])
             service_mapping = {name: 0 for name in service_names}
 
+            prices = self.context["prices"]
             for service_instance in obj.services.all():
                 service_name = service_instance.contract_service.service.name
-                price = service_instance.contract_service.price
+                price = prices.get_instance_price(service_instance)
                 if service_name in service_mapping:
                     service_mapping[service_name] += float(price)
 
@@ -134,7 +136,12 @@ class ContainerStorageFinanceList(APIView):
 
         # Serialize the paginated data
         serializer = self.ContainerStorageOutputSerializer(
-            paginated_qs, many=True, context={"service_names": service_names}
+            paginated_qs,
+            many=True,
+            context={
+                "service_names": service_names,
+                "prices": ContractPriceService().load_visits(paginated_qs),
+            },
         )
 
         # Prepare the response
@@ -0,0 +1,153 @@
+from drf_spectacular.utils import extend_schema
+from rest_framework import serializers, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from apps.core.utils import inline_serializer
+from apps.locations.services.container_location import ContainerLocationService
+from apps.locations.services.retrieval_planner import RetrievalPlannerService
+from apps.locations.services.train_loading_planner import TrainLoadingPlannerService
+from apps.locations.services.yard_history import YardHistoryService
+
+
+def position_serializer(**kwargs):
+    return inline_serializer(
+        fields={
+            "yard_id": serializers.IntegerField(read_only=True),
+            "row": serializers.IntegerField(read_only=True),
+            "column_start": serializers.IntegerField(read_only=True),
+            "column_end": serializers.IntegerField(read_only=True),
+            "tier": serializers.IntegerField(read_only=True),
+        },
+        **kwargs,
+    )
+
+
+class ContainerLocationBulkMoveApi(APIView):
+    class ContainerLocationMoveSerializer(serializers.Serializer):
+        container_id = serializers.IntegerField()
+        yard_id = serializers.IntegerField(required=False, allow_null=True)
+        row = serializers.IntegerField(min_value=1)
+        column_start = serializers.IntegerField(min_value=1)
+        tier = serializers.IntegerField(min_value=1)
+
+    class ContainerLocationOutputSerializer(serializers.Serializer):
+        id = serializers.IntegerField(read_only=True)
+        container_id = serializers.IntegerField(read_only=True)
+        yard_id = serializers.IntegerField(read_only=True)
+        row = serializers.IntegerField(read_only=True)
+        column_start = serializers.IntegerField(read_only=True)
+        column_end = serializers.IntegerField(read_only=True)
+        tier = serializers.IntegerField(read_only=True)
+
+    @extend_schema(
+        summary="Move many containers in one transaction",
+        request=ContainerLocationMoveSerializer(many=True),
+        responses=ContainerLocationOutputSerializer(many=True),
+    )
+    def post(self, request):
+        serializer = self.ContainerLocationMoveSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        locations = ContainerLocationService().bulk_move(serializer.validated_data)
+        return Response(
+            self.ContainerLocationOutputSerializer(locations, many=True).data,
+            status=status.HTTP_200_OK,
+        )
+
+
+class ContainerRetrievalPlanApi(APIView):
+    class ContainerRetrievalPlanOutputSerializer(serializers.Serializer):
+        container_id = serializers.IntegerField(read_only=True)
+        container_name = serializers.CharField(read_only=True)
+        location = position_serializer()
+        moves = inline_serializer(
+            fields={
+                "step": serializers.IntegerField(read_only=True),
+                "container_id": serializers.IntegerField(read_only=True),
+                "container_name": serializers.CharField(read_only=True),
+                "from": position_serializer(),
+                "to": position_serializer(),
+            },
+            many=True,
+        )
+
+    @extend_schema(
+        summary="Plan the moves needed to dig out a container",
+        responses=ContainerRetrievalPlanOutputSerializer,
+    )
+    def get(self, request, container_id):
+        plan = RetrievalPlannerService().get_retrieval_plan(container_id)
+        return Response(
+            self.ContainerRetrievalPlanOutputSerializer(plan).data,
+            status=status.HTTP_200_OK,
+        )
+
+
+class TrainLoadingPlanApi(APIView):
+    class TrainLoadingPlanSerializer(serializers.Serializer):
+        visit_ids = serializers.ListField(
+            child=serializers.IntegerField(), allow_empty=False
+        )
+
+    class TrainLoadingPlanOutputSerializer(serializers.Serializer):
+        moves = inline_serializer(
+            fields={
+                "step": serializers.IntegerField(read_only=True),
+                "action": serializers.ChoiceField(
+                    choices=["relocate", "retrieve"], read_only=True
+                ),
+                "visit_id": serializers.IntegerField(read_only=True, allow_null=True),
+                "container_id": serializers.IntegerField(read_only=True),
+                "container_name": serializers.CharField(read_only=True),
+                "from": position_serializer(),
+                "to": position_serializer(allow_null=True),
+            },
+            many=True,
+        )
+        total_rehandles = serializers.IntegerField(read_only=True)
+        total_travel = serializers.FloatField(read_only=True)
+
+    @extend_schema(
+        summary="Plan the retrieval order for dispatching a batch of visits",
+        request=TrainLoadingPlanSerializer,
+        responses=TrainLoadingPlanOutputSerializer,
+    )
+    def post(self, request):
+        serializer = self.TrainLoadingPlanSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        plan = TrainLoadingPlannerService().get_loading_plan(
+            serializer.validated_data["visit_ids"]
+        )
+        return Response(
+            self.TrainLoadingPlanOutputSerializer(plan).data,
+            status=status.HTTP_200_OK,
+        )
+
+
+class ContainerPositionHistoryApi(APIView):
+    class FilterSerializer(serializers.Serializer):
+        container_name = serializers.CharField()
+        at = serializers.DateTimeField()
+
+    class ContainerPositionOutputSerializer(serializers.Serializer):
+        container_id = serializers.IntegerField(read_only=True)
+        container_name = serializers.CharField(read_only=True)
+        at = serializers.DateTimeField(read_only=True)
+        position = position_serializer(allow_null=True)
+
+    @extend_schema(
+        summary="Where a container was at a moment in the past",
+        parameters=[FilterSerializer],
+        responses=ContainerPositionOutputSerializer,
+    )
+    def get(self, request):
+        serializer = self.FilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        position = YardHistoryService().get_container_position(
+            serializer.validated_data["container_name"],
+            serializer.validated_data["at"],
+        )
+        return Response(
+            self.ContainerPositionOutputSerializer(position).data,
+            status=status.HTTP_200_OK,
+        )
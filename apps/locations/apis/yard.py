@@ -0,0 +1,367 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.utils.http import parse_etags, quote_etag
+from django.views.decorators.gzip import gzip_page
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from rest_framework import serializers, status
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from apps.core.choices import ContainerSize
+from apps.core.pagination import LimitOffsetPagination
+from apps.core.utils import inline_serializer
+from apps.locations.services.spatial_index import SpatialIndexService
+from apps.locations.services.yard import YardService
+from apps.locations.services.yard_capacity import YardCapacityService
+from apps.locations.services.yard_change import MAX_WAIT, YardChangeService
+from apps.locations.services.yard_heatmap import YardHeatmapService
+from apps.locations.services.yard_history import YardHistoryService
+from apps.locations.services.yard_reconciliation import YardReconciliationService
+from apps.locations.services.yard_snapshot import YardSnapshotService
+
+
+class YardListApi(APIView):
+    class FilterSerializer(serializers.Serializer):
+        yard_id = serializers.IntegerField(required=False)
+        container_name = serializers.CharField(required=False)
+        container_types = serializers.CharField(required=False)
+        date = serializers.DateField(required=False)
+        customer_name = serializers.CharField(required=False)
+        is_empty = serializers.BooleanField(required=False, allow_null=True)
+        notes = serializers.CharField(required=False)
+
+    class Pagination(LimitOffsetPagination):
+        default_limit = 100
+        max_limit = 100
+
+    def get(self, request):
+        serializer = self.FilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        yards = YardService().get_all(serializer.validated_data)
+        return Response(yards)
+
+
+@method_decorator(gzip_page, name="dispatch")
+class YardSnapshotApi(APIView):
+    class FilterSerializer(serializers.Serializer):
+        yard_id = serializers.IntegerField(required=False)
+
+    @extend_schema(
+        summary="Columnar occupancy snapshot for the 3-D yard view",
+        parameters=[
+            OpenApiParameter(name="yard_id", required=False, type=OpenApiTypes.INT)
+        ],
+        responses=OpenApiTypes.OBJECT,
+    )
+    def get(self, request):
+        serializer = self.FilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        service = YardSnapshotService()
+        yards = service.get_yards(serializer.validated_data.get("yard_id"))
+        etag = quote_etag(service.get_tag(yards))
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+        # GZip turns the ETag into a weak one, so compare without the W/ prefix.
+        if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+        if etag in {tag.removeprefix("W/") for tag in if_none_match}:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        snapshot = service.get_snapshot(yards, etag.strip('"'))
+        return Response(snapshot, status=status.HTTP_200_OK, headers=headers)
+
+
+class YardChangeListApi(APIView):
+    class FilterSerializer(serializers.Serializer):
+        since = serializers.IntegerField(min_value=0)
+        yard_id = serializers.IntegerField(required=False)
+        wait = serializers.IntegerField(
+            required=False, default=0, min_value=0, max_value=MAX_WAIT
+        )
+        limit = serializers.IntegerField(
+            required=False, default=1000, min_value=1, max_value=1000
+        )
+
+    @extend_schema(
+        summary="Yard changes after a sequence number, optionally long-polling",
+        parameters=[FilterSerializer],
+        responses=OpenApiTypes.OBJECT,
+    )
+    def get(self, request):
+        serializer = self.FilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        changes = YardChangeService().wait_for_changes(
+            data["since"], data.get("yard_id"), data["wait"], data["limit"]
+        )
+        return Response(changes, status=status.HTTP_200_OK)
+
+
+class EventStreamRenderer(BaseRenderer):
+    media_type = "text/event-stream"
+    format = "event-stream"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Only errors are rendered here; events are streamed by the view itself.
+        return json.dumps(data, cls=DjangoJSONEncoder)
+
+
+class YardChangeStreamApi(APIView):
+    renderer_classes = [EventStreamRenderer, JSONRenderer]
+
+    class FilterSerializer(serializers.Serializer):
+        since = serializers.IntegerField(required=False, default=0, min_value=0)
+        yard_id = serializers.IntegerField(required=False)
+
+    @extend_schema(
+        summary="Server-sent event stream of yard changes",
+        parameters=[FilterSerializer],
+        responses={(200, "text/event-stream"): OpenApiTypes.STR},
+    )
+    def get(self, request):
+        serializer = self.FilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        since = serializer.validated_data["since"]
+        last_event_id = request.headers.get("Last-Event-ID", "")
+        if last_event_id.isdigit():
+            since = int(last_event_id)
+
+        response = StreamingHttpResponse(
+            YardChangeService().stream_changes(
+                since, serializer.validated_data.get("yard_id")
+            ),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+class YardHistoryApi(APIView):
+    class FilterSerializer(serializers.Serializer):
+        at = serializers.DateTimeField()
+
+    class YardHistoryOutputSerializer(serializers.Serializer):
+        yard_id = serializers.IntegerField(read_only=True)
+        at = serializers.DateTimeField(read_only=True)
+        locations = inline_serializer(
+            fields={
+                "id": serializers.IntegerField(read_only=True),
+                "container_id": serializers.IntegerField(read_only=True),
+                "container_name": serializers.CharField(read_only=True),
+                "container_size": serializers.CharField(read_only=True),
+                "row": serializers.IntegerField(read_only=True),
+                "column_start": serializers.IntegerField(read_only=True),
+                "column_end": serializers.IntegerField(read_only=True),
+                "tier": serializers.IntegerField(read_only=True),
+            },
+            many=True,
+        )
+
+    @extend_schema(
+        summary="Yard occupancy as of a moment in the past",
+        parameters=[FilterSerializer],
+        responses=YardHistoryOutputSerializer,
+    )
+    def get(self, request, pk):
+        serializer = self.FilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        occupancy = YardHistoryService().get_yard_occupancy(
+            pk, serializer.validated_data["at"]
+        )
+        return Response(
+            self.YardHistoryOutputSerializer(occupancy).data, status=status.HTTP_200_OK
+        )
+
+
+class YardReconciliationApi(APIView):
+    class YardScanSerializer(serializers.Serializer):
+        yard_ids = serializers.ListField(
+            child=serializers.IntegerField(), required=False, default=list
+        )
+        items = inline_serializer(
+            fields={
+                "container_name": serializers.CharField(max_length=12),
+                "yard_id": serializers.IntegerField(),
+                "row": serializers.IntegerField(min_value=1),
+                "column_start": serializers.IntegerField(min_value=1),
+                "tier": serializers.IntegerField(min_value=1),
+            },
+            many=True,
+        )
+        apply = serializers.BooleanField(required=False, default=False)
+
+    @extend_schema(
+        summary="Compare a physical yard scan with the recorded state",
+        request=YardScanSerializer,
+        responses=OpenApiTypes.OBJECT,
+    )
+    def post(self, request):
+        serializer = self.YardScanSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = YardReconciliationService().reconcile(**serializer.validated_data)
+        return Response(result, status=status.HTTP_200_OK)
+
+
+class SpatialStackApi(APIView):
+    class FilterSerializer(serializers.Serializer):
+        x = serializers.FloatField(required=False)
+        z = serializers.FloatField(required=False)
+        radius = serializers.FloatField(required=False, min_value=0, max_value=1000)
+        min_x = serializers.FloatField(required=False)
+        min_z = serializers.FloatField(required=False)
+        max_x = serializers.FloatField(required=False)
+        max_z = serializers.FloatField(required=False)
+
+        def validate(self, attrs):
+            circle = [attrs.get(field) for field in ("x", "z", "radius")]
+            bbox = [attrs.get(field) for field in ("min_x", "min_z", "max_x", "max_z")]
+            if None not in bbox:
+                if bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+                    raise serializers.ValidationError("Bounding box is inverted.")
+                if bbox[2] - bbox[0] > 1000 or bbox[3] - bbox[1] > 1000:
+                    raise serializers.ValidationError("Bounding box is too large.")
+                return {"bbox": bbox}
+            if None not in circle:
+                return dict(zip(("x", "z", "radius"), circle))
+            raise serializers.ValidationError(
+                "Pass either x, z and radius or min_x, min_z, max_x and max_z."
+            )
+
+    @extend_schema(
+        summary="Stacks within a radius or bounding box, in world coordinates",
+        parameters=[FilterSerializer],
+        responses=OpenApiTypes.OBJECT,
+    )
+    def get(self, request):
+        serializer = self.FilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        stacks = SpatialIndexService().get_stacks(**serializer.validated_data)
+        return Response(stacks, status=status.HTTP_200_OK)
+
+
+class SpatialYardApi(SpatialStackApi):
+    @extend_schema(
+        summary="Yards whose footprint meets a radius or bounding box",
+        parameters=[SpatialStackApi.FilterSerializer],
+        responses=OpenApiTypes.OBJECT,
+    )
+    def get(self, request):
+        serializer = self.FilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        yards = SpatialIndexService().get_yards(**serializer.validated_data)
+        return Response(yards, status=status.HTTP_200_OK)
+
+
+class YardHeatmapApi(APIView):
+    class YardHeatmapOutputSerializer(serializers.Serializer):
+        yard_id = serializers.IntegerField(read_only=True)
+        date = serializers.DateField(read_only=True)
+        rows = serializers.IntegerField(read_only=True)
+        columns = serializers.IntegerField(read_only=True)
+        avg_dwell_days = serializers.ListField(
+            child=serializers.ListField(child=serializers.FloatField(allow_null=True)),
+            read_only=True,
+        )
+        max_dwell_days = serializers.ListField(
+            child=serializers.ListField(
+                child=serializers.IntegerField(allow_null=True)
+            ),
+            read_only=True,
+        )
+        stack_height = serializers.ListField(
+            child=serializers.ListField(child=serializers.IntegerField()),
+            read_only=True,
+        )
+
+    @extend_schema(
+        summary="Per-bay dwell days and stack height of a yard",
+        responses=YardHeatmapOutputSerializer,
+    )
+    def get(self, request, pk):
+        heatmap = YardHeatmapService().get_heatmap(pk)
+        return Response(heatmap, status=status.HTTP_200_OK)
+
+
+class YardCapacityApi(APIView):
+    @extend_schema(
+        summary="Free capacity per yard and container size class",
+        responses=OpenApiTypes.OBJECT,
+    )
+    def get(self, request):
+        summary = YardCapacityService().get_summary()
+        return Response(summary, status=status.HTTP_200_OK)
+
+
+class AvailablePlacesApi(APIView):
+    class FilterSerializer(serializers.Serializer):
+        container_type = serializers.ChoiceField(
+            choices=ContainerSize.choices, required=True
+        )
+        customer_id = serializers.IntegerField(required=False)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="container_type",
+                required=True,
+                type=OpenApiTypes.STR,
+            ),
+            OpenApiParameter(
+                name="customer_id",
+                required=False,
+                type=OpenApiTypes.INT,
+            ),
+        ]
+    )
+    def get(self, request):
+        serializer = self.FilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        container_type = serializer.validated_data["container_type"]
+        customer_id = serializer.validated_data.get("customer_id", None)
+        yards = YardService().get_places(container_type, customer_id)
+        return Response(yards, status=status.HTTP_200_OK)
+
+
+class YardCreateApi(APIView):
+    class YardCreateSerializer(serializers.Serializer):
+        name = serializers.CharField(required=True)
+        max_rows = serializers.IntegerField(required=True)
+        max_columns = serializers.IntegerField(required=True)
+        max_tiers = serializers.IntegerField(required=False, default=10)
+        x_coordinate = serializers.FloatField(required=True)
+        z_coordinate = serializers.FloatField(required=True)
+        rotation_degree = serializers.FloatField(required=False, default=0)
+
+    def post(self, request):
+        serializer = self.YardCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        yard = YardService().create(serializer.validated_data)
+        return Response(
+            self.YardCreateSerializer(yard).data, status=status.HTTP_201_CREATED
+        )
+
+
+class YardUpdateApi(APIView):
+    class YardUpdateSerializer(serializers.Serializer):
+        id = serializers.IntegerField(read_only=True)
+        name = serializers.CharField(required=True)
+        max_rows = serializers.IntegerField(required=True)
+        max_columns = serializers.IntegerField(required=True)
+        max_tiers = serializers.IntegerField(required=False, default=10)
+        x_coordinate = serializers.FloatField(required=True)
+        z_coordinate = serializers.FloatField(required=True)
+        rotation_degree = serializers.FloatField(required=False, default=0)
+
+    def put(self, request, pk):
+        serializer = self.YardUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        yard = YardService().update(pk, serializer.validated_data)
+        return Response(self.YardUpdateSerializer(yard).data, status=status.HTTP_200_OK)
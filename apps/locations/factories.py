@@ -0,0 +1,90 @@
+import random
+
+import factory
+
+from apps.containers.factories import ContainerFactory
+from apps.core.choices import ContainerSize
+from apps.core.models import Container
+from apps.locations.models import ContainerLocation, Yard
+from apps.locations.services.stack_model import YardStackModel, get_columns_needed
+
+
+class YardFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = Yard
+        django_get_or_create = ("name",)
+
+    name = factory.Sequence(lambda n: f"Yard {n}")
+    max_rows = 6
+    max_columns = 20
+    max_tiers = 4
+    x_coordinate = factory.Sequence(lambda n: n * 60.0)
+    z_coordinate = 0.0
+    rotation_degree = 0.0
+
+
+class ContainerLocationFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = ContainerLocation
+
+    container = factory.SubFactory(ContainerFactory)
+    yard = factory.SubFactory(YardFactory)
+    row = 1
+    column_start = 1
+    column_end = factory.LazyAttribute(
+        lambda location: location.column_start
+        + get_columns_needed(location.container.size)
+        - 1
+    )
+    tier = 1
+
+
+def fill_yard(yard, fill_ratio=0.75, seed=None, sizes=None):
+    """
+    Stack random boxes into ``yard`` following the support rules until
+    ``fill_ratio`` of its cells are used, and return the created locations.
+
+    Rows are bulk inserted, so this is cheap enough for benchmark fixtures.
+    """
+    rng = random.Random(seed)
+    sizes = sizes or [ContainerSize.TWENTY, ContainerSize.FORTY]
+    model = YardStackModel(yard)
+    target_cells = int(yard.max_rows * yard.max_columns * yard.max_tiers * fill_ratio)
+
+    placements = []
+    while len(model.cells) < target_cells:
+        size = rng.choice(sizes)
+        slots = list(model.iter_free_slots(get_columns_needed(size)))
+        if not slots:
+            sizes = [other for other in sizes if other != size]
+            if not sizes:
+                break
+            continue
+        row, column_start, column_end, tier = rng.choice(slots)
+        placement = {
+            "id": len(placements) + 1,
+            "size": size,
+            "row": row,
+            "column_start": column_start,
+            "column_end": column_end,
+            "tier": tier,
+        }
+        model.add(placement)
+        placements.append(placement)
+
+    containers = Container.objects.bulk_create(
+        [ContainerFactory.build(size=placement["size"]) for placement in placements]
+    )
+    return ContainerLocation.objects.bulk_create(
+        [
+            ContainerLocationFactory.build(
+                container=container,
+                yard=yard,
+                row=placement["row"],
+                column_start=placement["column_start"],
+                column_end=placement["column_end"],
+                tier=placement["tier"],
+            )
+            for container, placement in zip(containers, placements)
+        ]
+    )
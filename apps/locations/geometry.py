@@ -0,0 +1,82 @@
+import math
+
+# Grid pitch of a yard in scene units (metres): a column holds one 20ft box
+# lengthwise, a row one box widthwise, both with a working gap.
+COLUMN_LENGTH = 6.1
+ROW_WIDTH = 2.6
+
+
+def get_yard_origin(yard):
+    return yard.x_coordinate or 0.0, yard.z_coordinate or 0.0
+
+
+def to_world(yard, local_x, local_z):
+    """
+    Rotate a point of the yard's local grid by ``rotation_degree`` around the yard
+    origin and translate it to (``x_coordinate``, ``z_coordinate``).
+    """
+    origin_x, origin_z = get_yard_origin(yard)
+    angle = math.radians(yard.rotation_degree or 0.0)
+    cos, sin = math.cos(angle), math.sin(angle)
+    return (
+        origin_x + local_x * cos - local_z * sin,
+        origin_z + local_x * sin + local_z * cos,
+    )
+
+
+def get_slot_center(yard, row, column_start, column_end):
+    local_x = (column_start - 1 + column_end) / 2 * COLUMN_LENGTH
+    local_z = (row - 0.5) * ROW_WIDTH
+    return to_world(yard, local_x, local_z)
+
+
+def get_distance(first, second):
+    return math.hypot(first[0] - second[0], first[1] - second[1])
+
+
+def to_local(yard, x, z):
+    """
+    Inverse of ``to_world``: a world point in the yard's local grid coordinates.
+    """
+    origin_x, origin_z = get_yard_origin(yard)
+    angle = math.radians(yard.rotation_degree or 0.0)
+    cos, sin = math.cos(angle), math.sin(angle)
+    dx, dz = x - origin_x, z - origin_z
+    return dx * cos + dz * sin, -dx * sin + dz * cos
+
+
+def get_yard_size(yard):
+    return yard.max_columns * COLUMN_LENGTH, yard.max_rows * ROW_WIDTH
+
+
+def get_yard_footprint(yard):
+    """
+    World corners of the yard's rotated rectangle, in order around it.
+    """
+    length, width = get_yard_size(yard)
+    return [
+        to_world(yard, local_x, local_z)
+        for local_x, local_z in ((0, 0), (length, 0), (length, width), (0, width))
+    ]
+
+
+def get_bounds(points):
+    xs, zs = [point[0] for point in points], [point[1] for point in points]
+    return min(xs), min(zs), max(xs), max(zs)
+
+
+def polygons_intersect(first, second):
+    """
+    Separating axis test for two convex polygons given as ordered corners.
+    """
+    for polygon in (first, second):
+        for index, (x1, z1) in enumerate(polygon):
+            x2, z2 = polygon[(index + 1) % len(polygon)]
+            axis = (z1 - z2, x2 - x1)
+            first_projection = [x * axis[0] + z * axis[1] for x, z in first]
+            second_projection = [x * axis[0] + z * axis[1] for x, z in second]
+            if max(first_projection) < min(second_projection) or max(
+                second_projection
+            ) < min(first_projection):
+                return False
+    return True
@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+
+from apps.locations.services.yard_history import YardHistoryService
+
+
+class Command(BaseCommand):
+    help = "Store the current occupancy of every yard as a history checkpoint"
+
+    def handle(self, *args, **kwargs):
+        checkpoints = YardHistoryService().create_checkpoints()
+        self.stdout.write(
+            self.style.SUCCESS(f"Created {len(checkpoints)} yard checkpoints.")
+        )
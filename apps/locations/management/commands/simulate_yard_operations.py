@@ -0,0 +1,69 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a synthetic period of arrivals, moves and dispatches against fresh "
+        "yards and report throughput, latency and query counts per operation"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--yards", type=int, default=3)
+        parser.add_argument("--days", type=int, default=365)
+        parser.add_argument("--arrivals-per-day", type=int, default=20)
+        parser.add_argument("--moves-per-day", type=int, default=5)
+        parser.add_argument("--mean-dwell-days", type=float, default=7)
+        parser.add_argument("--seed", type=int, default=2024)
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Keep the simulated yards and visits instead of rolling them back",
+        )
+
+    def handle(self, *args, **options):
+        # The simulation builds its yards with the test factories, which only a
+        # development checkout has.
+        try:
+            from tests.benchmark.simulation import OPERATIONS, YardSimulation
+        except ImportError as error:
+            raise CommandError(
+                "The yard simulation runs from a development checkout: it needs "
+                "the tests directory and factory-boy from requirements.txt "
+                f"({error})."
+            ) from error
+
+        simulation = YardSimulation(
+            yards=options["yards"],
+            days=options["days"],
+            arrivals_per_day=options["arrivals_per_day"],
+            moves_per_day=options["moves_per_day"],
+            mean_dwell_days=options["mean_dwell_days"],
+            seed=options["seed"],
+        )
+        with transaction.atomic():
+            report = simulation.run()
+            if not options["keep"]:
+                transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"{report['operations']} operations over {report['days']} days "
+            f"in {report['yards']} yards, {report['busy_seconds']} s in services, "
+            f"{report['throughput']} operations/s"
+        )
+        self.stdout.write(
+            f"{'operation':<10}{'count':>8}{'rejected':>10}{'p50 ms':>10}"
+            f"{'p99 ms':>10}{'avg queries':>13}{'max queries':>13}"
+        )
+        for operation in OPERATIONS:
+            stats = report["by_operation"][operation]
+            self.stdout.write(
+                f"{operation:<10}{stats['count']:>8}{stats['rejected']:>10}"
+                f"{self._format_ms(stats['p50_ms']):>10}"
+                f"{self._format_ms(stats['p99_ms']):>10}"
+                f"{stats['avg_queries']:>13}{stats['max_queries']:>13}"
+            )
+        self.stdout.write(self.style.SUCCESS("Simulation finished."))
+
+    def _format_ms(self, value):
+        return "-" if value is None else f"{value:.1f}"
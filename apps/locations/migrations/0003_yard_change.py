@@ -0,0 +1,37 @@
+# Generated by Django 5.0.7 on 2026-10-19 10:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_rename_multiple_usable_terminalservice_multiple_usage'),
+        ('locations', '0002_yard_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='YardChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('created', 'created'), ('moved', 'moved'), ('deleted', 'deleted'), ('dispatched', 'dispatched')], max_length=10)),
+                ('container_location_id', models.BigIntegerField()),
+                ('row', models.PositiveIntegerField(null=True)),
+                ('column_start', models.PositiveIntegerField(null=True)),
+                ('column_end', models.PositiveIntegerField(null=True)),
+                ('tier', models.PositiveIntegerField(null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('container', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.container')),
+                ('previous_yard', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='locations.yard')),
+                ('yard', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='locations.yard')),
+            ],
+            options={
+                'verbose_name': 'Yard Change',
+                'verbose_name_plural': 'Yard Changes',
+                'db_table': 'yard_change',
+                'indexes': [models.Index(fields=['yard', 'id'], name='yard_change_yard_id_415c11_idx')],
+            },
+        ),
+    ]
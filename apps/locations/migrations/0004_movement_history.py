@@ -0,0 +1,48 @@
+# Generated by Django 5.0.7 on 2026-10-19 10:47
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_rename_multiple_usable_terminalservice_multiple_usage'),
+        ('locations', '0003_yard_change'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='YardCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_change_id', models.BigIntegerField(default=0)),
+                ('occupancy', models.JSONField(default=list)),
+            ],
+            options={
+                'verbose_name': 'Yard Checkpoint',
+                'verbose_name_plural': 'Yard Checkpoints',
+                'db_table': 'yard_checkpoint',
+            },
+        ),
+        migrations.AlterField(
+            model_name='yardchange',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='yardchange',
+            index=models.Index(fields=['container', 'created_at'], name='yard_change_contain_2a8086_idx'),
+        ),
+        migrations.AddField(
+            model_name='yardcheckpoint',
+            name='yard',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='locations.yard'),
+        ),
+        migrations.AddIndex(
+            model_name='yardcheckpoint',
+            index=models.Index(fields=['yard', 'taken_at'], name='yard_checkp_yard_id_2346f3_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.7 on 2026-10-19 10:47
+
+from django.db import migrations
+from django.db.models import Max
+from django.utils import timezone
+
+
+def seed_movement_history(apps, schema_editor):
+    # Locations placed before the history existed are known from a checkpoint of
+    # the current occupancy; nothing is added to the change feed.
+    ContainerLocation = apps.get_model('locations', 'ContainerLocation')
+    Yard = apps.get_model('locations', 'Yard')
+    YardChange = apps.get_model('locations', 'YardChange')
+    YardCheckpoint = apps.get_model('locations', 'YardCheckpoint')
+
+    last_change_id = YardChange.objects.aggregate(id=Max('id'))['id'] or 0
+    occupancy = {yard_id: [] for yard_id in Yard.objects.values_list('id', flat=True)}
+    for location in ContainerLocation.objects.filter(yard__isnull=False).values(
+        'yard_id', 'id', 'container_id', 'row', 'column_start', 'column_end', 'tier'
+    ):
+        occupancy[location.pop('yard_id')].append(location)
+    taken_at = timezone.now()
+    YardCheckpoint.objects.bulk_create(
+        YardCheckpoint(
+            yard_id=yard_id,
+            taken_at=taken_at,
+            last_change_id=last_change_id,
+            occupancy=locations,
+        )
+        for yard_id, locations in occupancy.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0004_movement_history'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_movement_history, migrations.RunPython.noop),
+    ]
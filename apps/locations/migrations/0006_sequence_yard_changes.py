@@ -0,0 +1,54 @@
+# Generated by Django 5.0.7 on 2026-10-19 12:06
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def backfill_sequence(apps, schema_editor):
+    # Existing changes have all committed, so their ids already are in commit order.
+    YardChange = apps.get_model('locations', 'YardChange')
+    YardChangeSequence = apps.get_model('locations', 'YardChangeSequence')
+
+    YardChange.objects.update(sequence=F('id'))
+    last = YardChange.objects.aggregate(id=Max('id'))['id'] or 0
+    YardChangeSequence.objects.create(id=1, last=last)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_rename_multiple_usable_terminalservice_multiple_usage'),
+        ('locations', '0005_seed_movement_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='YardChangeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'yard_change_sequence',
+            },
+        ),
+        migrations.AddField(
+            model_name='yardchange',
+            name='sequence',
+            field=models.BigIntegerField(editable=False, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_sequence, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='yardchange',
+            name='yard_change_yard_id_415c11_idx',
+        ),
+        migrations.AddIndex(
+            model_name='yardchange',
+            index=models.Index(fields=['yard', 'sequence'], name='yard_change_yard_id_053558_idx'),
+        ),
+        migrations.RenameField(
+            model_name='yardcheckpoint',
+            old_name='last_change_id',
+            new_name='last_sequence',
+        ),
+    ]
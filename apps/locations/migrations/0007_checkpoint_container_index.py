@@ -0,0 +1,55 @@
+# Generated by Django 5.0.7 on 2026-10-19 12:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def index_checkpoint_containers(apps, schema_editor):
+    Container = apps.get_model('core', 'Container')
+    YardCheckpoint = apps.get_model('locations', 'YardCheckpoint')
+    YardCheckpointContainer = apps.get_model('locations', 'YardCheckpointContainer')
+
+    container_ids = set(Container.objects.values_list('id', flat=True))
+    for checkpoint in YardCheckpoint.objects.iterator():
+        YardCheckpointContainer.objects.bulk_create(
+            YardCheckpointContainer(
+                checkpoint=checkpoint,
+                container_id=location['container_id'],
+                row=location['row'],
+                column_start=location['column_start'],
+                column_end=location['column_end'],
+                tier=location['tier'],
+            )
+            for location in checkpoint.occupancy
+            if location['container_id'] in container_ids
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_rename_multiple_usable_terminalservice_multiple_usage'),
+        ('locations', '0006_sequence_yard_changes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='YardCheckpointContainer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row', models.PositiveIntegerField()),
+                ('column_start', models.PositiveIntegerField()),
+                ('column_end', models.PositiveIntegerField()),
+                ('tier', models.PositiveIntegerField()),
+                ('checkpoint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='containers', to='locations.yardcheckpoint')),
+                ('container', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.container')),
+            ],
+            options={
+                'verbose_name': 'Yard Checkpoint Container',
+                'verbose_name_plural': 'Yard Checkpoint Containers',
+                'db_table': 'yard_checkpoint_container',
+                'indexes': [models.Index(fields=['container', 'checkpoint'], name='yard_checkp_contain_bf6caa_idx')],
+            },
+        ),
+        migrations.RunPython(index_checkpoint_containers, migrations.RunPython.noop),
+    ]
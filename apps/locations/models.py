@@ -1,8 +1,14 @@
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Max, Min
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from apps.core.choices import YardChangeAction
 from apps.core.models import BaseModel
 
 
@@ -14,6 +20,7 @@ class Yard(models.Model):
     x_coordinate = models.FloatField(blank=True, null=True)
     z_coordinate = models.FloatField(blank=True, null=True)
     rotation_degree = models.FloatField(blank=True, null=True)
+    version = models.PositiveBigIntegerField(default=0, editable=False)
 
     class Meta:
         db_table = "yard"
@@ -43,6 +50,20 @@ class Yard(models.Model):
         return not conflicting_locations.exists()
 
 
+# Changes whenever yard geometry is edited, telling every process to rebuild its
+# spatial index.
+YARD_GEOMETRY_CACHE_KEY = "yard_geometry_stamp"
+
+
+def bump_yard_versions(yard_ids):
+    """
+    Mark yards as changed so cached views built from them are regenerated.
+    """
+    yard_ids = {yard_id for yard_id in yard_ids if yard_id}
+    if yard_ids:
+        Yard.objects.filter(id__in=yard_ids).update(version=F("version") + 1)
+
+
 class ContainerLocation(BaseModel):
     container = models.ForeignKey(
         "core.Container",
@@ -71,6 +92,8 @@ class ContainerLocation(BaseModel):
         validators=[MinValueValidator(1)], null=True, blank=True
     )
 
+    POSITION_FIELDS = ("yard_id", "row", "column_start", "column_end", "tier")
+
     class Meta:
         db_table = "container_location"
         verbose_name = _("Container Location")
@@ -116,6 +139,15 @@ class ContainerLocation(BaseModel):
                     _("This position conflicts with an existing container location.")
                 )
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_position = instance.get_position()
+        return instance
+
+    def get_position(self):
+        return {field: self.__dict__.get(field) for field in self.POSITION_FIELDS}
+
     def __str__(self):
         if self.yard:
             return f"{self.container.name} - Yard: {self.yard.name}, Row: {self.row}, Column: {self.column_start}-{self.column_end}, Tier: {self.tier}"
@@ -125,3 +157,194 @@ class ContainerLocation(BaseModel):
         self.full_clean()
 
         super().save(*args, **kwargs)
+
+
+class YardChange(models.Model):
+    """
+    Append-only log of yard occupancy changes.
+
+    ``sequence`` orders the feed. Ids are taken on insert, so a transaction that
+    commits late can make a lower id visible after a higher one; sequence
+    numbers are only handed out once a change has committed, by
+    ``sequence_yard_changes``, and follow commit order.
+
+    It doubles as the movement history: replaying it on top of a
+    ``YardCheckpoint`` reconstructs a yard as of any moment.
+    """
+
+    yard = models.ForeignKey(
+        Yard, on_delete=models.CASCADE, related_name="changes", null=True
+    )
+    previous_yard = models.ForeignKey(
+        Yard, on_delete=models.CASCADE, related_name="+", null=True
+    )
+    action = models.CharField(max_length=10, choices=YardChangeAction.choices)
+    container_location_id = models.BigIntegerField()
+    container = models.ForeignKey(
+        "core.Container", on_delete=models.SET_NULL, related_name="+", null=True
+    )
+    row = models.PositiveIntegerField(null=True)
+    column_start = models.PositiveIntegerField(null=True)
+    column_end = models.PositiveIntegerField(null=True)
+    tier = models.PositiveIntegerField(null=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    sequence = models.BigIntegerField(null=True, unique=True, editable=False)
+
+    class Meta:
+        db_table = "yard_change"
+        verbose_name = _("Yard Change")
+        verbose_name_plural = _("Yard Changes")
+        indexes = [
+            models.Index(fields=["yard", "sequence"]),
+            models.Index(fields=["container", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.action} location {self.container_location_id}"
+
+    @classmethod
+    def from_location(cls, location, action, previous_yard_id=None):
+        return cls(
+            yard_id=location.yard_id,
+            previous_yard_id=previous_yard_id,
+            action=action,
+            container_location_id=location.id,
+            container_id=location.container_id,
+            row=location.row,
+            column_start=location.column_start,
+            column_end=location.column_end,
+            tier=location.tier,
+        )
+
+
+class YardChangeSequence(models.Model):
+    """
+    Last sequence number handed to a yard change, in a single row.
+    """
+
+    last = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = "yard_change_sequence"
+
+
+def sequence_yard_changes():
+    """
+    Number the committed yard changes that have none yet.
+
+    Runs after commit, in its own transaction holding the counter row, so the
+    numbers follow commit order: once a sequence is visible, every lower one is.
+    Changes a crashed process never numbered are picked up by the next run.
+    """
+    if not YardChange.objects.filter(sequence__isnull=True).exists():
+        return
+    with transaction.atomic():
+        counter, _ = YardChangeSequence.objects.select_for_update().get_or_create(id=1)
+        pending = YardChange.objects.filter(sequence__isnull=True).aggregate(
+            first=Min("id"), last=Max("id")
+        )
+        if pending["first"] is None:
+            return
+        # Numbers keep the gaps between ids, which only have to be increasing.
+        YardChange.objects.filter(
+            sequence__isnull=True, id__gte=pending["first"], id__lte=pending["last"]
+        ).update(sequence=F("id") - pending["first"] + counter.last + 1)
+        counter.last += pending["last"] - pending["first"] + 1
+        counter.save(update_fields=["last"])
+
+
+def sequence_yard_changes_on_commit():
+    transaction.on_commit(sequence_yard_changes)
+
+
+class YardCheckpoint(models.Model):
+    """
+    Occupancy of a yard at ``taken_at``, covering changes up to the feed
+    sequence ``last_sequence``.
+    """
+
+    yard = models.ForeignKey(Yard, on_delete=models.CASCADE, related_name="checkpoints")
+    taken_at = models.DateTimeField(default=timezone.now)
+    last_sequence = models.BigIntegerField(default=0)
+    occupancy = models.JSONField(default=list)
+
+    class Meta:
+        db_table = "yard_checkpoint"
+        verbose_name = _("Yard Checkpoint")
+        verbose_name_plural = _("Yard Checkpoints")
+        indexes = [models.Index(fields=["yard", "taken_at"])]
+
+    def __str__(self):
+        return f"{self.yard} at {self.taken_at}"
+
+
+class YardCheckpointContainer(models.Model):
+    """
+    Position of a container in a checkpoint, indexed by container so that it is
+    found without reading the occupancy of every yard.
+    """
+
+    checkpoint = models.ForeignKey(
+        YardCheckpoint, on_delete=models.CASCADE, related_name="containers"
+    )
+    container = models.ForeignKey(
+        "core.Container", on_delete=models.CASCADE, related_name="+"
+    )
+    row = models.PositiveIntegerField()
+    column_start = models.PositiveIntegerField()
+    column_end = models.PositiveIntegerField()
+    tier = models.PositiveIntegerField()
+
+    class Meta:
+        db_table = "yard_checkpoint_container"
+        verbose_name = _("Yard Checkpoint Container")
+        verbose_name_plural = _("Yard Checkpoint Containers")
+        indexes = [models.Index(fields=["container", "checkpoint"])]
+
+
+@receiver(post_save, sender=Yard)
+@receiver(post_delete, sender=Yard)
+def invalidate_yard_geometry(sender, instance, **kwargs):
+    cache.delete(YARD_GEOMETRY_CACHE_KEY)
+
+
+@receiver(post_save, sender=ContainerLocation)
+def track_container_location_save(sender, instance, created, **kwargs):
+    loaded_position = getattr(instance, "loaded_position", None) or {}
+    position = instance.get_position()
+    if created:
+        YardChange.from_location(instance, YardChangeAction.CREATED).save()
+    elif position != loaded_position:
+        YardChange.from_location(
+            instance,
+            YardChangeAction.MOVED,
+            previous_yard_id=loaded_position.get("yard_id"),
+        ).save()
+    if created or position != loaded_position:
+        sequence_yard_changes_on_commit()
+    bump_yard_versions([instance.yard_id, loaded_position.get("yard_id")])
+    instance.loaded_position = position
+
+
+@receiver(post_delete, sender=ContainerLocation)
+def track_container_location_delete(sender, instance, **kwargs):
+    YardChange.from_location(instance, YardChangeAction.DELETED).save()
+    sequence_yard_changes_on_commit()
+    bump_yard_versions([instance.yard_id])
+
+
+@receiver(post_save, sender="containers.ContainerStorage")
+@receiver(post_delete, sender="containers.ContainerStorage")
+def track_container_storage_change(sender, instance, **kwargs):
+    if not instance.container_location_id:
+        return
+    location = ContainerLocation.objects.filter(
+        id=instance.container_location_id
+    ).first()
+    if location is None:
+        return
+    if instance.exit_time and not getattr(instance, "loaded_exit_time", None):
+        YardChange.from_location(location, YardChangeAction.DISPATCHED).save()
+        sequence_yard_changes_on_commit()
+    bump_yard_versions([location.yard_id])
+    instance.loaded_exit_time = instance.exit_time
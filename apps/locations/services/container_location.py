@@ -0,0 +1,257 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from apps.core.choices import YardChangeAction
+from apps.locations.models import (
+    ContainerLocation,
+    Yard,
+    YardChange,
+    bump_yard_versions,
+    sequence_yard_changes_on_commit,
+)
+from apps.locations.services.stack_model import (
+    YardStackModel,
+    get_columns_needed,
+    get_location_values,
+)
+
+POSITION_FIELDS = ("yard", "row", "column_start", "column_end", "tier")
+
+
+class ContainerLocationService:
+    def create(self, container, data):
+        data["column_end"] = (
+            data["column_start"] + get_columns_needed(container.size) - 1
+        )
+        container_location = ContainerLocation.objects.create(
+            container=container, **data
+        )
+        return container_location
+
+    @transaction.atomic
+    def bulk_move(self, moves):
+        """
+        Move many containers at once.
+
+        Only the final configuration is validated, so swaps and cycles that would
+        conflict when applied one move at a time are accepted.
+        """
+        errors = [{} for _ in moves]
+
+        locations = self._get_current_locations(moves, errors)
+        yards = Yard.objects.in_bulk(
+            {move.get("yard_id") for move in moves if move.get("yard_id")}
+            | {location.yard_id for location in locations.values() if location.yard_id}
+        )
+
+        targets = []
+        for index, move in enumerate(moves):
+            location = locations.get(move["container_id"])
+            if location is None:
+                continue
+            target = self._build_target(index, move, location, yards, errors)
+            if target:
+                targets.append(target)
+
+        if not any(errors):
+            self._validate_final_configuration(targets, yards, errors)
+
+        if any(errors):
+            raise ValidationError(errors)
+
+        return self._apply(targets)
+
+    def _get_current_locations(self, moves, errors):
+        container_ids = [move["container_id"] for move in moves]
+        seen = set()
+        for index, container_id in enumerate(container_ids):
+            if container_id in seen:
+                errors[index]["container_id"] = ["Container is moved more than once."]
+            seen.add(container_id)
+
+        locations = {}
+        queryset = (
+            ContainerLocation.objects.select_for_update(of=("self",))
+            .select_related("container")
+            .filter(container_id__in=container_ids)
+            .order_by("container_id", "-id")
+        )
+        for location in queryset:
+            locations.setdefault(location.container_id, location)
+
+        for index, container_id in enumerate(container_ids):
+            if container_id not in locations:
+                errors[index]["container_id"] = ["Container has no location."]
+        return locations
+
+    def _build_target(self, index, move, location, yards, errors):
+        yard = yards.get(move.get("yard_id") or location.yard_id)
+        if yard is None:
+            errors[index]["yard_id"] = ["Yard does not exist."]
+            return None
+
+        column_end = (
+            move["column_start"] + get_columns_needed(location.container.size) - 1
+        )
+        if move["row"] > yard.max_rows:
+            errors[index]["row"] = ["Row exceeds yard's maximum rows."]
+        if column_end > yard.max_columns:
+            errors[index]["column_start"] = ["Column exceeds yard's maximum columns."]
+        if move["tier"] > yard.max_tiers:
+            errors[index]["tier"] = ["Tier exceeds yard's maximum tiers."]
+        if errors[index]:
+            return None
+
+        return {
+            "index": index,
+            "location": location,
+            "id": location.id,
+            "container_id": location.container_id,
+            "size": location.container.size,
+            "yard_id": yard.id,
+            "row": move["row"],
+            "column_start": move["column_start"],
+            "column_end": column_end,
+            "tier": move["tier"],
+        }
+
+    def _validate_final_configuration(self, targets, yards, errors):
+        moved_ids = [target["id"] for target in targets]
+        affected_yard_ids = {target["yard_id"] for target in targets} | {
+            target["location"].yard_id
+            for target in targets
+            if target["location"].yard_id
+        }
+        affected_rows = {target["row"] for target in targets} | {
+            target["location"].row for target in targets if target["location"].yard_id
+        }
+        stationary = get_location_values(
+            ContainerLocation.objects.filter(
+                yard_id__in=affected_yard_ids, row__in=affected_rows
+            ).exclude(id__in=moved_ids)
+        )
+
+        for first, second in self._find_overlaps(stationary + targets):
+            for target in (first, second):
+                if "index" in target:
+                    errors[target["index"]].setdefault("non_field_errors", []).append(
+                        "This position conflicts with another container location."
+                    )
+        if any(errors):
+            return
+
+        before = {
+            yard_id: YardStackModel(yards[yard_id]) for yard_id in affected_yard_ids
+        }
+        after = {
+            yard_id: YardStackModel(yards[yard_id]) for yard_id in affected_yard_ids
+        }
+        for location in stationary:
+            before[location["yard_id"]].add(location)
+            after[location["yard_id"]].add(location)
+        for target in targets:
+            after[target["yard_id"]].add(target)
+            original = target["location"]
+            if original.yard_id in before:
+                before[original.yard_id].add(
+                    {
+                        **target,
+                        **{
+                            field: getattr(original, field)
+                            for field in POSITION_FIELDS[1:]
+                        },
+                        "yard_id": original.yard_id,
+                    }
+                )
+
+        for target in targets:
+            if not after[target["yard_id"]].is_supported(
+                target["row"],
+                target["column_start"],
+                target["column_end"],
+                target["tier"],
+            ):
+                errors[target["index"]].setdefault("non_field_errors", []).append(
+                    "This position is not supported by the containers below."
+                )
+
+        for location in stationary:
+            position = (
+                location["row"],
+                location["column_start"],
+                location["column_end"],
+                location["tier"],
+            )
+            if before[location["yard_id"]].is_supported(*position) and not after[
+                location["yard_id"]
+            ].is_supported(*position):
+                for target in self._get_vacated_supports(location, targets):
+                    errors[target["index"]].setdefault("non_field_errors", []).append(
+                        "Moving this container leaves another container unsupported."
+                    )
+
+    def _find_overlaps(self, entries):
+        """
+        Sweep every (yard, row, tier) line by column and report overlapping pairs.
+        """
+        lines = defaultdict(list)
+        for entry in entries:
+            lines[(entry["yard_id"], entry["row"], entry["tier"])].append(entry)
+
+        overlaps = []
+        for line in lines.values():
+            line.sort(key=lambda item: item["column_start"])
+            reaching = line[0]
+            for entry in line[1:]:
+                if entry["column_start"] <= reaching["column_end"]:
+                    overlaps.append((reaching, entry))
+                if entry["column_end"] > reaching["column_end"]:
+                    reaching = entry
+        return overlaps
+
+    def _get_vacated_supports(self, location, targets):
+        return [
+            target
+            for target in targets
+            if target["location"].yard_id == location["yard_id"]
+            and target["location"].row == location["row"]
+            and target["location"].tier == location["tier"] - 1
+            and target["location"].column_start <= location["column_end"]
+            and target["location"].column_end >= location["column_start"]
+        ]
+
+    def _apply(self, targets):
+        now = timezone.now()
+        locations = []
+        changes = []
+        yard_ids = set()
+        for target in targets:
+            location = target["location"]
+            previous_yard_id = location.yard_id
+            yard_ids.update((previous_yard_id, target["yard_id"]))
+            location.yard_id = target["yard_id"]
+            location.row = target["row"]
+            location.column_start = target["column_start"]
+            location.column_end = target["column_end"]
+            location.tier = target["tier"]
+            location.updated_at = now
+            location.loaded_position = location.get_position()
+            locations.append(location)
+            changes.append(
+                YardChange.from_location(
+                    location, YardChangeAction.MOVED, previous_yard_id=previous_yard_id
+                )
+            )
+
+        ContainerLocation.objects.bulk_update(
+            locations, fields=[*POSITION_FIELDS, "updated_at"]
+        )
+        # bulk_update sends no signals, so the change feed and cached yard views
+        # are updated here.
+        YardChange.objects.bulk_create(changes)
+        sequence_yard_changes_on_commit()
+        bump_yard_versions(yard_ids)
+        return locations
@@ -0,0 +1,118 @@
+from django.shortcuts import get_object_or_404
+from rest_framework.exceptions import ValidationError
+
+from apps.core.models import Container
+from apps.locations.models import ContainerLocation
+from apps.locations.services.stack_model import YardStackModel, get_columns_needed
+
+# Moving a box to another row means travelling across the block, which is slower
+# for the crane than sliding along the same row.
+ROW_DISTANCE_WEIGHT = 2
+
+
+class RetrievalPlannerService:
+    def get_retrieval_plan(self, container_id):
+        container = get_object_or_404(Container, id=container_id)
+        location = (
+            ContainerLocation.objects.filter(container=container, yard__isnull=False)
+            .select_related("yard")
+            .order_by("-id")
+            .first()
+        )
+        if location is None:
+            raise ValidationError({"container_id": ["Container is not in a yard."]})
+
+        model = YardStackModel.load(location.yard)
+        moves = self.plan_retrieval(model, location.id)
+
+        names = dict(
+            Container.objects.filter(
+                id__in=[move["container_id"] for move in moves]
+            ).values_list("id", "name")
+        )
+        for move in moves:
+            move["container_name"] = names[move["container_id"]]
+
+        return {
+            "container_id": container.id,
+            "container_name": container.name,
+            "location": self.get_position(model.locations[location.id]),
+            "moves": moves,
+        }
+
+    def plan_retrieval(self, model, location_id, reserved=()):
+        """
+        Relocate every box above ``location_id`` with one move each, top-down, to the
+        nearest slot outside the dig area. Moves are applied to ``model``.
+
+        ``reserved`` holds extra (row, column) cells that must not be stacked on.
+        """
+        blockers = model.get_locations_above(location_id)
+        blocked = set(reserved) | self.get_footprint(
+            [model.locations[location_id], *blockers]
+        )
+
+        moves = []
+        for step, blocker in enumerate(blockers, start=1):
+            model.remove(blocker["id"])
+            slot = self.find_nearest_slot(model, blocker, blocked)
+            if slot is None:
+                model.add(blocker)
+                raise ValidationError(
+                    {"container_id": ["There is no free slot to relocate blockers."]}
+                )
+            row, column_start, _, tier = slot
+            moved = {
+                **blocker,
+                "row": row,
+                "column_start": column_start,
+                "column_end": column_start
+                + blocker["column_end"]
+                - blocker["column_start"],
+                "tier": tier,
+            }
+            model.add(moved)
+            moves.append(
+                {
+                    "step": step,
+                    "container_id": blocker["container_id"],
+                    "from": self.get_position(blocker),
+                    "to": self.get_position(moved),
+                }
+            )
+        return moves
+
+    def find_nearest_slot(self, model, location, blocked):
+        columns_needed = get_columns_needed(location["size"])
+        best_slot, best_score = None, None
+        for slot in model.iter_free_slots(columns_needed):
+            row, column_start, column_end, tier = slot
+            if any(
+                (row, column) in blocked
+                for column in range(column_start, column_end + 1)
+            ):
+                continue
+            score = (
+                abs(row - location["row"]) * ROW_DISTANCE_WEIGHT
+                + abs(column_start - location["column_start"]),
+                tier,
+            )
+            if best_score is None or score < best_score:
+                best_slot, best_score = slot, score
+        return best_slot
+
+    def get_footprint(self, locations):
+        return {
+            (location["row"], column)
+            for location in locations
+            for column in range(location["column_start"], location["column_end"] + 1)
+        }
+
+    def get_position(self, location):
+        return {
+            "yard_id": location["yard_id"],
+            "row": location["row"],
+            "column_start": location["column_start"],
+            "column_end": location["column_end"],
+            "tier": location["tier"],
+        }
@@ -0,0 +1,143 @@
+import math
+import uuid
+from collections import defaultdict
+
+from django.core.cache import cache
+
+from apps.locations.geometry import (
+    get_bounds,
+    get_distance,
+    get_slot_center,
+    get_yard_footprint,
+    get_yard_size,
+    polygons_intersect,
+    to_local,
+)
+from apps.locations.models import YARD_GEOMETRY_CACHE_KEY, Yard
+
+# Edge of a grid bucket in metres, about the reach of a stacker; queries only
+# look at the buckets their search area overlaps.
+BUCKET_SIZE = 20.0
+
+
+class YardSpatialIndex:
+    """
+    Uniform grid over world coordinates holding every yard footprint and every
+    stack (one ground slot of a yard).
+    """
+
+    def __init__(self, yards):
+        self.yards = {}
+        self.yard_buckets = defaultdict(set)
+        self.stack_buckets = defaultdict(list)
+        for yard in yards:
+            self.add_yard(yard)
+
+    def add_yard(self, yard):
+        footprint = get_yard_footprint(yard)
+        self.yards[yard.id] = {"yard": yard, "footprint": footprint}
+        for bucket in self._iter_buckets(*get_bounds(footprint)):
+            self.yard_buckets[bucket].add(yard.id)
+
+        for row in range(1, yard.max_rows + 1):
+            for column in range(1, yard.max_columns + 1):
+                x, z = get_slot_center(yard, row, column, column)
+                self.stack_buckets[self._get_bucket(x, z)].append(
+                    {"yard_id": yard.id, "row": row, "column": column, "x": x, "z": z}
+                )
+
+    def get_stacks_within_radius(self, x, z, radius):
+        stacks = []
+        for stack in self._iter_stacks(x - radius, z - radius, x + radius, z + radius):
+            distance = get_distance((x, z), (stack["x"], stack["z"]))
+            if distance <= radius:
+                stacks.append({**stack, "distance": distance})
+        stacks.sort(key=lambda stack: stack["distance"])
+        return stacks
+
+    def get_stacks_in_bbox(self, min_x, min_z, max_x, max_z):
+        return [
+            stack
+            for stack in self._iter_stacks(min_x, min_z, max_x, max_z)
+            if min_x <= stack["x"] <= max_x and min_z <= stack["z"] <= max_z
+        ]
+
+    def get_yards_within_radius(self, x, z, radius):
+        yards = []
+        for yard_id in self._get_yard_candidates(
+            x - radius, z - radius, x + radius, z + radius
+        ):
+            yard = self.yards[yard_id]["yard"]
+            # Distance to the rectangle is easiest in the yard's own grid.
+            local_x, local_z = to_local(yard, x, z)
+            length, width = get_yard_size(yard)
+            distance = math.hypot(
+                local_x - min(max(local_x, 0.0), length),
+                local_z - min(max(local_z, 0.0), width),
+            )
+            if distance <= radius:
+                yards.append({"yard_id": yard_id, "distance": distance})
+        yards.sort(key=lambda yard: yard["distance"])
+        return yards
+
+    def get_yards_in_bbox(self, min_x, min_z, max_x, max_z):
+        bbox = [(min_x, min_z), (max_x, min_z), (max_x, max_z), (min_x, max_z)]
+        return [
+            {"yard_id": yard_id}
+            for yard_id in sorted(self._get_yard_candidates(min_x, min_z, max_x, max_z))
+            if polygons_intersect(bbox, self.yards[yard_id]["footprint"])
+        ]
+
+    def _get_yard_candidates(self, min_x, min_z, max_x, max_z):
+        candidates = set()
+        for bucket in self._iter_buckets(min_x, min_z, max_x, max_z):
+            candidates |= self.yard_buckets.get(bucket, set())
+        return candidates
+
+    def _iter_stacks(self, min_x, min_z, max_x, max_z):
+        for bucket in self._iter_buckets(min_x, min_z, max_x, max_z):
+            yield from self.stack_buckets.get(bucket, ())
+
+    def _iter_buckets(self, min_x, min_z, max_x, max_z):
+        min_i, min_j = self._get_bucket(min_x, min_z)
+        max_i, max_j = self._get_bucket(max_x, max_z)
+        for i in range(min_i, max_i + 1):
+            for j in range(min_j, max_j + 1):
+                yield i, j
+
+    def _get_bucket(self, x, z):
+        return math.floor(x / BUCKET_SIZE), math.floor(z / BUCKET_SIZE)
+
+
+class SpatialIndexService:
+    """
+    Keeps one ``YardSpatialIndex`` per process.
+
+    Editing a yard clears the shared geometry stamp in the cache; every process
+    compares it with the stamp its index was built under and rebuilds on change.
+    """
+
+    _index = None
+    _stamp = None
+
+    def get_index(self):
+        stamp = cache.get(YARD_GEOMETRY_CACHE_KEY)
+        if stamp is None:
+            cache.add(YARD_GEOMETRY_CACHE_KEY, uuid.uuid4().hex, None)
+            stamp = cache.get(YARD_GEOMETRY_CACHE_KEY)
+        if SpatialIndexService._index is None or stamp != SpatialIndexService._stamp:
+            SpatialIndexService._index = YardSpatialIndex(Yard.objects.all())
+            SpatialIndexService._stamp = stamp
+        return SpatialIndexService._index
+
+    def get_stacks(self, x=None, z=None, radius=None, bbox=None):
+        index = self.get_index()
+        if bbox is not None:
+            return index.get_stacks_in_bbox(*bbox)
+        return index.get_stacks_within_radius(x, z, radius)
+
+    def get_yards(self, x=None, z=None, radius=None, bbox=None):
+        index = self.get_index()
+        if bbox is not None:
+            return index.get_yards_in_bbox(*bbox)
+        return index.get_yards_within_radius(x, z, radius)
@@ -0,0 +1,175 @@
+from apps.core.choices import ContainerSize
+from apps.locations.models import ContainerLocation
+
+TWENTY_FOOT_SIZES = (ContainerSize.TWENTY, ContainerSize.TWENTY_HIGH_CUBE)
+
+LOCATION_FIELDS = (
+    "id",
+    "container_id",
+    "yard_id",
+    "row",
+    "column_start",
+    "column_end",
+    "tier",
+)
+
+
+def get_columns_needed(container_size):
+    return 1 if container_size in TWENTY_FOOT_SIZES else 2
+
+
+def get_location_values(queryset):
+    """
+    Flatten container locations into the plain dicts used by ``YardStackModel``.
+    """
+    locations = []
+    for location in queryset.values(*LOCATION_FIELDS, "container__size"):
+        location["size"] = location.pop("container__size")
+        locations.append(location)
+    return locations
+
+
+class YardStackModel:
+    """
+    In-memory occupancy model of a single yard.
+
+    Locations are plain dicts (see ``LOCATION_FIELDS`` plus ``size``) indexed by
+    every (row, column, tier) cell they cover, so occupancy and stacking checks
+    are dictionary lookups instead of queries.
+    """
+
+    def __init__(self, yard, locations=()):
+        self.yard = yard
+        self.locations = {}
+        self.cells = {}
+        for location in locations:
+            self.add(location)
+
+    @classmethod
+    def load(cls, yard):
+        queryset = ContainerLocation.objects.filter(yard=yard)
+        return cls(yard, get_location_values(queryset))
+
+    @classmethod
+    def load_many(cls, yards):
+        models = {yard.id: cls(yard) for yard in yards}
+        queryset = ContainerLocation.objects.filter(yard_id__in=models.keys())
+        for location in get_location_values(queryset):
+            models[location["yard_id"]].add(location)
+        return models
+
+    def add(self, location):
+        self.locations[location["id"]] = location
+        for column in range(location["column_start"], location["column_end"] + 1):
+            self.cells[(location["row"], column, location["tier"])] = location["id"]
+
+    def remove(self, location_id):
+        location = self.locations.pop(location_id)
+        for column in range(location["column_start"], location["column_end"] + 1):
+            key = (location["row"], column, location["tier"])
+            if self.cells.get(key) == location_id:
+                del self.cells[key]
+        return location
+
+    def move(self, location_id, row, column_start, tier):
+        location = self.remove(location_id)
+        width = location["column_end"] - location["column_start"]
+        location = {
+            **location,
+            "yard_id": self.yard.id,
+            "row": row,
+            "column_start": column_start,
+            "column_end": column_start + width,
+            "tier": tier,
+        }
+        self.add(location)
+        return location
+
+    def get_occupant(self, row, column, tier):
+        location_id = self.cells.get((row, column, tier))
+        return self.locations.get(location_id) if location_id else None
+
+    def is_free(self, row, column_start, column_end, tier):
+        return all(
+            (row, column, tier) not in self.cells
+            for column in range(column_start, column_end + 1)
+        )
+
+    def is_supported(self, row, column_start, column_end, tier):
+        """
+        Mirror of ``YardService.is_supported``: a box rests either on a single box
+        covering its whole span or, for two-column boxes, on two 20ft boxes.
+        """
+        if tier == 1:
+            return True
+
+        below = [
+            self.get_occupant(row, column, tier - 1)
+            for column in range(column_start, column_end + 1)
+        ]
+        if any(location is None for location in below):
+            return False
+
+        if all(location["id"] == below[0]["id"] for location in below):
+            return True
+
+        if column_end - column_start == 1:
+            left, right = below
+            return (
+                left["size"] in TWENTY_FOOT_SIZES and right["size"] in TWENTY_FOOT_SIZES
+            )
+
+        return False
+
+    def get_stack_height(self, row, column):
+        for tier in range(self.yard.max_tiers, 0, -1):
+            if (row, column, tier) in self.cells:
+                return tier
+        return 0
+
+    def get_placement_tier(self, row, column_start, column_end):
+        """
+        Tier a box would land on when lowered onto the given span, or ``None`` if the
+        span is out of bounds, the stack is full or the box would not be supported.
+        """
+        if row > self.yard.max_rows or column_end > self.yard.max_columns:
+            return None
+        tier = (
+            max(
+                self.get_stack_height(row, column)
+                for column in range(column_start, column_end + 1)
+            )
+            + 1
+        )
+        if tier > self.yard.max_tiers:
+            return None
+        if not self.is_supported(row, column_start, column_end, tier):
+            return None
+        return tier
+
+    def get_locations_above(self, location_id):
+        """
+        Every location resting directly or transitively on the given one, top-down.
+        """
+        found = {}
+        pending = [self.locations[location_id]]
+        while pending:
+            location = pending.pop()
+            for column in range(location["column_start"], location["column_end"] + 1):
+                above = self.get_occupant(location["row"], column, location["tier"] + 1)
+                if above and above["id"] not in found:
+                    found[above["id"]] = above
+                    pending.append(above)
+        return sorted(found.values(), key=lambda item: -item["tier"])
+
+    def iter_free_slots(self, columns_needed):
+        """
+        Yield every (row, column_start, column_end, tier) a box of the given width
+        could be lowered onto right now.
+        """
+        for row in range(1, self.yard.max_rows + 1):
+            for column_start in range(1, self.yard.max_columns - columns_needed + 2):
+                column_end = column_start + columns_needed - 1
+                tier = self.get_placement_tier(row, column_start, column_end)
+                if tier is not None:
+                    yield row, column_start, column_end, tier
@@ -0,0 +1,168 @@
+from rest_framework.exceptions import ValidationError
+
+from apps.containers.models import ContainerStorage
+from apps.core.models import Container
+from apps.locations.geometry import get_distance, get_slot_center
+from apps.locations.models import Yard
+from apps.locations.services.retrieval_planner import RetrievalPlannerService
+from apps.locations.services.stack_model import YardStackModel
+
+# A re-handle costs a lift, a set-down and the travel in between; expressed as the
+# crane travel (in metres) it is worth, so both goals share one score.
+REHANDLE_COST = 50.0
+
+
+class TrainLoadingPlannerService:
+    def __init__(self):
+        self.retrieval_planner = RetrievalPlannerService()
+
+    def get_loading_plan(self, visit_ids):
+        """
+        Order the retrieval of ``visit_ids`` to keep re-handles and crane travel low.
+
+        All affected yards are loaded into memory once; each step greedily picks the
+        reachable target whose blockers and travel cost least, relocates its blockers
+        away from the remaining targets and retrieves it.
+        """
+        visits = self._get_visits(visit_ids)
+        yards = Yard.objects.in_bulk(
+            {visit["container_location__yard_id"] for visit in visits.values()}
+        )
+        models = YardStackModel.load_many(yards.values())
+
+        targets = {visit["container_location_id"]: visit for visit in visits.values()}
+        moves = []
+        total_travel = 0.0
+        crane_position = None
+
+        while targets:
+            location_id = self._pick_next_target(targets, models, crane_position)
+            visit = targets.pop(location_id)
+            model = models[visit["container_location__yard_id"]]
+            target = model.locations[location_id]
+
+            reserved = self._get_reserved_cells(model, targets)
+            relocations = self.retrieval_planner.plan_retrieval(
+                model, location_id, reserved=reserved
+            )
+            for relocation in relocations:
+                source = self._get_center(yards, relocation["from"])
+                destination = self._get_center(yards, relocation["to"])
+                if crane_position is not None:
+                    total_travel += get_distance(crane_position, source)
+                total_travel += get_distance(source, destination)
+                crane_position = destination
+                moves.append(
+                    {
+                        "action": "relocate",
+                        "visit_id": None,
+                        "container_id": relocation["container_id"],
+                        "from": relocation["from"],
+                        "to": relocation["to"],
+                    }
+                )
+
+            position = self.retrieval_planner.get_position(target)
+            center = self._get_center(yards, position)
+            if crane_position is not None:
+                total_travel += get_distance(crane_position, center)
+            crane_position = center
+            model.remove(location_id)
+            moves.append(
+                {
+                    "action": "retrieve",
+                    "visit_id": visit["id"],
+                    "container_id": visit["container_id"],
+                    "from": position,
+                    "to": None,
+                }
+            )
+
+        names = dict(
+            Container.objects.filter(
+                id__in={move["container_id"] for move in moves}
+            ).values_list("id", "name")
+        )
+        for step, move in enumerate(moves, start=1):
+            move["step"] = step
+            move["container_name"] = names[move["container_id"]]
+
+        return {
+            "moves": moves,
+            "total_rehandles": sum(move["action"] == "relocate" for move in moves),
+            "total_travel": round(total_travel, 1),
+        }
+
+    def _get_visits(self, visit_ids):
+        visits = {
+            visit["id"]: visit
+            for visit in ContainerStorage.objects.filter(id__in=visit_ids).values(
+                "id",
+                "container_id",
+                "exit_time",
+                "container_location_id",
+                "container_location__yard_id",
+            )
+        }
+
+        errors = [{} for _ in visit_ids]
+        seen = set()
+        for index, visit_id in enumerate(visit_ids):
+            visit = visits.get(visit_id)
+            if visit_id in seen:
+                errors[index]["visit_id"] = ["Visit is listed more than once."]
+            elif visit is None:
+                errors[index]["visit_id"] = ["Visit does not exist."]
+            elif visit["exit_time"] is not None:
+                errors[index]["visit_id"] = ["Container has already left the terminal."]
+            elif visit["container_location__yard_id"] is None:
+                errors[index]["visit_id"] = ["Container is not in a yard."]
+            seen.add(visit_id)
+
+        if any(errors):
+            raise ValidationError(errors)
+        return visits
+
+    def _pick_next_target(self, targets, models, crane_position):
+        best_location_id, best_cost = None, None
+        for location_id, visit in targets.items():
+            model = models[visit["container_location__yard_id"]]
+            blockers = model.get_locations_above(location_id)
+            if any(blocker["id"] in targets for blocker in blockers):
+                # Another target sits above this one; it is retrieved first.
+                continue
+            cost = len(blockers) * REHANDLE_COST
+            if crane_position is not None:
+                location = model.locations[location_id]
+                cost += get_distance(
+                    crane_position,
+                    get_slot_center(
+                        model.yard,
+                        location["row"],
+                        location["column_start"],
+                        location["column_end"],
+                    ),
+                )
+            if best_cost is None or cost < best_cost:
+                best_location_id, best_cost = location_id, cost
+        return best_location_id
+
+    def _get_reserved_cells(self, model, targets):
+        """
+        Cells of the remaining targets in this yard and of everything stacked on
+        them; relocated blockers must not land there and bury a target again.
+        """
+        locations = []
+        for location_id, visit in targets.items():
+            if visit["container_location__yard_id"] == model.yard.id:
+                locations.append(model.locations[location_id])
+                locations.extend(model.get_locations_above(location_id))
+        return self.retrieval_planner.get_footprint(locations)
+
+    def _get_center(self, yards, position):
+        return get_slot_center(
+            yards[position["yard_id"]],
+            position["row"],
+            position["column_start"],
+            position["column_end"],
+        )
@@ -16,9 +16,9 @@ from django.db.models.functions import Coalesce, Greatest, Extract
 from django.utils import timezone
 
 from apps.containers.models import ContainerStorage
-from apps.core.choices import ContainerSize
 from apps.locations.filters import ContainerLocationFilter
 from apps.locations.models import Yard, ContainerLocation
+from apps.locations.services.stack_model import TWENTY_FOOT_SIZES, get_columns_needed
 
 
 class YardService:
@@ -132,7 +132,7 @@ class YardService:
                     Count(
                         "container_locations__container",
                         filter=models.Q(
-                            container_locations__terminal_visits__customer_id=customer_id
+                            container_locations__terminal_visits__company_id=customer_id
                         ),
                     ),
                     0,
@@ -167,9 +167,9 @@ class YardService:
         return result
 
     def get_available_places(self, yard, container_type):
-        columns_needed = 1 if container_type == ContainerSize.TWENTY else 2
+        columns_needed = get_columns_needed(container_type)
         occupied_locations = ContainerLocation.objects.filter(yard=yard).values(
-            "row", "column_start", "column_end", "tier", "container__type"
+            "row", "column_start", "column_end", "tier", "container__size"
         )
 
         available_places = []
@@ -229,7 +229,7 @@ class YardService:
                 and location["tier"] == tier - 1
                 and location["column_start"] <= column_start
                 and location["column_end"] >= column_start
-                and location["container__type"] == ContainerSize.TWENTY
+                and location["container__size"] in TWENTY_FOOT_SIZES
                 for location in occupied_locations
             )
 
@@ -238,7 +238,7 @@ class YardService:
                 and location["tier"] == tier - 1
                 and location["column_start"] <= column_end
                 and location["column_end"] >= column_end
-                and location["container__type"] == ContainerSize.TWENTY
+                and location["container__size"] in TWENTY_FOOT_SIZES
                 for location in occupied_locations
             )
 
@@ -256,17 +256,6 @@ class YardService:
         yard = Yard.objects.get(id=yard_id)
         for key, value in data.items():
             setattr(yard, key, value)
-        yard.save()
+        # Leave ``version`` alone: it may have been bumped since the yard was read.
+        yard.save(update_fields=list(data))
         return yard
-
-
-class ContainerLocationService:
-    def create(self, container, data):
-        if container.type == ContainerSize.TWENTY:
-            data["column_end"] = data["column_start"]
-        else:
-            data["column_end"] = data["column_start"] + 1
-        container_location = ContainerLocation.objects.create(
-            container=container, **data
-        )
-        return container_location
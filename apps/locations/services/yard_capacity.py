@@ -0,0 +1,138 @@
+from django.core.cache import cache
+
+from apps.core.choices import ContainerSize
+from apps.locations.models import ContainerLocation, Yard
+from apps.locations.services.stack_model import TWENTY_FOOT_SIZES, get_columns_needed
+
+CAPACITY_CACHE_KEY = "yard_capacity_summary"
+# Short enough for a dashboard to look live, long enough that polling clients
+# share one computation.
+CAPACITY_CACHE_TIMEOUT = 30
+
+# Size classes by footprint: 45ft boxes take two columns like 40ft ones, so they
+# are counted in the "40" class.
+SIZE_CLASSES = {
+    "20": get_columns_needed(ContainerSize.TWENTY),
+    "40": get_columns_needed(ContainerSize.FORTY),
+}
+
+
+class YardCapacityService:
+    """
+    Free capacity per yard and size class, from stack heights rather than slot
+    enumeration.
+
+    Slots are counted as disjoint placements: two free ground cells side by side
+    are two 20ft slots or one 40ft or 45ft slot. ``free_stackable_slots`` are
+    the placements available on top of existing stacks right now. TEU figures
+    count grid cells, one per 20ft footprint and tier.
+    """
+
+    def get_summary(self):
+        summary = cache.get(CAPACITY_CACHE_KEY)
+        if summary is None:
+            summary = self.build_summary()
+            cache.set(CAPACITY_CACHE_KEY, summary, CAPACITY_CACHE_TIMEOUT)
+        return summary
+
+    def build_summary(self):
+        yards = list(Yard.objects.order_by("name", "id"))
+        stacks = {yard.id: {} for yard in yards}
+        for location in ContainerLocation.objects.filter(
+            yard_id__in=stacks.keys()
+        ).values(
+            "id",
+            "yard_id",
+            "row",
+            "column_start",
+            "column_end",
+            "tier",
+            "container__size",
+        ):
+            yard_stacks = stacks[location["yard_id"]]
+            for column in range(location["column_start"], location["column_end"] + 1):
+                stack = yard_stacks.get((location["row"], column))
+                if stack is None or location["tier"] > stack["height"]:
+                    yard_stacks[(location["row"], column)] = {
+                        "height": location["tier"],
+                        "top_id": location["id"],
+                        "top_size": location["container__size"],
+                    }
+
+        results = [self._get_yard_capacity(yard, stacks[yard.id]) for yard in yards]
+        totals = {
+            "teu_capacity": sum(result["teu_capacity"] for result in results),
+            "teu_used": sum(result["teu_used"] for result in results),
+            "free_ground_slots": {
+                size: sum(result["free_ground_slots"][size] for result in results)
+                for size in SIZE_CLASSES
+            },
+            "free_stackable_slots": {
+                size: sum(result["free_stackable_slots"][size] for result in results)
+                for size in SIZE_CLASSES
+            },
+        }
+        totals["utilisation"] = self._get_utilisation(
+            totals["teu_used"], totals["teu_capacity"]
+        )
+        return {"yards": results, "totals": totals}
+
+    def _get_yard_capacity(self, yard, stacks):
+        teu_capacity = yard.max_rows * yard.max_columns * yard.max_tiers
+        # A stack's height counts every tier below its top as used as well.
+        teu_used = sum(stack["height"] for stack in stacks.values())
+        free_ground_slots = {}
+        free_stackable_slots = {}
+        for size, width in SIZE_CLASSES.items():
+            ground, stacked = self._count_free_slots(yard, stacks, width)
+            free_ground_slots[size] = ground
+            free_stackable_slots[size] = stacked
+        return {
+            "yard_id": yard.id,
+            "name": yard.name,
+            "teu_capacity": teu_capacity,
+            "teu_used": teu_used,
+            "utilisation": self._get_utilisation(teu_used, teu_capacity),
+            "free_ground_slots": free_ground_slots,
+            "free_stackable_slots": free_stackable_slots,
+        }
+
+    def _count_free_slots(self, yard, stacks, width):
+        ground = stacked = 0
+        for row in range(1, yard.max_rows + 1):
+            column = 1
+            while column + width - 1 <= yard.max_columns:
+                span = [stacks.get((row, column + offset)) for offset in range(width)]
+                height = self._get_landing_height(span, yard.max_tiers)
+                if height is None:
+                    column += 1
+                    continue
+                if height == 0:
+                    ground += 1
+                else:
+                    stacked += 1
+                column += width
+        return ground, stacked
+
+    def _get_landing_height(self, span, max_tiers):
+        """
+        Height of the stacks a box would rest on, or ``None`` if it cannot be
+        placed there; mirrors ``YardStackModel.is_supported``.
+        """
+        if all(stack is None for stack in span):
+            return 0
+        if any(stack is None for stack in span):
+            return None
+        height = span[0]["height"]
+        if height >= max_tiers or any(stack["height"] != height for stack in span):
+            return None
+        if len({stack["top_id"] for stack in span}) == 1:
+            return height
+        if len(span) == 2 and all(
+            stack["top_size"] in TWENTY_FOOT_SIZES for stack in span
+        ):
+            return height
+        return None
+
+    def _get_utilisation(self, used, capacity):
+        return round(used / capacity * 100, 1) if capacity else 0.0
@@ -0,0 +1,94 @@
+import json
+import time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max, Q
+
+from apps.locations.models import YardChange
+
+# Seconds between checks for new changes while a client waits.
+POLL_INTERVAL = 1.0
+# Upper bound of a long-poll request and of one event-stream connection; clients
+# reconnect afterwards. A waiting client holds a worker thread all along.
+MAX_WAIT = 10
+STREAM_LIFETIME = 20
+STREAM_KEEPALIVE = 10
+
+CHANGE_FIELDS = (
+    "sequence",
+    "yard_id",
+    "previous_yard_id",
+    "action",
+    "container_location_id",
+    "container_id",
+    "container__name",
+    "container__size",
+    "row",
+    "column_start",
+    "column_end",
+    "tier",
+    "created_at",
+)
+
+
+class YardChangeService:
+    """
+    Incremental feed of yard occupancy changes.
+
+    Clients start from the ``sequence`` of a yard snapshot and then only ask for
+    changes after it, either by long-polling or over a server-sent event stream.
+    Only changes numbered after commit are handed out, so the sequence never
+    moves past a change still to be committed.
+
+    Both ways of waiting block a worker thread for up to ``MAX_WAIT`` or
+    ``STREAM_LIFETIME`` seconds, so the application has to run with threaded
+    workers (e.g. gunicorn's ``gthread`` class) sized for the open 3-D views.
+    """
+
+    def get_last_sequence(self):
+        return YardChange.objects.aggregate(sequence=Max("sequence"))["sequence"] or 0
+
+    def get_changes(self, since, yard_id=None, limit=1000):
+        queryset = YardChange.objects.filter(sequence__gt=since)
+        if yard_id is not None:
+            # A container moved out of the yard is reported to its old yard too.
+            queryset = queryset.filter(Q(yard_id=yard_id) | Q(previous_yard_id=yard_id))
+        changes = []
+        for change in queryset.order_by("sequence").values(*CHANGE_FIELDS)[:limit]:
+            change["container_name"] = change.pop("container__name")
+            change["container_size"] = change.pop("container__size")
+            changes.append(change)
+        return changes
+
+    def wait_for_changes(self, since, yard_id=None, wait=0, limit=1000):
+        deadline = time.monotonic() + min(wait, MAX_WAIT)
+        while True:
+            changes = self.get_changes(since, yard_id, limit)
+            if changes or time.monotonic() >= deadline:
+                break
+            time.sleep(POLL_INTERVAL)
+        return {
+            "sequence": changes[-1]["sequence"] if changes else since,
+            "changes": changes,
+        }
+
+    def stream_changes(self, since, yard_id=None):
+        """
+        Yield server-sent events for changes after ``since`` until the stream
+        lifetime runs out.
+        """
+        started = last_sent = time.monotonic()
+        yield f"retry: {int(POLL_INTERVAL * 1000)}\n\n"
+        while time.monotonic() - started < STREAM_LIFETIME:
+            changes = self.get_changes(since, yard_id)
+            for change in changes:
+                since = change["sequence"]
+                data = json.dumps(change, cls=DjangoJSONEncoder)
+                yield f"id: {since}\nevent: change\ndata: {data}\n\n"
+            now = time.monotonic()
+            if changes:
+                last_sent = now
+            elif now - last_sent >= STREAM_KEEPALIVE:
+                last_sent = now
+                yield ": keepalive\n\n"
+            time.sleep(POLL_INTERVAL)
@@ -0,0 +1,97 @@
+from django.core.cache import cache
+from django.db.models import F, FilteredRelation, Q
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+
+from apps.locations.models import ContainerLocation, Yard
+
+HEATMAP_CACHE_TIMEOUT = 60 * 60
+
+
+class YardHeatmapService:
+    """
+    Per-bay dwell and stack height of a yard as dense ``rows x columns`` grids.
+
+    A bay is one (row, column) stack; a 40ft box counts towards both bays it
+    covers. The grid is cached per yard version and day, since every change to
+    the yard bumps its version and dwell days only grow overnight.
+    """
+
+    def get_heatmap(self, yard_id):
+        yard = get_object_or_404(Yard, id=yard_id)
+        today = timezone.localdate()
+        cache_key = (
+            f"yard_heatmap:{yard.id}:{yard.version}:"
+            f"{yard.max_rows}x{yard.max_columns}:{today.isoformat()}"
+        )
+        heatmap = cache.get(cache_key)
+        if heatmap is None:
+            heatmap = self.build_heatmap(yard, today)
+            cache.set(cache_key, heatmap, HEATMAP_CACHE_TIMEOUT)
+        return heatmap
+
+    def build_heatmap(self, yard, today):
+        rows, columns = yard.max_rows, yard.max_columns
+        dwell_total = [[0] * columns for _ in range(rows)]
+        dwell_count = [[0] * columns for _ in range(rows)]
+        max_dwell = [[None] * columns for _ in range(rows)]
+        stack_height = [[0] * columns for _ in range(rows)]
+
+        locations = {}
+        for location in (
+            ContainerLocation.objects.filter(yard=yard)
+            .annotate(
+                open_visit=FilteredRelation(
+                    "terminal_visits",
+                    condition=Q(terminal_visits__exit_time__isnull=True),
+                )
+            )
+            .order_by("id", "open_visit__entry_time")
+            .values(
+                "id",
+                "row",
+                "column_start",
+                "column_end",
+                "tier",
+                entry_time=F("open_visit__entry_time"),
+            )
+        ):
+            # With several open visits on one location the latest one counts.
+            locations[location["id"]] = location
+
+        for location in locations.values():
+            dwell_days = None
+            if location["entry_time"] is not None:
+                dwell_days = (today - timezone.localdate(location["entry_time"])).days
+            row = location["row"] - 1
+            for column in range(location["column_start"] - 1, location["column_end"]):
+                if not (0 <= row < rows and 0 <= column < columns):
+                    continue
+                stack_height[row][column] = max(
+                    stack_height[row][column], location["tier"]
+                )
+                if dwell_days is None:
+                    continue
+                dwell_total[row][column] += dwell_days
+                dwell_count[row][column] += 1
+                if (
+                    max_dwell[row][column] is None
+                    or dwell_days > max_dwell[row][column]
+                ):
+                    max_dwell[row][column] = dwell_days
+
+        return {
+            "yard_id": yard.id,
+            "date": today,
+            "rows": rows,
+            "columns": columns,
+            "avg_dwell_days": [
+                [
+                    round(total / count, 1) if count else None
+                    for total, count in zip(total_row, count_row)
+                ]
+                for total_row, count_row in zip(dwell_total, dwell_count)
+            ],
+            "max_dwell_days": max_dwell,
+            "stack_height": stack_height,
+        }
@@ -0,0 +1,177 @@
+from django.db.models import F, OuterRef, Q, Subquery
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+
+from apps.core.choices import YardChangeAction
+from apps.core.models import Container
+from apps.locations.models import (
+    ContainerLocation,
+    Yard,
+    YardChange,
+    YardCheckpoint,
+    YardCheckpointContainer,
+)
+from apps.locations.services.yard_change import YardChangeService
+
+OCCUPANCY_FIELDS = (
+    "id",
+    "container_id",
+    "row",
+    "column_start",
+    "column_end",
+    "tier",
+)
+
+
+class YardHistoryService:
+    """
+    Answers "what did a yard look like" and "where was a container" for any
+    moment, from the ``YardChange`` log.
+
+    A yard is reconstructed from its latest checkpoint before the requested time
+    plus the changes recorded after that checkpoint, so the cost depends on the
+    checkpoint interval rather than on the length of the history.
+    """
+
+    def get_yard_occupancy(self, yard_id, at):
+        yard = get_object_or_404(Yard, id=yard_id)
+        checkpoint = (
+            YardCheckpoint.objects.filter(yard=yard, taken_at__lte=at)
+            .order_by("-taken_at", "-id")
+            .first()
+        )
+        occupancy = {}
+        last_sequence = 0
+        if checkpoint is not None:
+            occupancy = {location["id"]: location for location in checkpoint.occupancy}
+            last_sequence = checkpoint.last_sequence
+
+        # Committed changes not numbered yet come last, in the order they were made.
+        changes = (
+            YardChange.objects.filter(
+                Q(sequence__gt=last_sequence) | Q(sequence__isnull=True),
+                Q(yard=yard) | Q(previous_yard=yard),
+                created_at__lte=at,
+            )
+            .order_by(F("sequence").asc(nulls_last=True), "id")
+            .values("yard_id", "action", "container_location_id", *OCCUPANCY_FIELDS[1:])
+        )
+        for change in changes:
+            location_id = change["container_location_id"]
+            if change["action"] == YardChangeAction.DELETED or (
+                change["yard_id"] != yard.id
+            ):
+                occupancy.pop(location_id, None)
+            elif change["action"] != YardChangeAction.DISPATCHED:
+                occupancy[location_id] = {
+                    "id": location_id,
+                    **{field: change[field] for field in OCCUPANCY_FIELDS[1:]},
+                }
+
+        containers = Container.objects.in_bulk(
+            {location["container_id"] for location in occupancy.values()}
+        )
+        locations = []
+        for location in sorted(
+            occupancy.values(),
+            key=lambda location: (
+                location["row"],
+                location["column_start"],
+                location["tier"],
+            ),
+        ):
+            container = containers.get(location["container_id"])
+            locations.append(
+                {
+                    **location,
+                    "container_name": container.name if container else None,
+                    "container_size": container.size if container else None,
+                }
+            )
+        return {"yard_id": yard.id, "at": at, "locations": locations}
+
+    def get_container_position(self, container_name, at):
+        container = get_object_or_404(Container, name=container_name)
+        change = (
+            YardChange.objects.filter(container=container, created_at__lte=at)
+            .exclude(action=YardChangeAction.DISPATCHED)
+            .order_by("-created_at", "-id")
+            .first()
+        )
+        position = None
+        if change is None:
+            position = self.get_checkpoint_position(container.id, at)
+        elif change.action != YardChangeAction.DELETED:
+            position = {
+                "yard_id": change.yard_id,
+                "row": change.row,
+                "column_start": change.column_start,
+                "column_end": change.column_end,
+                "tier": change.tier,
+            }
+        return {
+            "container_id": container.id,
+            "container_name": container.name,
+            "at": at,
+            "position": position,
+        }
+
+    def get_checkpoint_position(self, container_id, at):
+        """
+        Position of a container that has not moved since a checkpoint before
+        ``at``, such as one placed before the history began.
+        """
+        # Only the latest checkpoint of each yard counts: an older one may still
+        # hold a container that has left that yard since.
+        latest = (
+            YardCheckpoint.objects.filter(
+                yard_id=OuterRef("checkpoint__yard_id"), taken_at__lte=at
+            )
+            .order_by("-taken_at", "-id")
+            .values("id")[:1]
+        )
+        return (
+            YardCheckpointContainer.objects.filter(
+                container_id=container_id, checkpoint_id=Subquery(latest)
+            )
+            .order_by("-checkpoint__taken_at", "-checkpoint_id")
+            .values(*OCCUPANCY_FIELDS[2:], yard_id=F("checkpoint__yard_id"))
+            .first()
+        )
+
+    def create_checkpoints(self, yards=None):
+        yards = list(yards if yards is not None else Yard.objects.all())
+        # Read first, like snapshots: it only covers changes committed before the
+        # occupancy is read, and replaying a later one already in the checkpoint
+        # again is harmless, missing one is not.
+        last_sequence = YardChangeService().get_last_sequence()
+
+        occupancy = {yard.id: [] for yard in yards}
+        for location in ContainerLocation.objects.filter(
+            yard_id__in=occupancy.keys()
+        ).values("yard_id", *OCCUPANCY_FIELDS):
+            occupancy[location.pop("yard_id")].append(location)
+        # Stamped after the read, so that no reconstruction before ``taken_at``
+        # starts from a state holding changes made after it.
+        taken_at = timezone.now()
+
+        checkpoints = YardCheckpoint.objects.bulk_create(
+            [
+                YardCheckpoint(
+                    yard=yard,
+                    taken_at=taken_at,
+                    last_sequence=last_sequence,
+                    occupancy=occupancy[yard.id],
+                )
+                for yard in yards
+            ]
+        )
+        YardCheckpointContainer.objects.bulk_create(
+            YardCheckpointContainer(
+                checkpoint=checkpoint,
+                **{field: location[field] for field in OCCUPANCY_FIELDS[1:]},
+            )
+            for checkpoint in checkpoints
+            for location in checkpoint.occupancy
+        )
+        return checkpoints
@@ -0,0 +1,227 @@
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from apps.containers.models import ContainerStorage
+from apps.core.models import Container
+from apps.locations.models import ContainerLocation, Yard
+from apps.locations.services.container_location import ContainerLocationService
+from apps.locations.services.stack_model import get_columns_needed
+
+SCAN_KEY_FIELDS = ("yard_id", "row", "column_start", "tier")
+
+
+class YardReconciliationService:
+    """
+    Compare a physical scan of whole yards with the recorded state.
+
+    The expected state is loaded with a fixed number of queries and joined with
+    the scan on container name in memory:
+
+    * ``missing`` - recorded in a scanned yard, not seen anywhere in the scan;
+    * ``unexpected`` - seen, but unknown or without any recorded location;
+    * ``misplaced`` - seen somewhere other than its recorded location;
+    * ``orphaned`` - a location in a scanned yard without an open visit;
+    * ``visit_mismatches`` - open visits whose location holds another container.
+    """
+
+    def reconcile(self, yard_ids, items, apply=False):
+        yards = self._get_yards(yard_ids, items)
+        self._validate_items(items, yards)
+
+        expected = {}
+        location_ids = []
+        for location in self._get_location_values(
+            ContainerLocation.objects.filter(yard_id__in=yards.keys())
+        ):
+            # A container's latest location is its current one.
+            expected[location["container__name"]] = location
+            location_ids.append(location["id"])
+
+        observed = {item["container_name"]: item for item in items}
+        containers = {
+            container.name: container
+            for container in Container.objects.filter(name__in=observed.keys())
+        }
+        elsewhere = {}
+        for location in self._get_location_values(
+            ContainerLocation.objects.filter(
+                container__name__in=observed.keys() - expected.keys()
+            )
+        ):
+            elsewhere[location["container__name"]] = location
+
+        result = {
+            "missing": [],
+            "unexpected": [],
+            "misplaced": [],
+            "orphaned": [],
+            "visit_mismatches": [],
+        }
+
+        for name, location in expected.items():
+            if name not in observed:
+                result["missing"].append(
+                    {
+                        "container_id": location["container_id"],
+                        "container_name": name,
+                        "location": self._get_position(location),
+                    }
+                )
+
+        for name, item in observed.items():
+            container = containers.get(name)
+            location = expected.get(name) or elsewhere.get(name)
+            if container is None or location is None:
+                result["unexpected"].append(
+                    {
+                        "container_id": container.id if container else None,
+                        "container_name": name,
+                        "observed": self._get_observed_position(item, container),
+                        "reason": "unknown_container"
+                        if container is None
+                        else "no_location",
+                    }
+                )
+            elif self._get_key(location) != self._get_key(item):
+                result["misplaced"].append(
+                    {
+                        "container_id": container.id,
+                        "container_name": name,
+                        "expected": self._get_position(location),
+                        "observed": self._get_observed_position(item, container),
+                    }
+                )
+
+        self._check_visits(location_ids, expected, result)
+
+        result["summary"] = {key: len(value) for key, value in result.items()}
+        result["applied"] = False
+        if apply and result["misplaced"]:
+            self._apply(result["misplaced"])
+            result["applied"] = True
+        return result
+
+    def _get_yards(self, yard_ids, items):
+        yard_ids = set(yard_ids) | {item["yard_id"] for item in items}
+        yards = Yard.objects.in_bulk(yard_ids)
+        unknown = sorted(yard_ids - yards.keys())
+        if unknown:
+            raise ValidationError({"yard_ids": [f"Yards {unknown} do not exist."]})
+        return yards
+
+    def _validate_items(self, items, yards):
+        errors = [{} for _ in items]
+        names, cells = set(), set()
+        for index, item in enumerate(items):
+            name, key = item["container_name"], self._get_key(item)
+            if name in names:
+                errors[index]["container_name"] = ["Container is scanned twice."]
+            if key in cells:
+                errors[index]["column_start"] = ["Position is scanned twice."]
+            yard = yards[item["yard_id"]]
+            if (
+                item["row"] > yard.max_rows
+                or item["column_start"] > yard.max_columns
+                or item["tier"] > yard.max_tiers
+            ):
+                errors[index]["row"] = ["Position is outside the yard."]
+            names.add(name)
+            cells.add(key)
+        if any(errors):
+            raise ValidationError({"items": errors})
+
+    def _check_visits(self, location_ids, expected, result):
+        locations = {location["id"]: location for location in expected.values()}
+        visited = set()
+        for visit in (
+            ContainerStorage.objects.filter(
+                exit_time__isnull=True, container_location_id__in=location_ids
+            )
+            .order_by("id")
+            .values("id", "container_id", "container__name", "container_location_id")
+        ):
+            visited.add(visit["container_location_id"])
+            location = locations.get(visit["container_location_id"])
+            if (
+                location is not None
+                and location["container_id"] != visit["container_id"]
+            ):
+                result["visit_mismatches"].append(
+                    {
+                        "visit_id": visit["id"],
+                        "visit_container_name": visit["container__name"],
+                        "location_id": location["id"],
+                        "location_container_name": location["container__name"],
+                    }
+                )
+
+        for name, location in expected.items():
+            if location["id"] not in visited:
+                result["orphaned"].append(
+                    {
+                        "location_id": location["id"],
+                        "container_id": location["container_id"],
+                        "container_name": name,
+                        "location": self._get_position(location),
+                    }
+                )
+
+    @transaction.atomic
+    def _apply(self, misplaced):
+        moves = [
+            {
+                "container_id": item["container_id"],
+                "yard_id": item["observed"]["yard_id"],
+                "row": item["observed"]["row"],
+                "column_start": item["observed"]["column_start"],
+                "tier": item["observed"]["tier"],
+            }
+            for item in misplaced
+        ]
+        try:
+            ContainerLocationService().bulk_move(moves)
+        except ValidationError as exc:
+            raise ValidationError(
+                {
+                    "apply": {
+                        item["container_name"]: error
+                        for item, error in zip(misplaced, exc.detail)
+                        if error
+                    }
+                }
+            )
+
+    def _get_location_values(self, queryset):
+        return queryset.order_by("id").values(
+            "id",
+            "container_id",
+            "container__name",
+            "container__size",
+            "yard_id",
+            "row",
+            "column_start",
+            "column_end",
+            "tier",
+        )
+
+    def _get_key(self, position):
+        return tuple(position[field] for field in SCAN_KEY_FIELDS)
+
+    def _get_position(self, location):
+        return {
+            "yard_id": location["yard_id"],
+            "row": location["row"],
+            "column_start": location["column_start"],
+            "column_end": location["column_end"],
+            "tier": location["tier"],
+        }
+
+    def _get_observed_position(self, item, container):
+        columns_needed = get_columns_needed(container.size) if container else 1
+        return {
+            "yard_id": item["yard_id"],
+            "row": item["row"],
+            "column_start": item["column_start"],
+            "column_end": item["column_start"] + columns_needed - 1,
+            "tier": item["tier"],
+        }
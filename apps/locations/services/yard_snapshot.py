@@ -0,0 +1,147 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from apps.containers.models import ContainerStorage
+from apps.core.choices import ContainerSize
+from apps.locations.models import ContainerLocation, Yard
+from apps.locations.services.yard_change import YardChangeService
+
+YARD_FIELDS = (
+    "id",
+    "name",
+    "max_rows",
+    "max_columns",
+    "max_tiers",
+    "x_coordinate",
+    "z_coordinate",
+    "rotation_degree",
+    "version",
+)
+
+# Snapshots are keyed by content, so the timeout only bounds memory use.
+SNAPSHOT_CACHE_TIMEOUT = 60 * 60
+
+SIZE_CODES = {size: code for code, size in enumerate(ContainerSize.values)}
+
+
+class YardSnapshotService:
+    """
+    Columnar snapshot of yard occupancy for the 3-D yard view.
+
+    Every yard carries parallel arrays (one entry per container location) and
+    refers to sizes and companies by their index in the shared ``sizes`` and
+    ``companies`` lists. A snapshot takes four queries to build and is cached
+    under a tag derived from the yard versions, so it is only rebuilt after a
+    yard actually changed. ``sequence`` is where a client picks up the change feed.
+    """
+
+    def get_yards(self, yard_id=None):
+        queryset = Yard.objects.order_by("name", "id")
+        if yard_id is not None:
+            queryset = queryset.filter(id=yard_id)
+        return list(queryset.values(*YARD_FIELDS))
+
+    def get_tag(self, yards):
+        # Dwell days grow overnight, so the date is part of the tag as well.
+        payload = json.dumps(
+            [timezone.localdate(), yards], cls=DjangoJSONEncoder, sort_keys=True
+        )
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def get_snapshot(self, yards, tag):
+        cache_key = f"yard_snapshot:{tag}"
+        snapshot = cache.get(cache_key)
+        if snapshot is None:
+            snapshot = self.build_snapshot(yards)
+            cache.set(cache_key, snapshot, SNAPSHOT_CACHE_TIMEOUT)
+        return snapshot
+
+    def build_snapshot(self, yards):
+        today = timezone.localdate()
+        yard_ids = [yard["id"] for yard in yards]
+        # Read first: changes made while the snapshot is built are replayed by the
+        # feed rather than lost.
+        sequence = YardChangeService().get_last_sequence()
+
+        visits = {}
+        for location_id, company_id, company_name, entry_time in (
+            ContainerStorage.objects.filter(
+                exit_time__isnull=True, container_location__yard_id__in=yard_ids
+            )
+            .order_by("entry_time", "id")
+            .values_list(
+                "container_location_id", "company_id", "company__name", "entry_time"
+            )
+        ):
+            # Ordered by entry time, so the latest open visit wins.
+            visits[location_id] = (company_id, company_name, entry_time)
+
+        companies = {}
+        columns = {yard["id"]: self._get_empty_columns() for yard in yards}
+        for location in (
+            ContainerLocation.objects.filter(yard_id__in=yard_ids)
+            .order_by("yard_id", "row", "column_start", "tier")
+            .values(
+                "id",
+                "yard_id",
+                "row",
+                "column_start",
+                "column_end",
+                "tier",
+                "container__name",
+                "container__size",
+            )
+        ):
+            yard_columns = columns[location["yard_id"]]
+            yard_columns["id"].append(location["id"])
+            yard_columns["container_name"].append(location["container__name"])
+            yard_columns["row"].append(location["row"])
+            yard_columns["column_start"].append(location["column_start"])
+            yard_columns["column_end"].append(location["column_end"])
+            yard_columns["tier"].append(location["tier"])
+            yard_columns["size"].append(SIZE_CODES.get(location["container__size"]))
+
+            visit = visits.get(location["id"])
+            if visit is None:
+                yard_columns["company"].append(None)
+                yard_columns["dwell_days"].append(None)
+                continue
+            company_id, company_name, entry_time = visit
+            if company_id not in companies:
+                companies[company_id] = {
+                    "index": len(companies),
+                    "id": company_id,
+                    "name": company_name,
+                }
+            yard_columns["company"].append(companies[company_id]["index"])
+            yard_columns["dwell_days"].append(
+                (today - timezone.localdate(entry_time)).days
+            )
+
+        return {
+            "date": today,
+            "sequence": sequence,
+            "sizes": ContainerSize.values,
+            "companies": [
+                {"id": company["id"], "name": company["name"]}
+                for company in companies.values()
+            ],
+            "yards": [{**yard, "locations": columns[yard["id"]]} for yard in yards],
+        }
+
+    def _get_empty_columns(self):
+        return {
+            "id": [],
+            "container_name": [],
+            "row": [],
+            "column_start": [],
+            "column_end": [],
+            "tier": [],
+            "size": [],
+            "company": [],
+            "dwell_days": [],
+        }
@@ -1,15 +1,63 @@
 from django.urls import path
 
-from apps.locations.api import (
+from apps.locations.apis.container_location import (
+    ContainerPositionHistoryApi,
+    ContainerLocationBulkMoveApi,
+    ContainerRetrievalPlanApi,
+    TrainLoadingPlanApi,
+)
+from apps.locations.apis.yard import (
     YardListApi,
     YardCreateApi,
     YardUpdateApi,
+    YardSnapshotApi,
+    YardChangeListApi,
+    YardChangeStreamApi,
+    YardHistoryApi,
+    YardHeatmapApi,
+    YardCapacityApi,
+    YardReconciliationApi,
+    SpatialStackApi,
+    SpatialYardApi,
     AvailablePlacesApi,
 )
 
 urlpatterns = [
     path("yards/", YardListApi.as_view(), name="yard-list"),
+    path("yards/snapshot/", YardSnapshotApi.as_view(), name="yard_snapshot"),
+    path("yards/changes/", YardChangeListApi.as_view(), name="yard_change_list"),
+    path(
+        "yards/changes/stream/",
+        YardChangeStreamApi.as_view(),
+        name="yard_change_stream",
+    ),
+    path("yards/<int:pk>/history/", YardHistoryApi.as_view(), name="yard_history"),
+    path("yards/reconcile/", YardReconciliationApi.as_view(), name="yard_reconcile"),
+    path("spatial/stacks/", SpatialStackApi.as_view(), name="spatial_stacks"),
+    path("spatial/yards/", SpatialYardApi.as_view(), name="spatial_yards"),
+    path("yards/<int:pk>/heatmap/", YardHeatmapApi.as_view(), name="yard_heatmap"),
+    path("yards/capacity/", YardCapacityApi.as_view(), name="yard_capacity"),
     path("available_places/", AvailablePlacesApi.as_view(), name="yard-list"),
     path("yard/create/", YardCreateApi.as_view(), name="yard-structure"),
     path("yard/<int:pk>/update/", YardUpdateApi.as_view(), name="yard-update"),
+    path(
+        "container_locations/bulk_move/",
+        ContainerLocationBulkMoveApi.as_view(),
+        name="container_location_bulk_move",
+    ),
+    path(
+        "containers/<int:container_id>/retrieval_plan/",
+        ContainerRetrievalPlanApi.as_view(),
+        name="container_retrieval_plan",
+    ),
+    path(
+        "containers/position_at/",
+        ContainerPositionHistoryApi.as_view(),
+        name="container_position_history",
+    ),
+    path(
+        "train_loading_plan/",
+        TrainLoadingPlanApi.as_view(),
+        name="train_loading_plan",
+    ),
 ]
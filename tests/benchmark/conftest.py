@@ -0,0 +1,53 @@
+import os
+import random
+
+import pytest
+from django.utils import timezone
+
+from apps.containers.factories import ContainerStorageFactory
+from apps.containers.models import ContainerStorage
+from apps.customers.factories import CompanyFactory
+from apps.locations.factories import YardFactory, fill_yard
+
+
+def pytest_collection_modifyitems(config, items):
+    # Wall-clock budgets depend on the machine, so shared CI runners skip them.
+    if os.environ.get("TIMING_BUDGETS"):
+        return
+    skip = pytest.mark.skip(reason="timing budgets only run with TIMING_BUDGETS=1")
+    for item in items:
+        if "timing" in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture
+def realistic_yards():
+    """
+    Five rotated 6x20x4 yards filled to 75% with a mix of 20ft and 40ft boxes, each
+    with an open visit, which is what a busy day on the terminal looks like.
+    """
+    rng = random.Random(2024)
+    companies = [CompanyFactory() for _ in range(10)]
+    yards = [
+        YardFactory(
+            x_coordinate=index * 60.0,
+            z_coordinate=index * 15.0,
+            rotation_degree=rng.choice([0.0, 90.0, 15.0]),
+        )
+        for index in range(5)
+    ]
+    now = timezone.now()
+    for index, yard in enumerate(yards):
+        locations = fill_yard(yard, fill_ratio=0.75, seed=index)
+        ContainerStorage.objects.bulk_create(
+            [
+                ContainerStorageFactory.build(
+                    container_id=location.container_id,
+                    container_location=location,
+                    company=rng.choice(companies),
+                    entry_time=now - timezone.timedelta(days=rng.randint(0, 60)),
+                )
+                for location in locations
+            ]
+        )
+    return yards
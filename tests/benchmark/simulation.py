@@ -0,0 +1,279 @@
+import math
+import random
+import statistics
+import time
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from apps.containers.services.container_storage import ContainerStorageService
+from apps.core.choices import ContainerSize, ContainerState, TransportType
+from apps.customers.factories import CompanyFactory
+from apps.locations.factories import YardFactory
+from apps.locations.services.container_location import ContainerLocationService
+from apps.locations.services.stack_model import YardStackModel
+from apps.locations.services.yard import YardService
+
+OPERATIONS = ("arrival", "move", "dispatch")
+# Rough mix of the boxes passing through the terminal.
+SIZE_WEIGHTS = {
+    ContainerSize.TWENTY: 5,
+    ContainerSize.TWENTY_HIGH_CUBE: 1,
+    ContainerSize.FORTY: 2,
+    ContainerSize.FORTY_HIGH_CUBE: 2,
+}
+
+
+def get_percentile(values, percentile):
+    """
+    Nearest-rank percentile of sorted ``values``, or ``None`` when empty.
+    """
+    if not values:
+        return None
+    return values[max(math.ceil(len(values) * percentile / 100) - 1, 0)]
+
+
+class YardSimulation:
+    """
+    Replay a synthetic period of terminal traffic against fresh yards.
+
+    Every simulated day dispatches the visits whose dwell is over, registers new
+    arrivals and shuffles a few boxes between yards. Each operation goes through
+    the services the API uses and is timed together with its query count, while
+    the choice of what to do next is made on in-memory ``YardStackModel``s, so
+    the bookkeeping never shows up in the measurements.
+
+    Operations the services reject (a full terminal, a move the stacking rules
+    refuse) are counted separately and not timed.
+    """
+
+    def __init__(
+        self,
+        yards=3,
+        days=365,
+        arrivals_per_day=20,
+        moves_per_day=5,
+        mean_dwell_days=7,
+        seed=None,
+    ):
+        self.yard_count = yards
+        self.days = days
+        self.arrivals_per_day = arrivals_per_day
+        self.moves_per_day = moves_per_day
+        self.mean_dwell_days = mean_dwell_days
+        self.rng = random.Random(seed)
+        # Keeps names unique when several runs are kept in one database, within
+        # the 11 characters the visit endpoint takes.
+        self.prefix = f"S{uuid.uuid4().hex[:4].upper()}"
+        self.samples = {operation: [] for operation in OPERATIONS}
+        self.rejected = defaultdict(int)
+        self.container_count = 0
+
+    def run(self):
+        self.yards = [
+            YardFactory(name=f"Simulation {self.prefix} {index + 1}")
+            for index in range(self.yard_count)
+        ]
+        self.models = {yard.id: YardStackModel(yard) for yard in self.yards}
+        self.companies = [
+            CompanyFactory(name=f"Simulation {self.prefix} company {index + 1}")
+            for index in range(5)
+        ]
+        # Boxes on the terminal by location id: visit id, yard and due exit time.
+        self.boxes = {}
+
+        start = timezone.now() - timedelta(days=self.days)
+        for day in range(self.days):
+            today = start + timedelta(days=day)
+            self._dispatch_due(today)
+            for _ in range(self._get_daily_count(self.arrivals_per_day)):
+                self._arrive(today + timedelta(hours=self.rng.uniform(0, 24)))
+            for _ in range(self._get_daily_count(self.moves_per_day)):
+                self._move()
+        return self.get_report()
+
+    def get_report(self):
+        operations = {}
+        busy_seconds = 0.0
+        for operation, samples in self.samples.items():
+            latencies = sorted(elapsed * 1000 for elapsed, _ in samples)
+            queries = [count for _, count in samples]
+            busy_seconds += sum(elapsed for elapsed, _ in samples)
+            operations[operation] = {
+                "count": len(samples),
+                "rejected": self.rejected[operation],
+                "p50_ms": get_percentile(latencies, 50),
+                "p99_ms": get_percentile(latencies, 99),
+                "avg_queries": round(statistics.mean(queries), 1) if queries else 0,
+                "max_queries": max(queries, default=0),
+            }
+        total = sum(operation["count"] for operation in operations.values())
+        return {
+            "days": self.days,
+            "yards": self.yard_count,
+            "operations": total,
+            "busy_seconds": round(busy_seconds, 3),
+            "throughput": round(total / busy_seconds, 1) if busy_seconds else 0.0,
+            "by_operation": operations,
+        }
+
+    def _measure(self, operation, func, *args):
+        # Keeps the query log of a long run under its size limit.
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            try:
+                result = func(*args)
+            except ValidationError:
+                self.rejected[operation] += 1
+                return None
+            elapsed = time.perf_counter() - started
+        if result is None:
+            self.rejected[operation] += 1
+        else:
+            self.samples[operation].append((elapsed, len(queries)))
+        return result
+
+    def _arrive(self, entry_time):
+        self.container_count += 1
+        company = self.rng.choice(self.companies)
+        data = {
+            "container_name": f"{self.prefix}{self.container_count:06d}",
+            "container_size": self.rng.choices(
+                list(SIZE_WEIGHTS), weights=SIZE_WEIGHTS.values()
+            )[0],
+            "container_state": ContainerState.LOADED,
+            "container_owner": company.name,
+            "product_name": "",
+            "transport_type": TransportType.AUTO,
+            "transport_number": f"{self.container_count:08d}",
+            "company_id": company.id,
+            "entry_time": entry_time,
+            "services": [],
+        }
+        location = self._measure("arrival", self._register, data)
+        if location is None:
+            return
+        self.models[location.yard_id].add(self._get_location_dict(location))
+        self.boxes[location.id] = {
+            "visit_id": location.visit_id,
+            "yard_id": location.yard_id,
+            "due": entry_time
+            + timedelta(days=self.rng.expovariate(1 / self.mean_dwell_days)),
+        }
+
+    def _register(self, data):
+        # Gate-in and placement the way the visit and location endpoints do them.
+        yards = YardService().get_places(data["container_size"], None)
+        # Yards already in the database are not the simulation's to fill.
+        yard = next((yard for yard in yards if yard["id"] in self.models), None)
+        if yard is None:
+            return None
+        place = self.rng.choice(yard["available_places"])
+        visit = ContainerStorageService().register_container_entry(data)
+        location = ContainerLocationService().create(
+            visit.container, {"yard_id": yard["id"], **place}
+        )
+        visit.container_location = location
+        visit.save()
+        location.visit_id = visit.id
+        return location
+
+    def _move(self):
+        movable = [
+            location_id
+            for location_id, box in self.boxes.items()
+            if not self.models[box["yard_id"]].get_locations_above(location_id)
+        ]
+        if not movable:
+            return
+        location_id = self.rng.choice(movable)
+        box = self.boxes[location_id]
+        source = self.models[box["yard_id"]].locations[location_id]
+        target_yard = self.rng.choice(self.yards)
+
+        moved = self._measure("move", self._relocate, source, target_yard)
+        if not moved:
+            return
+        self.models[box["yard_id"]].remove(location_id)
+        self.models[target_yard.id].add(self._get_location_dict(moved[0]))
+        box["yard_id"] = target_yard.id
+
+    def _relocate(self, source, target_yard):
+        places = [
+            place
+            for place in YardService().get_available_places(target_yard, source["size"])
+            if not self._rests_on(place, source, target_yard)
+        ]
+        if not places:
+            return None
+        place = self.rng.choice(places)
+        return ContainerLocationService().bulk_move(
+            [
+                {
+                    "container_id": source["container_id"],
+                    "yard_id": target_yard.id,
+                    **place,
+                }
+            ]
+        )
+
+    def _rests_on(self, place, source, yard):
+        width = source["column_end"] - source["column_start"]
+        column_end = place["column_start"] + width
+        return (
+            yard.id == source["yard_id"]
+            and place["row"] == source["row"]
+            and place["tier"] == source["tier"] + 1
+            and place["column_start"] <= source["column_end"]
+            and column_end >= source["column_start"]
+        )
+
+    def _dispatch_due(self, today):
+        due = sorted(
+            (box["due"], location_id)
+            for location_id, box in self.boxes.items()
+            if box["due"] <= today
+        )
+        for exit_time, location_id in due:
+            box = self.boxes[location_id]
+            model = self.models[box["yard_id"]]
+            # Buried boxes wait until the ones above them have left.
+            if model.get_locations_above(location_id):
+                continue
+            if self._measure("dispatch", self._dispatch, box["visit_id"], exit_time):
+                model.remove(location_id)
+                del self.boxes[location_id]
+
+    def _dispatch(self, visit_id, exit_time):
+        visit = ContainerStorageService().dispatch_container_visit(
+            visit_id,
+            {
+                "exit_time": exit_time,
+                "exit_transport_type": TransportType.AUTO,
+                "exit_transport_number": f"{visit_id:08d}",
+            },
+        )
+        # The box has left through the gate, freeing its slot.
+        visit.container_location.delete()
+        return visit
+
+    def _get_daily_count(self, mean):
+        return max(round(self.rng.gauss(mean, math.sqrt(mean))), 0)
+
+    def _get_location_dict(self, location):
+        return {
+            "id": location.id,
+            "container_id": location.container_id,
+            "yard_id": location.yard_id,
+            "row": location.row,
+            "column_start": location.column_start,
+            "column_end": location.column_end,
+            "tier": location.tier,
+            "size": location.container.size,
+        }
@@ -0,0 +1,65 @@
+import random
+import time
+from datetime import date, timedelta
+
+import pytest
+from django.utils import timezone
+
+from apps.containers.factories import ContainerFactory, ContainerStorageFactory
+from apps.containers.models import ContainerStorage
+from apps.containers.services.container_occupancy import ContainerOccupancyService
+from apps.core.choices import ContainerSize
+from apps.core.models import Container
+from apps.customers.factories import CompanyFactory
+
+
+@pytest.fixture
+def three_years_of_visits():
+    rng = random.Random(38)
+    companies = [CompanyFactory() for _ in range(20)]
+    containers = Container.objects.bulk_create(
+        [
+            ContainerFactory.build(
+                size=rng.choice([ContainerSize.TWENTY, ContainerSize.FORTY])
+            )
+            for _ in range(20000)
+        ]
+    )
+    start = timezone.now() - timedelta(days=3 * 365)
+    visits = []
+    for container in containers:
+        entry_time = start + timedelta(minutes=rng.randint(0, 3 * 365 * 24 * 60))
+        exit_time = entry_time + timedelta(hours=rng.randint(1, 30 * 24))
+        visits.append(
+            ContainerStorageFactory.build(
+                container=container,
+                company=rng.choice(companies),
+                entry_time=entry_time,
+                exit_time=exit_time if exit_time < timezone.now() else None,
+            )
+        )
+    ContainerStorage.objects.bulk_create(visits)
+
+
+def get_series():
+    return ContainerOccupancyService().get_series(
+        date.today() - timedelta(days=3 * 365), date.today(), group_by="company"
+    )
+
+
+@pytest.mark.django_db
+def test_three_years_of_daily_occupancy_are_grouped(three_years_of_visits):
+    series = get_series()
+
+    assert len(series["groups"]) == 20
+    assert max(series["total"]) > 0
+
+
+@pytest.mark.timing
+@pytest.mark.django_db
+def test_three_years_of_daily_occupancy_take_under_a_second(three_years_of_visits):
+    started = time.perf_counter()
+    get_series()
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 1
@@ -0,0 +1,43 @@
+import random
+import time
+
+import pytest
+
+from apps.locations.services.spatial_index import SpatialIndexService
+
+
+def sample_points():
+    rng = random.Random(11)
+    return [(rng.uniform(-20, 300), rng.uniform(-20, 100)) for _ in range(500)]
+
+
+@pytest.mark.django_db
+def test_radius_and_bbox_queries_find_nearby_stacks(realistic_yards):
+    service = SpatialIndexService()
+    yard_ids = {yard.id for yard in realistic_yards}
+    hits = 0
+    for x, z in sample_points():
+        stacks = service.get_stacks(x=x, z=z, radius=30)
+        distances = [stack["distance"] for stack in stacks]
+        assert distances == sorted(distances)
+        assert all(distance <= 30 for distance in distances)
+        yards = service.get_yards(bbox=(x, z, x + 40, z + 40))
+        assert {yard["yard_id"] for yard in yards} <= yard_ids
+        hits += bool(stacks)
+    assert hits > 0
+
+
+@pytest.mark.timing
+@pytest.mark.django_db
+def test_radius_and_bbox_queries_take_under_a_millisecond(realistic_yards):
+    service = SpatialIndexService()
+    service.get_index()
+    points = sample_points()
+
+    started = time.perf_counter()
+    for x, z in points:
+        service.get_stacks(x=x, z=z, radius=30)
+        service.get_yards(bbox=(x, z, x + 40, z + 40))
+    elapsed = time.perf_counter() - started
+
+    assert elapsed / (len(points) * 2) < 0.001
@@ -0,0 +1,36 @@
+import random
+import time
+
+import pytest
+
+from apps.containers.models import ContainerStorage
+from apps.locations.services.train_loading_planner import TrainLoadingPlannerService
+
+
+def sample_train():
+    visit_ids = list(ContainerStorage.objects.values_list("id", flat=True))
+    return random.Random(7).sample(visit_ids, 120)
+
+
+@pytest.mark.django_db
+def test_full_train_is_planned(realistic_yards):
+    train = sample_train()
+
+    plan = TrainLoadingPlannerService().get_loading_plan(train)
+
+    retrieved = [
+        move["visit_id"] for move in plan["moves"] if move["action"] == "retrieve"
+    ]
+    assert sorted(retrieved) == sorted(train)
+
+
+@pytest.mark.timing
+@pytest.mark.django_db
+def test_full_train_is_planned_within_seconds(realistic_yards):
+    train = sample_train()
+
+    started = time.perf_counter()
+    TrainLoadingPlannerService().get_loading_plan(train)
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 5
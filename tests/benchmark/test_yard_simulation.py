@@ -0,0 +1,36 @@
+import pytest
+
+from apps.containers.models import ContainerStorage
+from tests.benchmark.simulation import OPERATIONS, YardSimulation
+
+
+def simulate_month():
+    return YardSimulation(
+        yards=2, days=30, arrivals_per_day=10, moves_per_day=5, seed=2024
+    ).run()
+
+
+@pytest.mark.django_db
+def test_simulated_month_stays_within_query_budgets():
+    report = simulate_month()
+
+    stats = report["by_operation"]
+    assert all(stats[operation]["count"] > 0 for operation in OPERATIONS)
+    assert stats["arrival"]["rejected"] == 0
+    assert stats["arrival"]["max_queries"] <= 20
+    assert stats["move"]["max_queries"] <= 10
+    assert stats["dispatch"]["max_queries"] <= 12
+    assert (
+        ContainerStorage.objects.filter(exit_time__isnull=False).count()
+        == (stats["dispatch"]["count"])
+    )
+
+
+@pytest.mark.timing
+@pytest.mark.django_db
+def test_simulated_month_stays_within_latency_budgets():
+    report = simulate_month()
+
+    stats = report["by_operation"]
+    assert all(stats[operation]["p99_ms"] < 250 for operation in OPERATIONS)
+    assert report["throughput"] > 20
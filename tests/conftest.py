@@ -1,5 +1,7 @@
 import pytest
+from django.core.cache import cache
 from django.urls import reverse
+from silk.collector import DataCollector
 
 from apps.containers.models import (
     ContainerStorage,
@@ -19,6 +21,21 @@ from apps.locations.models import Yard, ContainerLocation
 from apps.users.models import CustomUser
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_silk_collector():
+    # Silk keeps the last profiled request per thread and then EXPLAINs every
+    # later query, which throws off query-count assertions.
+    yield
+    DataCollector().clear()
+
+
 @pytest.fixture
 def api_client():
     from rest_framework.test import APIClient
@@ -95,6 +112,23 @@ def container_location(container, yard):
         )
 
 
+@pytest.fixture
+def place_container(yard):
+    def _place(name, row, column_start, tier, size=ContainerSize.TWENTY):
+        container = Container.objects.create(name=name, size=size)
+        column_end = column_start if size == ContainerSize.TWENTY else column_start + 1
+        return ContainerLocation.objects.create(
+            container=container,
+            yard=yard,
+            row=row,
+            column_start=column_start,
+            column_end=column_end,
+            tier=tier,
+        )
+
+    return _place
+
+
 @pytest.fixture
 def container_terminal_visit(container, company, container_location):
     return ContainerStorage.objects.create(
@@ -1,8 +1,17 @@
+from datetime import timedelta
+
 import pytest
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 
+from apps.containers.factories import ContainerFactory, ContainerStorageFactory
+from apps.containers.models import ContainerStorage
+from apps.containers.services.container_storage import ContainerStorageService
+from apps.core.choices import ContainerSize
+from apps.customers.factories import CompanyFactory
 from apps.customers.models import Company
+from apps.customers.services import CompanyCounterService
 
 
 @pytest.mark.django_db
@@ -69,3 +78,81 @@ class TestCompanyAPI:
         assert response.status_code == status.HTTP_200_OK
         assert len(response.data["results"]) == 1
         assert response.data["results"][0]["name"] == "ABC Company"
+
+
+@pytest.mark.django_db
+class TestCompanyCounters:
+    def _get_counters(self, company):
+        company.refresh_from_db()
+        return (
+            company.visits_count,
+            company.visits_in_terminal,
+            company.teu_in_terminal,
+        )
+
+    def test_counters_follow_visits(self, company):
+        entry_time = timezone.now() - timedelta(days=2)
+        twenty = ContainerStorageFactory(company=company, entry_time=entry_time)
+        forty = ContainerStorageFactory(
+            company=company,
+            container=ContainerFactory(size=ContainerSize.FORTY),
+            entry_time=entry_time,
+        )
+        assert self._get_counters(company) == (2, 2, 3)
+        assert company.last_activity_at == entry_time
+
+        exit_time = timezone.now()
+        ContainerStorageService().dispatch_container_visit(
+            forty.id, {"exit_time": exit_time}
+        )
+        assert self._get_counters(company) == (2, 1, 1)
+        assert company.last_activity_at == exit_time
+
+        other = CompanyFactory()
+        twenty = ContainerStorage.objects.get(id=twenty.id)
+        twenty.company = other
+        twenty.save()
+        assert self._get_counters(company) == (1, 0, 0)
+        assert self._get_counters(other) == (1, 1, 1)
+
+        ContainerStorage.objects.get(id=forty.id).delete()
+        assert self._get_counters(company) == (0, 0, 0)
+
+    def test_resized_visit_can_be_dispatched(self, company):
+        visit = ContainerStorageFactory(company=company)
+        assert self._get_counters(company) == (1, 1, 1)
+        ContainerStorageService().update_container_visit(
+            visit.id,
+            {"container_name": visit.container.name, "container_size": "40"},
+        )
+        assert self._get_counters(company) == (1, 1, 2)
+
+        ContainerStorageService().dispatch_container_visit(
+            visit.id, {"exit_time": timezone.now()}
+        )
+        assert self._get_counters(company) == (1, 0, 0)
+
+    def test_drifted_counters_stop_at_zero(self, company):
+        visit = ContainerStorageFactory(company=company)
+        Company.objects.filter(id=company.id).update(
+            visits_in_terminal=0, teu_in_terminal=0
+        )
+        ContainerStorage.objects.get(id=visit.id).delete()
+        assert self._get_counters(company) == (0, 0, 0)
+
+    def test_company_list_reads_the_counters(self, authenticated_api_client, company):
+        ContainerStorageFactory.create_batch(3, company=company)
+        response = authenticated_api_client.get(reverse("customer_list"))
+        result = response.data["results"][0]
+        assert result["containers_count"] == 3
+        assert result["visits_in_terminal"] == 3
+
+    def test_reconciliation_corrects_drift(self, company):
+        visit = ContainerStorageFactory(company=company)
+        ContainerStorage.objects.filter(id=visit.id).update(exit_time=timezone.now())
+        Company.objects.filter(id=company.id).update(visits_count=7)
+
+        drifted = CompanyCounterService().reconcile()
+        assert [item.id for item in drifted] == [company.id]
+        assert self._get_counters(company) == (1, 0, 0)
+        assert CompanyCounterService().reconcile() == []
@@ -1,8 +1,30 @@
+import importlib
 import os
+from datetime import UTC, date, datetime, timedelta
+from decimal import Decimal
 
 import pytest
+from django.apps import apps as django_apps
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+
+from apps.containers.factories import ContainerStorageFactory
+from apps.containers.models import ContainerServiceInstance
+from apps.core.choices import ContainerSize, ContainerState
+from apps.core.models import FreeDayCombination, TerminalService
+from apps.customers.factories import CompanyFactory
+from apps.customers.models import CompanyContract, ContractFreeDay, ContractService
+from apps.customers.services import (
+    ActiveContractService,
+    CompanyContractService,
+    ContractPriceService,
+    ContractPriceUpdateService,
+    ContractServiceService,
+    ContractTariffService,
+)
 
 from terminal_management.settings.development import MEDIA_ROOT
 
@@ -56,3 +78,647 @@ class TestCompanyContractAPI:
         url = reverse("company_contract_delete", kwargs={"contract_id": contract.id})
         response = api_client.delete(url)
         assert response.status_code == 204
+
+
+@pytest.mark.django_db
+class TestContractTariff:
+    @pytest.fixture
+    def tariff_contract(self, company):
+        return CompanyContract.objects.create(
+            company=company, name="Tariff", start_date="2024-01-01", free_days=4
+        )
+
+    @pytest.fixture
+    def weighing(self):
+        return TerminalService.objects.create(
+            name="Weighing",
+            container_size=ContainerSize.ANY,
+            container_state=ContainerState.ANY,
+            base_price=10,
+        )
+
+    def test_contracts_store_only_overrides(
+        self, authenticated_api_client, tariff_contract, weighing
+    ):
+        assert not ContractService.objects.exists()
+        assert not ContractFreeDay.objects.exists()
+
+        url = reverse(
+            "contract_service_price",
+            kwargs={"contract_id": tariff_contract.id, "service_id": weighing.id},
+        )
+        response = authenticated_api_client.put(url, {"price": "12.50"})
+        assert response.status_code == 200
+        assert response.data["price"] == "12.50"
+        assert response.data["is_override"] is True
+        assert ContractService.objects.get().price == Decimal("12.50")
+
+        response = authenticated_api_client.put(url, {"price": "10"})
+        assert response.data["id"] is None
+        assert response.data["is_override"] is False
+        assert not ContractService.objects.exists()
+
+    def test_service_list_merges_base_prices_with_overrides(
+        self, authenticated_api_client, tariff_contract, weighing
+    ):
+        lashing = TerminalService.objects.create(
+            name="Lashing",
+            container_size=ContainerSize.FORTY,
+            container_state=ContainerState.LOADED,
+            base_price=30,
+        )
+        override = ContractService.objects.create(
+            contract=tariff_contract, service=lashing, price=25
+        )
+        url = reverse(
+            "company_contract_list", kwargs={"contract_id": tariff_contract.id}
+        )
+
+        response = authenticated_api_client.get(url)
+        assert [
+            (item["id"], item["service_id"], item["price"])
+            for item in response.data["results"]
+        ] == [(override.id, lashing.id, 25.0), (None, weighing.id, 10.0)]
+
+        response = authenticated_api_client.get(url, {"container_size": "20"})
+        assert [item["service_id"] for item in response.data["results"]] == [
+            weighing.id
+        ]
+
+    def test_free_days_fall_back_to_the_contract_then_the_default(
+        self, authenticated_api_client, tariff_contract, company
+    ):
+        combination = FreeDayCombination.objects.create(
+            container_size=ContainerSize.TWENTY,
+            container_state=ContainerState.LOADED,
+            category="import",
+            default_free_days=7,
+        )
+        url = reverse(
+            "contract_combination_free_days",
+            kwargs={
+                "contract_id": tariff_contract.id,
+                "combination_id": combination.id,
+            },
+        )
+        response = authenticated_api_client.put(url, {"free_days": 9})
+        assert response.data["free_days"] == 9
+        assert ContractFreeDay.objects.get().free_days == 9
+
+        response = authenticated_api_client.put(url, {"free_days": 4})
+        assert response.data["is_override"] is False
+        assert not ContractFreeDay.objects.exists()
+
+        without_free_days = CompanyContract.objects.create(
+            company=company, name="Defaults", start_date="2024-02-01", is_active=False
+        )
+        response = authenticated_api_client.get(
+            reverse(
+                "contract_free_days_list",
+                kwargs={"contract_id": without_free_days.id},
+            )
+        )
+        assert [item["free_days"] for item in response.data["results"]] == [7]
+
+    def test_tariff_is_cached_until_an_override_changes(
+        self, tariff_contract, weighing, django_assert_num_queries
+    ):
+        tariffs = ContractTariffService()
+        tariffs.get_tariff(tariff_contract.id)
+        with django_assert_num_queries(0):
+            tariffs.get_tariff(tariff_contract.id)
+
+        tariffs.set_service_price(tariff_contract.id, weighing.id, 15)
+        assert tariffs.get_tariff(tariff_contract.id)["services"][0]["price"] == 15
+
+    def test_visits_pick_services_without_a_contract_row(
+        self, authenticated_api_client, tariff_contract, weighing, company, container
+    ):
+        response = authenticated_api_client.post(
+            reverse("container_storage_register"),
+            {
+                "container_name": container.name,
+                "container_size": container.size,
+                "container_state": ContainerState.LOADED,
+                "container_owner": "",
+                "product_name": "",
+                "transport_type": "auto",
+                "transport_number": "01A123BC",
+                "company_id": company.id,
+                "entry_time": "2024-03-01T10:00:00Z",
+                "services": [{"service_id": weighing.id}],
+            },
+            format="json",
+        )
+        assert response.status_code == 201
+        instance = ContainerServiceInstance.objects.get()
+        assert instance.contract_service.contract_id == tariff_contract.id
+        assert instance.contract_service.price == 10
+
+        # The row only anchors the visit and keeps following the base price.
+        weighing.base_price = 11
+        weighing.save()
+        instance.contract_service.refresh_from_db()
+        assert instance.contract_service.price == 11
+
+    def test_compaction_keeps_overrides_and_referenced_rows(
+        self, tariff_contract, weighing, company
+    ):
+        lashing = TerminalService.objects.create(name="Lashing", base_price=30)
+        washing = TerminalService.objects.create(name="Washing", base_price=5)
+        used = ContractService.objects.create(
+            contract=tariff_contract, service=weighing, price=10
+        )
+        ContractService.objects.create(
+            contract=tariff_contract, service=lashing, price=30
+        )
+        override = ContractService.objects.create(
+            contract=tariff_contract, service=washing, price=6
+        )
+        ContainerServiceInstance.objects.create(
+            container_storage=ContainerStorageFactory(company=company),
+            contract_service=used,
+        )
+        combination = FreeDayCombination.objects.create(
+            container_size=ContainerSize.TWENTY,
+            container_state=ContainerState.EMPTY,
+            category="import",
+        )
+        ContractFreeDay.objects.create(
+            contract=tariff_contract, free_day_combination=combination, free_days=4
+        )
+
+        migration = importlib.import_module(
+            "apps.customers.migrations.0009_compact_contract_overrides"
+        )
+        migration.compact_contract_overrides(django_apps, None)
+
+        assert set(ContractService.objects.values_list("id", flat=True)) == {
+            used.id,
+            override.id,
+        }
+        assert not ContractFreeDay.objects.exists()
+
+
+@pytest.mark.django_db
+class TestContractProvisioning:
+    @pytest.fixture
+    def source_contract(self, company):
+        contract = CompanyContract.objects.create(
+            company=company, name="2024", start_date="2024-01-01", free_days=3
+        )
+        for index in range(3):
+            service = TerminalService.objects.create(
+                name=f"Service {index}", base_price=10
+            )
+            ContractService.objects.create(
+                contract=contract, service=service, price=20 + index
+            )
+        ContractFreeDay.objects.create(
+            contract=contract,
+            free_day_combination=FreeDayCombination.objects.create(
+                container_size=ContainerSize.TWENTY,
+                container_state=ContainerState.LOADED,
+                category="import",
+            ),
+            free_days=6,
+        )
+        return contract
+
+    def _get_tariff(self, contract):
+        return (
+            sorted(contract.services.values_list("service_id", "price")),
+            list(
+                contract.contract_free_days.values_list(
+                    "free_day_combination_id", "free_days"
+                )
+            ),
+        )
+
+    def test_clone_copies_overrides_in_constant_queries(
+        self, source_contract, django_assert_num_queries
+    ):
+        service = CompanyContractService()
+        with django_assert_num_queries(12):
+            first = service.clone_contract(
+                source_contract.id,
+                {"name": "Clone", "start_date": date(2024, 6, 1), "is_active": False},
+            )
+        assert self._get_tariff(first) == self._get_tariff(source_contract)
+        assert first.free_days == 3
+
+        # A row at the base price only anchors visits and is not copied.
+        ContractService.objects.create(
+            contract=source_contract,
+            service=TerminalService.objects.create(name="Anchor", base_price=5),
+            price=5,
+        )
+        with django_assert_num_queries(12):
+            second = service.clone_contract(
+                source_contract.id,
+                {"name": "Clone 2", "start_date": date(2024, 7, 1), "is_active": False},
+            )
+        assert second.services.count() == 3
+
+    def test_renewal_takes_over_as_the_active_contract(
+        self, authenticated_api_client, source_contract, company
+    ):
+        response = authenticated_api_client.post(
+            reverse("company_contract_renew", args=[source_contract.id]),
+            {"name": "2025", "start_date": "2025-01-01"},
+        )
+        assert response.status_code == 201
+        renewal = CompanyContract.objects.get(id=response.data["id"])
+        assert renewal.is_active
+        assert self._get_tariff(renewal) == self._get_tariff(source_contract)
+
+        source_contract.refresh_from_db()
+        assert source_contract.is_active
+        assert source_contract.end_date == date(2024, 12, 31)
+        assert ActiveContractService().get_active_contract_ids([company.id]) == {
+            company.id: renewal.id
+        }
+
+    def test_renewal_takes_over_on_its_start_date(self, source_contract, company):
+        start_date = timezone.localdate() + timedelta(days=30)
+        renewal = CompanyContractService().renew_contract(
+            source_contract.id, {"name": "Next", "start_date": start_date}
+        )
+        service = ContractServiceService()
+        repriced = source_contract.services.first().service_id
+        service.set_price(renewal.id, repriced, 99)
+        assert renewal.services.get(service_id=repriced).price == 99
+
+        resolver = ActiveContractService()
+        assert resolver.get_active_contract(company.id)["id"] == source_contract.id
+        prices = {
+            entry["service"]["name"]: entry["price"]
+            for entry in service.get_active_services_by_company(company.id, {})
+        }
+        assert prices == {"Service 0": 20, "Service 1": 21, "Service 2": 22}
+        assert resolver.get_active_contract(company.id, start_date)["id"] == renewal.id
+
+    def test_clone_rejects_a_taken_name(
+        self, authenticated_api_client, source_contract
+    ):
+        response = authenticated_api_client.post(
+            reverse("company_contract_clone", args=[source_contract.id]),
+            {"name": "2024", "start_date": "2024-06-01", "is_active": False},
+        )
+        assert response.status_code == 400
+        assert "name" in response.data["extra"]["fields"]
+
+
+@pytest.mark.django_db
+class TestActiveContract:
+    @pytest.fixture
+    def contract(self, contract):
+        contract.end_date = None
+        contract.save()
+        return contract
+
+    def test_ended_contract_gives_way(self, company):
+        ended = CompanyContract.objects.create(
+            company=company,
+            name="Ended",
+            start_date="2024-01-01",
+            end_date="2024-12-31",
+        )
+        resolver = ActiveContractService()
+        assert resolver.get_active_contract(company.id) is None
+        assert (
+            resolver.get_active_contract(company.id, today=date(2024, 6, 1))["id"]
+            == ended.id
+        )
+
+        current = CompanyContractService().create_contract(
+            company.id, {"name": "Current", "start_date": timezone.localdate()}
+        )
+        assert resolver.get_active_contract_ids([company.id]) == {
+            company.id: current.id
+        }
+
+    def test_contract_applies_from_its_start_date(self, company):
+        today = timezone.localdate()
+        current = CompanyContract.objects.create(
+            company=company,
+            name="Current",
+            start_date=today - timedelta(days=30),
+            end_date=today + timedelta(days=9),
+        )
+        upcoming = CompanyContractService().create_contract(
+            company.id, {"name": "Upcoming", "start_date": today + timedelta(days=10)}
+        )
+        resolver = ActiveContractService()
+        assert resolver.get_active_contract(company.id)["id"] == current.id
+        assert (
+            resolver.get_active_contract(company.id, today + timedelta(days=10))["id"]
+            == upcoming.id
+        )
+        assert (
+            resolver.get_active_contract(company.id, today - timedelta(days=31)) is None
+        )
+
+    def test_a_company_has_one_active_contract(
+        self, authenticated_api_client, contract, company
+    ):
+        response = authenticated_api_client.post(
+            reverse("company_contract_create", kwargs={"company_id": company.id}),
+            {
+                "name": "Second",
+                "start_date": "2025-01-01",
+                "end_date": "2025-12-31",
+                "is_active": True,
+                "free_days": 10,
+                "file": SimpleUploadedFile("second.txt", b"Second contract"),
+            },
+            format="multipart",
+        )
+        assert response.status_code == 400
+        assert "is_active" in response.data["extra"]["fields"]
+
+        inactive = CompanyContract.objects.create(
+            company=company, name="Second", start_date="2025-01-01", is_active=False
+        )
+        response = authenticated_api_client.put(
+            reverse("company_contract_update", kwargs={"contract_id": inactive.id}),
+            {
+                "name": "Second",
+                "start_date": "2025-01-01",
+                "end_date": "2025-12-31",
+                "is_active": True,
+            },
+        )
+        assert response.status_code == 400
+        inactive.refresh_from_db()
+        assert not inactive.is_active
+
+    def test_taken_start_date_is_rejected(self, authenticated_api_client, company):
+        CompanyContract.objects.create(
+            company=company, name="First", start_date="2025-01-01", is_active=False
+        )
+        response = authenticated_api_client.post(
+            reverse("company_contract_create", kwargs={"company_id": company.id}),
+            {
+                "name": "Second",
+                "start_date": "2025-01-01",
+                "is_active": False,
+                "free_days": 10,
+                "file": SimpleUploadedFile("second.txt", b"Second contract"),
+            },
+            format="multipart",
+        )
+        assert response.status_code == 400
+        assert not CompanyContract.objects.filter(name="Second").exists()
+
+    def test_resolver_needs_no_queries_until_a_contract_changes(
+        self, contract, company, django_assert_num_queries
+    ):
+        other = CompanyFactory()
+        resolver = ActiveContractService()
+        with django_assert_num_queries(1):
+            assert resolver.get_active_contract_ids([company.id, other.id]) == {
+                company.id: contract.id,
+                other.id: None,
+            }
+        with django_assert_num_queries(0):
+            resolver.get_active_contract_ids([company.id, other.id])
+            assert resolver.get_active_contract(company.id)["name"] == contract.name
+
+        contract.is_active = False
+        contract.save()
+        with django_assert_num_queries(1):
+            assert resolver.get_active_contract(company.id) is None
+
+
+@pytest.mark.django_db
+class TestBulkPricing:
+    @pytest.fixture
+    def tariffs(self, company):
+        other = CompanyFactory()
+        contracts = [
+            CompanyContract.objects.create(
+                company=company, name="Ours", start_date="2024-01-01"
+            ),
+            CompanyContract.objects.create(
+                company=other, name="Theirs", start_date="2024-01-01"
+            ),
+        ]
+        services = [
+            TerminalService.objects.create(name="Weighing", base_price=10),
+            TerminalService.objects.create(name="Washing", base_price=40),
+        ]
+        ContractService.objects.create(
+            contract=contracts[0], service=services[1], price=50
+        )
+        return contracts, services
+
+    def _post(self, client, **data):
+        return client.post(reverse("contract_service_bulk_price"), data, format="json")
+
+    def _get_prices(self, contract):
+        return [
+            (entry["service"]["name"], entry["price"])
+            for entry in ContractTariffService().get_tariff(contract.id)["services"]
+        ]
+
+    def test_percentage_raise_for_a_company(
+        self, authenticated_api_client, company, tariffs
+    ):
+        (ours, theirs), _ = tariffs
+        response = self._post(
+            authenticated_api_client,
+            company_ids=[company.id],
+            rule="percentage",
+            value="5",
+        )
+        assert response.status_code == 200
+        assert response.data["updated"] == 2
+        assert self._get_prices(ours) == [("Washing", 52.5), ("Weighing", 10.5)]
+        assert self._get_prices(theirs) == [("Washing", 40), ("Weighing", 10)]
+
+    def test_preview_lists_changes_without_applying_them(
+        self, authenticated_api_client, tariffs
+    ):
+        (ours, theirs), (weighing, _) = tariffs
+        response = self._post(
+            authenticated_api_client,
+            service_ids=[weighing.id],
+            rule="absolute",
+            value="12",
+            preview=True,
+        )
+        assert [
+            (change["contract_name"], change["old_price"], change["new_price"])
+            for change in response.data["changes"]
+        ] == [("Ours", "10.00", "12.00"), ("Theirs", "10.00", "12.00")]
+        assert not ContractService.objects.filter(service=weighing).exists()
+        assert self._get_prices(ours)[1] == ("Weighing", 10)
+
+    def test_only_changed_prices_are_read_and_written(
+        self, tariffs, django_assert_num_queries
+    ):
+        (ours, _), (weighing, washing) = tariffs
+        CompanyContract.objects.create(
+            company=CompanyFactory(), name="Third", start_date="2024-01-01"
+        )
+        service = ContractPriceUpdateService()
+        # Every price is a multiple of 5 already: nothing is read back or written.
+        with django_assert_num_queries(4) as captured:
+            assert (
+                service.update_prices({}, "rounding", round_to=Decimal("5"))["updated"]
+                == 0
+            )
+        assert all(
+            query["sql"].startswith(("SELECT", "SAVEPOINT", "RELEASE"))
+            for query in captured.captured_queries
+        )
+
+        with django_assert_num_queries(6) as captured:
+            preview = service.update_prices(
+                {}, "absolute", value=Decimal("12"), preview=True
+            )
+        assert all(
+            query["sql"].startswith(("SELECT", "SAVEPOINT", "RELEASE"))
+            for query in captured.captured_queries
+        )
+        assert len(preview["changes"]) == 6
+
+        service.update_prices(
+            {"service_ids": [weighing.id]}, "absolute", value=Decimal("10")
+        )
+        assert list(ContractService.objects.values_list("contract", "service")) == [
+            (ours.id, washing.id)
+        ]
+
+    def test_rounding_back_to_the_base_price_drops_the_override(
+        self, authenticated_api_client, tariffs
+    ):
+        (ours, _), (_, washing) = tariffs
+        ContractService.objects.filter(contract=ours, service=washing).update(
+            price=Decimal("40.20")
+        )
+        response = self._post(authenticated_api_client, rule="rounding", round_to="5")
+        assert response.data["updated"] == 1
+        assert not ContractService.objects.exists()
+
+
+@pytest.mark.django_db
+class TestPriceHistory:
+    @pytest.fixture
+    def contract_service(self, company):
+        contract = CompanyContract.objects.create(
+            company=company, name="History", start_date="2024-01-01"
+        )
+        contract_service = ContractService.objects.create(
+            contract=contract,
+            service=TerminalService.objects.create(name="Weighing", base_price=10),
+            price=12,
+        )
+        contract_service.prices.update(effective_from=datetime(2024, 1, 1, tzinfo=UTC))
+        return contract_service
+
+    def _perform(self, contract_service, performed_at):
+        return ContainerServiceInstance.objects.create(
+            container_storage=ContainerStorageFactory(
+                company=contract_service.contract.company
+            ),
+            contract_service=contract_service,
+            performed_at=performed_at,
+        )
+
+    def test_performed_services_keep_their_price(
+        self, authenticated_api_client, contract_service
+    ):
+        before = self._perform(contract_service, datetime(2024, 2, 1, tzinfo=UTC))
+        contract_service.price = 15
+        contract_service.save()
+        after = self._perform(contract_service, timezone.now())
+
+        assert list(contract_service.prices.values_list("price", flat=True)) == [
+            12,
+            15,
+        ]
+        for instance, price in ((before, "12.00"), (after, "15.00")):
+            response = authenticated_api_client.get(
+                reverse(
+                    "container_storage_services", args=[instance.container_storage_id]
+                )
+            )
+            assert response.data[0]["price"] == price
+
+    def test_visit_list_loads_prices_once_per_page(
+        self, authenticated_api_client, service
+    ):
+        url = "/containers/containers_visit_list/"
+        for index in range(4):
+            contract = CompanyContract.objects.create(
+                company=CompanyFactory(),
+                name=f"Page {index}",
+                start_date="2024-01-01",
+            )
+            self._perform(
+                ContractService.objects.create(
+                    contract=contract, service=service, price=20
+                ),
+                timezone.now(),
+            )
+        authenticated_api_client.get(url, {"limit": 4})
+        # The queries of a page do not depend on its number of visits.
+        with CaptureQueriesContext(connection) as two:
+            authenticated_api_client.get(url, {"limit": 2})
+        with CaptureQueriesContext(connection) as four:
+            response = authenticated_api_client.get(url, {"limit": 4})
+        # The profiler records every request with queries of its own.
+        counts = [
+            len([query for query in captured if "silk_" not in query["sql"]])
+            for captured in (two, four)
+        ]
+        assert counts[0] == counts[1]
+        assert {
+            service["price"]
+            for visit in response.data["results"]
+            for service in visit["services"]
+        } == {Decimal("20.00")}
+
+    def test_bulk_price_update_records_the_new_prices(self, contract_service):
+        ContractPriceUpdateService().update_prices(
+            {"contract_ids": [contract_service.contract_id]}, "absolute", Decimal(14)
+        )
+        contract_id = contract_service.contract_id
+        prices = ContractPriceService()
+        assert prices.get_price(contract_id, contract_service.id, timezone.now()) == 14
+        assert (
+            prices.get_price(
+                contract_id, contract_service.id, datetime(2024, 3, 1, tzinfo=UTC)
+            )
+            == 12
+        )
+
+    def test_lookups_need_no_queries(self, contract_service, django_assert_num_queries):
+        contract_id = contract_service.contract_id
+        ContractPriceService().load([contract_id])
+        with django_assert_num_queries(0):
+            prices = ContractPriceService()
+            # Before the first recorded price, the first one applies.
+            assert (
+                prices.get_price(
+                    contract_id, contract_service.id, datetime(2023, 1, 1, tzinfo=UTC)
+                )
+                == 12
+            )
+            assert prices.get_price(contract_id, 0, timezone.now(), default=7) == 7
+
+    def test_price_change_reloads_only_its_contract(
+        self, contract_service, django_assert_num_queries
+    ):
+        other = CompanyContract.objects.create(
+            company=CompanyFactory(), name="Other", start_date="2024-01-01"
+        )
+        ContractPriceService().load([contract_service.contract_id, other.id])
+        ContractService.objects.create(
+            contract=other, service=contract_service.service, price=20
+        )
+        with django_assert_num_queries(1) as captured:
+            ContractPriceService().load([contract_service.contract_id, other.id])
+        assert f"IN ({other.id})" in captured.captured_queries[0]["sql"]
@@ -0,0 +1,247 @@
+import pytest
+from django.urls import reverse
+from rest_framework import status
+
+from apps.containers.models import ContainerStorage
+from apps.core.choices import ContainerState
+
+
+@pytest.mark.django_db
+class TestContainerLocationBulkMove:
+    url = reverse("container_location_bulk_move")
+
+    def test_swap_two_containers(self, authenticated_api_client, place_container):
+        first = place_container("CONT0000001", row=1, column_start=1, tier=1)
+        second = place_container("CONT0000002", row=1, column_start=2, tier=1)
+        data = [
+            {
+                "container_id": first.container_id,
+                "row": 1,
+                "column_start": 2,
+                "tier": 1,
+            },
+            {
+                "container_id": second.container_id,
+                "row": 1,
+                "column_start": 1,
+                "tier": 1,
+            },
+        ]
+        response = authenticated_api_client.post(self.url, data, format="json")
+        assert response.status_code == status.HTTP_200_OK
+        first.refresh_from_db()
+        second.refresh_from_db()
+        assert (first.column_start, second.column_start) == (2, 1)
+
+    def test_cycle_of_three_containers(self, authenticated_api_client, place_container):
+        locations = [
+            place_container(f"CONT000000{column}", row=2, column_start=column, tier=1)
+            for column in (1, 2, 3)
+        ]
+        data = [
+            {
+                "container_id": location.container_id,
+                "row": 2,
+                "column_start": location.column_start % 3 + 1,
+                "tier": 1,
+            }
+            for location in locations
+        ]
+        response = authenticated_api_client.post(self.url, data, format="json")
+        assert response.status_code == status.HTTP_200_OK
+        for location in locations:
+            previous_column = location.column_start
+            location.refresh_from_db()
+            assert location.column_start == previous_column % 3 + 1
+
+    def test_conflict_with_stationary_container(
+        self, authenticated_api_client, place_container
+    ):
+        moving = place_container("CONT0000001", row=1, column_start=1, tier=1)
+        place_container("CONT0000002", row=3, column_start=1, tier=1, size="40")
+        data = [
+            {
+                "container_id": moving.container_id,
+                "row": 3,
+                "column_start": 2,
+                "tier": 1,
+            }
+        ]
+        response = authenticated_api_client.post(self.url, data, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        moving.refresh_from_db()
+        assert moving.row == 1
+
+    def test_unsupported_target_is_rejected(
+        self, authenticated_api_client, place_container
+    ):
+        moving = place_container("CONT0000001", row=1, column_start=1, tier=1)
+        data = [
+            {
+                "container_id": moving.container_id,
+                "row": 4,
+                "column_start": 1,
+                "tier": 2,
+            }
+        ]
+        response = authenticated_api_client.post(self.url, data, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_moving_support_away_is_rejected(
+        self, authenticated_api_client, place_container
+    ):
+        bottom = place_container("CONT0000001", row=1, column_start=1, tier=1)
+        place_container("CONT0000002", row=1, column_start=1, tier=2)
+        data = [
+            {
+                "container_id": bottom.container_id,
+                "row": 5,
+                "column_start": 1,
+                "tier": 1,
+            }
+        ]
+        response = authenticated_api_client.post(self.url, data, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_restack_top_down_in_one_request(
+        self, authenticated_api_client, place_container
+    ):
+        bottom = place_container("CONT0000001", row=1, column_start=1, tier=1)
+        top = place_container("CONT0000002", row=1, column_start=1, tier=2)
+        data = [
+            {"container_id": top.container_id, "row": 5, "column_start": 1, "tier": 1},
+            {
+                "container_id": bottom.container_id,
+                "row": 5,
+                "column_start": 1,
+                "tier": 2,
+            },
+        ]
+        response = authenticated_api_client.post(self.url, data, format="json")
+        assert response.status_code == status.HTTP_200_OK
+        bottom.refresh_from_db()
+        assert (bottom.row, bottom.tier) == (5, 2)
+
+    def test_out_of_bounds_target(self, authenticated_api_client, place_container):
+        moving = place_container("CONT0000001", row=1, column_start=1, tier=1)
+        data = [
+            {
+                "container_id": moving.container_id,
+                "row": 99,
+                "column_start": 1,
+                "tier": 1,
+            }
+        ]
+        response = authenticated_api_client.post(self.url, data, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestContainerRetrievalPlan:
+    def test_plan_relocates_every_blocker_once(
+        self, authenticated_api_client, place_container
+    ):
+        target = place_container("CONT0000001", row=2, column_start=2, tier=1)
+        place_container("CONT0000002", row=2, column_start=2, tier=2)
+        place_container("CONT0000003", row=2, column_start=2, tier=3)
+        url = reverse(
+            "container_retrieval_plan", kwargs={"container_id": target.container_id}
+        )
+        response = authenticated_api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        moves = response.data["moves"]
+        assert [move["container_name"] for move in moves] == [
+            "CONT0000003",
+            "CONT0000002",
+        ]
+        for move in moves:
+            assert (move["to"]["row"], move["to"]["column_start"]) != (2, 2)
+        # Both blockers stay next to the dig area, on the ground either side of it.
+        assert [(move["to"]["row"], move["to"]["tier"]) for move in moves] == [
+            (2, 1),
+            (2, 1),
+        ]
+
+    def test_plan_includes_boxes_resting_on_blockers(
+        self, authenticated_api_client, place_container
+    ):
+        target = place_container("CONT0000001", row=1, column_start=1, tier=1)
+        place_container("CONT0000002", row=1, column_start=2, tier=1)
+        place_container("CONT0000003", row=1, column_start=1, tier=2, size="40")
+        place_container("CONT0000004", row=1, column_start=2, tier=3)
+        url = reverse(
+            "container_retrieval_plan", kwargs={"container_id": target.container_id}
+        )
+        response = authenticated_api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert [move["container_name"] for move in response.data["moves"]] == [
+            "CONT0000004",
+            "CONT0000003",
+        ]
+
+    def test_accessible_container_needs_no_moves(
+        self, authenticated_api_client, place_container
+    ):
+        target = place_container("CONT0000001", row=1, column_start=1, tier=1)
+        url = reverse(
+            "container_retrieval_plan", kwargs={"container_id": target.container_id}
+        )
+        response = authenticated_api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["moves"] == []
+
+
+@pytest.mark.django_db
+class TestTrainLoadingPlan:
+    url = reverse("train_loading_plan")
+
+    def _visit(self, location, company):
+        return ContainerStorage.objects.create(
+            container=location.container,
+            container_location=location,
+            company=company,
+            container_state=ContainerState.LOADED,
+        )
+
+    def test_stacked_targets_are_retrieved_without_rehandles(
+        self, authenticated_api_client, place_container, company
+    ):
+        bottom = place_container("CONT0000001", row=1, column_start=1, tier=1)
+        top = place_container("CONT0000002", row=1, column_start=1, tier=2)
+        visits = [self._visit(location, company) for location in (bottom, top)]
+        data = {"visit_ids": [visit.id for visit in visits]}
+        response = authenticated_api_client.post(self.url, data, format="json")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["total_rehandles"] == 0
+        assert [move["visit_id"] for move in response.data["moves"]] == [
+            visits[1].id,
+            visits[0].id,
+        ]
+
+    def test_blockers_are_not_stacked_on_remaining_targets(
+        self, authenticated_api_client, place_container, company
+    ):
+        first = place_container("CONT0000001", row=1, column_start=1, tier=1)
+        place_container("CONT0000002", row=1, column_start=1, tier=2)
+        second = place_container("CONT0000003", row=1, column_start=2, tier=1)
+        place_container("CONT0000004", row=1, column_start=2, tier=2)
+        visits = [self._visit(location, company) for location in (first, second)]
+        data = {"visit_ids": [visit.id for visit in visits]}
+        response = authenticated_api_client.post(self.url, data, format="json")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["total_rehandles"] == 2
+        first_relocation = response.data["moves"][0]
+        assert first_relocation["action"] == "relocate"
+        assert (
+            first_relocation["to"]["row"],
+            first_relocation["to"]["column_start"],
+        ) != (1, 2)
+
+    def test_dispatched_visit_is_rejected(
+        self, authenticated_api_client, container_terminal_visit
+    ):
+        container_terminal_visit.exit_time = "2024-02-01T00:00:00Z"
+        container_terminal_visit.save()
+        data = {"visit_ids": [container_terminal_visit.id]}
+        response = authenticated_api_client.post(self.url, data, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -1,13 +1,33 @@
-from datetime import timedelta
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
 
 import pytest
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
 
-from apps.containers.models import ContainerStorage
-from apps.core.choices import ContainerSize, ContainerState, TransportType
-from apps.core.models import Container
+from apps.containers.factories import ContainerFactory, ContainerStorageFactory
+from apps.containers.models import ContainerServiceInstance, ContainerStorage
+from apps.containers.services.company_dashboard import CompanyDashboardService
+from apps.containers.services.container_storage import ContainerStorageService
+from apps.containers.services.dwell_estimator import DwellEstimatorService
+from apps.containers.services.free_days_watchlist import FreeDaysWatchlistService
+from apps.core.choices import (
+    ContainerCategory,
+    ContainerSize,
+    ContainerState,
+    MeasurementUnit,
+    TransportType,
+)
+from apps.core.models import (
+    Container,
+    FreeDayCombination,
+    TerminalService,
+    TerminalServiceType,
+)
+from apps.customers.factories import CompanyFactory
+from apps.customers.models import CompanyContract, ContractFreeDay, ContractService
+from apps.locations.models import YardChange
 
 
 @pytest.mark.django_db
@@ -416,3 +436,547 @@ class TestContainerStorageDelete:
         response = authenticated_api_client.delete(url)
         assert response.status_code == status.HTTP_404_NOT_FOUND
         assert ContainerStorage.objects.count() == 1
+
+
+@pytest.mark.django_db
+class TestDwellEstimates:
+    def _history(self, company, dwell_days, count=5):
+        now = timezone.now()
+        for _ in range(count):
+            ContainerStorageFactory(
+                company=company,
+                product_name="Coal",
+                entry_time=now - timedelta(days=30),
+                exit_time=now - timedelta(days=30 - dwell_days),
+            )
+
+    def test_open_visit_gets_expected_exit_from_its_profile(
+        self, authenticated_api_client, company
+    ):
+        self._history(company, dwell_days=10)
+        self._history(CompanyFactory(), dwell_days=2)
+        DwellEstimatorService().refresh()
+        visit = ContainerStorageFactory(company=company, product_name="Coal")
+
+        # The list shares its URL name with other views, hence the literal path.
+        response = authenticated_api_client.get("/containers/containers_visit_list/")
+        assert response.status_code == status.HTTP_200_OK
+        [result] = [
+            result for result in response.data["results"] if result["id"] == visit.id
+        ]
+        assert result["expected_exit_time"] == visit.entry_time + timedelta(days=10)
+
+    def test_unknown_company_falls_back_to_size_and_state(
+        self, authenticated_api_client, company
+    ):
+        self._history(company, dwell_days=10)
+        self._history(CompanyFactory(), dwell_days=2)
+        DwellEstimatorService().refresh()
+        response = authenticated_api_client.get(
+            reverse("container_storage_expected_exit"),
+            {
+                "company_id": CompanyFactory().id,
+                "container_size": ContainerSize.TWENTY,
+                "container_state": ContainerState.LOADED,
+            },
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["expected_dwell_days"] == 6.0
+
+    def test_no_estimate_before_first_refresh(self, authenticated_api_client):
+        response = authenticated_api_client.get(
+            reverse("container_storage_expected_exit"),
+            {
+                "container_size": ContainerSize.TWENTY,
+                "container_state": ContainerState.LOADED,
+            },
+        )
+        assert response.data["expected_exit_time"] is None
+
+
+@pytest.mark.django_db
+class TestContainerOccupancy:
+    def _visit(self, company, size, entry_time, exit_time=None):
+        return ContainerStorageFactory(
+            container=ContainerFactory(size=size),
+            company=company,
+            entry_time=entry_time,
+            exit_time=exit_time,
+        )
+
+    def test_daily_series_counts_teu_at_each_midnight(
+        self, authenticated_api_client, company
+    ):
+        day = datetime(2024, 3, 1, tzinfo=dt_timezone.utc)
+        self._visit(company, ContainerSize.TWENTY, day, day + timedelta(days=2))
+        self._visit(
+            company,
+            ContainerSize.FORTY,
+            day + timedelta(days=1, hours=6),
+            day + timedelta(days=3, hours=12),
+        )
+        # Left before the range starts.
+        self._visit(company, ContainerSize.FORTY, day - timedelta(days=5), day)
+
+        response = authenticated_api_client.get(
+            reverse("container_storage_occupancy"),
+            {"date_from": "2024-03-01", "date_to": "2024-03-05"},
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data["points"]) == 5
+        assert response.data["total"] == [1, 1, 2, 2, 0]
+        assert response.data["groups"] == []
+
+    def test_groups_by_size_and_filters_by_company(
+        self, authenticated_api_client, company
+    ):
+        day = datetime(2024, 3, 1, tzinfo=dt_timezone.utc)
+        self._visit(company, ContainerSize.TWENTY, day - timedelta(days=1))
+        self._visit(company, ContainerSize.FORTY_HIGH_CUBE, day + timedelta(hours=1))
+        self._visit(CompanyFactory(), ContainerSize.TWENTY, day - timedelta(days=1))
+
+        response = authenticated_api_client.get(
+            reverse("container_storage_occupancy"),
+            {
+                "date_from": "2024-03-01",
+                "date_to": "2024-03-01",
+                "interval": "hour",
+                "group_by": "size",
+                "company_id": company.id,
+            },
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data["points"]) == 24
+        groups = {group["key"]: group["teu"] for group in response.data["groups"]}
+        assert groups["20"] == [1] * 24
+        assert groups["40HC"] == [0] + [2] * 23
+        assert response.data["total"][:3] == [1, 3, 3]
+
+    def test_rejects_reversed_range(self, authenticated_api_client):
+        response = authenticated_api_client.get(
+            reverse("container_storage_occupancy"),
+            {"date_from": "2024-03-02", "date_to": "2024-03-01"},
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestDwellStatistics:
+    def _finished(self, company, dwell_days, exit_time, size=ContainerSize.TWENTY):
+        return ContainerStorageFactory(
+            container=ContainerFactory(size=size),
+            company=company,
+            entry_time=exit_time - timedelta(days=dwell_days),
+            exit_time=exit_time,
+        )
+
+    def _get(self, client, **params):
+        return client.get(
+            reverse("container_storage_dwell_statistics"),
+            {"date_from": "2024-01-01", "date_to": "2024-02-29", **params},
+        )
+
+    def test_monthly_percentiles_per_size(self, authenticated_api_client, company):
+        exit_time = datetime(2024, 2, 10, tzinfo=dt_timezone.utc)
+        for dwell_days in range(1, 11):
+            self._finished(company, dwell_days, exit_time)
+        self._finished(company, 4, exit_time, size=ContainerSize.FORTY)
+        self._finished(CompanyFactory(), 30, exit_time)
+
+        response = self._get(authenticated_api_client, company_id=company.id)
+        assert response.status_code == status.HTTP_200_OK
+        january, february = response.data["months"]
+        assert january["sizes"] == []
+        assert february["month"] == "2024-02-01"
+        twenty, forty = february["sizes"]
+        assert twenty["container_size"] == ContainerSize.TWENTY
+        assert twenty["count"] == 10
+        assert (twenty["p50"], twenty["p90"], twenty["p99"]) == (5.5, 9.1, 9.91)
+        assert forty["count"] == 1
+        assert forty["p99"] == 4.0
+
+    def test_changed_visit_invalidates_its_month(
+        self, authenticated_api_client, company
+    ):
+        visit = self._finished(
+            company, 2, datetime(2024, 1, 10, tzinfo=dt_timezone.utc)
+        )
+        self._finished(company, 3, datetime(2024, 2, 10, tzinfo=dt_timezone.utc))
+        self._get(authenticated_api_client)
+
+        visit.entry_time = visit.exit_time - timedelta(days=6)
+        visit.save()
+        response = self._get(authenticated_api_client)
+        january, february = response.data["months"]
+        assert january["sizes"][0]["p50"] == 6.0
+        assert february["sizes"][0]["p50"] == 3.0
+
+    def test_rejects_reversed_range(self, authenticated_api_client):
+        response = self._get(authenticated_api_client, date_to="2023-12-01")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestFreeDaysWatchlist:
+    @pytest.fixture
+    def storage_contract(self, company):
+        service = TerminalService.objects.create(
+            name="Storage",
+            service_type=TerminalServiceType.objects.create(
+                name="Storage", unit_of_measure=MeasurementUnit.DAY
+            ),
+            container_size=ContainerSize.ANY,
+            container_state=ContainerState.ANY,
+            base_price=10,
+        )
+        combination = FreeDayCombination.objects.create(
+            container_size=ContainerSize.TWENTY,
+            container_state=ContainerState.LOADED,
+            category=ContainerCategory.IMPORT,
+        )
+        contract = CompanyContract.objects.create(
+            company=company,
+            name="Storage contract",
+            start_date="2024-01-01",
+            is_active=True,
+            free_days=3,
+        )
+        ContractFreeDay.objects.create(
+            contract=contract, free_day_combination=combination, free_days=5
+        )
+        ContractService.objects.create(contract=contract, service=service, price=12)
+        return contract
+
+    def _get(self, client, **params):
+        return client.get(reverse("container_storage_free_days_watchlist"), params)
+
+    def test_lists_overdue_visits_with_charges(
+        self, authenticated_api_client, company, storage_contract
+    ):
+        now = timezone.now()
+        overdue = ContainerStorageFactory(
+            company=company, entry_time=now - timedelta(days=9, hours=12)
+        )
+        # Export boxes fall back to the contract's own free days.
+        export = ContainerStorageFactory(
+            company=company,
+            category=ContainerCategory.EXPORT,
+            entry_time=now - timedelta(days=4, hours=1),
+        )
+        soon = ContainerStorageFactory(
+            company=company, entry_time=now - timedelta(days=3, hours=1)
+        )
+        ContainerStorageFactory(
+            company=company,
+            entry_time=now - timedelta(days=30),
+            exit_time=now - timedelta(days=1),
+        )
+        FreeDaysWatchlistService().refresh(now)
+
+        response = self._get(authenticated_api_client)
+        assert response.status_code == status.HTTP_200_OK
+        results = response.data["results"]
+        assert [result["visit_id"] for result in results] == [overdue.id, export.id]
+        assert results[0]["contract_id"] == storage_contract.id
+        assert (
+            results[0]["storage_days"],
+            results[0]["free_days"],
+            results[0]["overdue_days"],
+        ) == (10, 5, 5)
+        assert results[0]["accrued_charge"] == "60.00"
+        assert (results[1]["free_days"], results[1]["overdue_days"]) == (3, 2)
+
+        response = self._get(authenticated_api_client, within_days=2)
+        assert soon.id in [result["visit_id"] for result in response.data["results"]]
+
+    def test_dispatched_visits_leave_the_list_before_the_next_refresh(
+        self, authenticated_api_client, company, storage_contract
+    ):
+        visit = ContainerStorageFactory(
+            company=company, entry_time=timezone.now() - timedelta(days=20)
+        )
+        FreeDaysWatchlistService().refresh()
+        visit.exit_time = timezone.now()
+        visit.save()
+
+        response = self._get(authenticated_api_client, company_id=company.id)
+        assert response.data["results"] == []
+
+
+@pytest.mark.django_db
+class TestAvailableServices:
+    @pytest.fixture
+    def contract_services(self, company):
+        def create(name, size, state, multiple_usage=False):
+            return TerminalService.objects.create(
+                name=name,
+                container_size=size,
+                container_state=state,
+                base_price=10,
+                multiple_usage=multiple_usage,
+            )
+
+        services = [
+            create("Weighing", ContainerSize.TWENTY, ContainerState.LOADED),
+            create("Washing", ContainerSize.ANY, ContainerState.ANY, True),
+            create("Lashing", ContainerSize.FORTY, ContainerState.LOADED),
+        ]
+        contract = CompanyContract.objects.create(
+            company=company, name="Services", start_date="2024-01-01"
+        )
+        return [
+            ContractService.objects.create(
+                contract=contract, service=service, price=20 + index
+            )
+            for index, service in enumerate(services)
+        ]
+
+    def test_lists_applicable_services_without_used_one_time_ones(
+        self, authenticated_api_client, company, contract_services
+    ):
+        weighing, washing, _ = contract_services
+        visit = ContainerStorageFactory(company=company)
+        url = reverse("container_storage_available_services", args=[visit.id])
+
+        response = authenticated_api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert [service["id"] for service in response.data] == [washing.id, weighing.id]
+        assert response.data[1]["price"] == "20.00"
+
+        ContainerServiceInstance.objects.create(
+            container_storage=visit, contract_service=weighing
+        )
+        ContainerServiceInstance.objects.create(
+            container_storage=visit, contract_service=washing
+        )
+        response = authenticated_api_client.get(url)
+        assert [service["id"] for service in response.data] == [washing.id]
+
+    def test_bulk_answers_a_page_from_the_cached_matrix(
+        self, company, contract_services, django_assert_num_queries
+    ):
+        weighing, washing, lashing = contract_services
+        twenty = ContainerStorageFactory(company=company)
+        forty = ContainerStorageFactory(
+            company=company, container=ContainerFactory(size=ContainerSize.FORTY)
+        )
+        without_contract = ContainerStorageFactory()
+        visit_ids = [twenty.id, forty.id, without_contract.id]
+        service = ContainerStorageService()
+        service.get_available_services_bulk(visit_ids)
+
+        # Visits and their used services; contracts and services come from memory.
+        with django_assert_num_queries(2):
+            services = service.get_available_services_bulk(visit_ids)
+        assert [item["id"] for item in services[twenty.id]] == [
+            washing.id,
+            weighing.id,
+        ]
+        assert [item["id"] for item in services[forty.id]] == [lashing.id, washing.id]
+        assert services[without_contract.id] == []
+
+    def test_bulk_endpoint_keeps_request_order(
+        self, authenticated_api_client, company, contract_services
+    ):
+        visit_ids = [ContainerStorageFactory(company=company).id for _ in range(3)]
+        response = authenticated_api_client.get(
+            reverse("container_storage_available_services_bulk"),
+            {"visit_ids": visit_ids[::-1]},
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert [item["visit_id"] for item in response.data] == visit_ids[::-1]
+        assert len(response.data[0]["services"]) == 2
+
+    def test_price_change_invalidates_the_matrix(self, company, contract_services):
+        weighing = contract_services[0]
+        visit = ContainerStorageFactory(company=company)
+        service = ContainerStorageService()
+        service.get_available_services(visit.id)
+
+        weighing.price = 99
+        weighing.save()
+        services = service.get_available_services(visit.id)
+        assert [item["price"] for item in services if item["id"] == weighing.id] == [99]
+
+    def test_unknown_visit_in_bulk_is_rejected(self, authenticated_api_client):
+        response = authenticated_api_client.get(
+            reverse("container_storage_available_services_bulk"), {"visit_ids": [0]}
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestCompanyDashboard:
+    def test_dashboard_figures(self, authenticated_api_client, company):
+        now = timezone.now()
+        contract = CompanyContract.objects.create(
+            company=company, name="Dashboard", start_date="2024-01-01", free_days=2
+        )
+        overdue = ContainerStorageFactory(
+            company=company, entry_time=now - timedelta(days=10)
+        )
+        ContainerStorageFactory(
+            company=company,
+            container=ContainerFactory(size=ContainerSize.FORTY),
+            entry_time=now - timedelta(days=1),
+        )
+        ContainerStorageFactory(
+            company=company,
+            entry_time=now - timedelta(days=6),
+            exit_time=now - timedelta(days=2),
+        )
+        ContainerStorageFactory(entry_time=now - timedelta(days=1))
+        FreeDaysWatchlistService().refresh(now)
+
+        response = authenticated_api_client.get(
+            reverse("container_storage_company_dashboard", args=[company.id])
+        )
+        assert response.status_code == status.HTTP_200_OK
+        data = response.data
+        assert (data["in_terminal"], data["teu_in_terminal"]) == (2, 3)
+        assert (data["arrivals"], data["dispatches"]) == (3, 1)
+        assert data["average_dwell_days"] == 4.0
+        assert data["overdue"] == 1
+        assert overdue.watchlist_entry.overdue_days == 9
+        assert data["active_contract"]["id"] == contract.id
+
+    def test_dashboard_is_cached_until_a_visit_changes(
+        self, company, django_assert_num_queries
+    ):
+        visit = ContainerStorageFactory(company=company)
+        service = CompanyDashboardService()
+        assert service.get_dashboard(company.id)["in_terminal"] == 1
+        with django_assert_num_queries(0):
+            service.get_dashboard(company.id)
+
+        visit.exit_time = timezone.now()
+        visit.save()
+        with django_assert_num_queries(2):
+            assert service.get_dashboard(company.id)["in_terminal"] == 0
+
+
+@pytest.mark.django_db
+class TestContainerStorageBatch:
+    @pytest.fixture
+    def washing(self, company):
+        CompanyContract.objects.create(
+            company=company, name="Batch", start_date="2024-01-01"
+        )
+        return TerminalService.objects.create(
+            name="Washing",
+            container_size=ContainerSize.ANY,
+            container_state=ContainerState.ANY,
+            base_price=15,
+        )
+
+    def _post(self, client, **data):
+        return client.post(reverse("container_storage_batch"), data, format="json")
+
+    def test_assigns_services_and_reports_every_visit(
+        self, authenticated_api_client, company, washing
+    ):
+        first, second = ContainerStorageFactory.create_batch(2, company=company)
+        without_contract = ContainerStorageFactory()
+        ContainerServiceInstance.objects.create(
+            container_storage=second,
+            contract_service=ContractService.objects.create(
+                contract=company.contracts.get(), service=washing, price=15
+            ),
+        )
+
+        response = self._post(
+            authenticated_api_client,
+            visit_ids=[first.id, second.id, without_contract.id, 0],
+            action="assign_services",
+            services=[{"service_id": washing.id}],
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert [
+            (result["visit_id"], result["status"])
+            for result in response.data["results"]
+        ] == [
+            (first.id, "applied"),
+            # Washing is a one-time service.
+            (second.id, "skipped"),
+            (without_contract.id, "skipped"),
+            (0, "skipped"),
+        ]
+        assert first.services.get().contract_service.service == washing
+        assert second.services.count() == 1
+
+    def test_dispatch_keeps_counters_feed_and_stamps_in_line(
+        self,
+        authenticated_api_client,
+        company,
+        container_location,
+        django_capture_on_commit_callbacks,
+    ):
+        on_train = [
+            ContainerStorageFactory(
+                company=company,
+                container=container_location.container,
+                container_location=container_location,
+                transport_number="TRAIN1",
+            ),
+            ContainerStorageFactory(
+                company=company,
+                container=ContainerFactory(size=ContainerSize.FORTY),
+                transport_number="TRAIN1",
+            ),
+        ]
+        ContainerStorageFactory(company=company, transport_number="TRAIN2")
+        dashboard = CompanyDashboardService()
+        assert dashboard.get_dashboard(company.id)["in_terminal"] == 3
+
+        exit_time = timezone.now()
+        with django_capture_on_commit_callbacks(execute=True):
+            response = self._post(
+                authenticated_api_client,
+                filters={"transport_number": "TRAIN1", "status": "in_terminal"},
+                action="dispatch",
+                exit_time=exit_time.isoformat(),
+                exit_transport_type=TransportType.WAGON,
+                exit_transport_number="OUT1",
+            )
+        assert response.data["applied"] == 2
+        assert all(
+            visit.exit_time == exit_time
+            for visit in ContainerStorage.objects.filter(transport_number="TRAIN1")
+        )
+        company.refresh_from_db()
+        assert (company.visits_in_terminal, company.teu_in_terminal) == (1, 1)
+        assert company.last_activity_at == exit_time
+        assert YardChange.objects.filter(
+            container_location_id=container_location.id, action="dispatched"
+        ).exists()
+        assert dashboard.get_dashboard(company.id)["in_terminal"] == 1
+
+        response = self._post(
+            authenticated_api_client,
+            visit_ids=[on_train[0].id],
+            action="dispatch",
+            exit_time=exit_time.isoformat(),
+            exit_transport_type=TransportType.WAGON,
+            exit_transport_number="OUT1",
+        )
+        assert response.data["results"][0]["status"] == "skipped"
+
+    def test_patch_sets_fields_on_the_selection(
+        self, authenticated_api_client, company
+    ):
+        block = ContainerStorageFactory.create_batch(3, company=company, notes="")
+        response = self._post(
+            authenticated_api_client,
+            visit_ids=[visit.id for visit in block],
+            action="patch",
+            container_owner="New Owner",
+        )
+        assert response.data["applied"] == 3
+        assert set(
+            ContainerStorage.objects.values_list("container_owner", flat=True)
+        ) == {"New Owner"}
+
+        response = self._post(
+            authenticated_api_client, action="patch", container_owner="Nobody"
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
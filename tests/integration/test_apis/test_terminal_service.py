@@ -1,9 +1,16 @@
+import io
+from decimal import Decimal
+
 import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
+from openpyxl import Workbook
 from rest_framework import status
 
 from apps.core.choices import ContainerSize, ContainerState
 from apps.core.models import TerminalServiceType, TerminalService
+from apps.core.services.price_list import PriceListImportService
+from apps.customers.models import CompanyContract, ContractService
 
 
 @pytest.mark.django_db
@@ -140,3 +147,128 @@ class TestTerminalServiceAPI:
         response = api_client.delete(url)
         assert response.status_code == status.HTTP_204_NO_CONTENT
         assert not TerminalService.objects.filter(id=terminal_service.id).exists()
+
+
+@pytest.mark.django_db
+class TestPriceListImport:
+    HEADER = ["name", "container_size", "container_state", "base_price", "service_type"]
+
+    def _csv(self, rows, header=HEADER):
+        lines = [",".join(header)] + [",".join(map(str, row)) for row in rows]
+        return SimpleUploadedFile("prices.csv", "\n".join(lines).encode())
+
+    def _xlsx(self, rows):
+        workbook = Workbook()
+        workbook.active.append(self.HEADER)
+        for row in rows:
+            workbook.active.append(row)
+        content = io.BytesIO()
+        workbook.save(content)
+        return SimpleUploadedFile("prices.xlsx", content.getvalue())
+
+    def _post(self, client, file, **data):
+        return client.post(
+            reverse("terminal_service_import"),
+            {"file": file, **data},
+            format="multipart",
+        )
+
+    def test_upsert_moves_contract_rows_at_the_old_base_price(
+        self, api_client, company, terminal_service_type
+    ):
+        weighing = TerminalService.objects.create(
+            name="Weighing",
+            container_size="20",
+            container_state="loaded",
+            base_price=10,
+        )
+        washing = TerminalService.objects.create(
+            name="Washing", container_size="any", container_state="any", base_price=40
+        )
+        contract = CompanyContract.objects.create(
+            company=company, name="Prices", start_date="2024-01-01"
+        )
+        anchor = ContractService.objects.create(
+            contract=contract, service=weighing, price=10
+        )
+        override = ContractService.objects.create(
+            contract=contract, service=washing, price=35
+        )
+
+        response = self._post(
+            api_client,
+            self._csv(
+                [
+                    ["Weighing", 20, "LOADED", "12.5", terminal_service_type.name],
+                    ["Washing", "any", "any", 45, ""],
+                    ["Lashing", "40HC", "empty", 30, ""],
+                ]
+            ),
+        )
+        assert response.status_code == 200
+        assert (response.data["created"], response.data["updated"]) == (1, 2)
+
+        weighing.refresh_from_db()
+        assert weighing.base_price == Decimal("12.50")
+        assert weighing.service_type == terminal_service_type
+        assert TerminalService.objects.filter(
+            name="Lashing", container_size="40HC", container_state="empty"
+        ).exists()
+        anchor.refresh_from_db()
+        override.refresh_from_db()
+        assert anchor.price == Decimal("12.50")
+        assert list(anchor.prices.values_list("price", flat=True)) == [10, 12.5]
+        assert override.price == 35
+
+    def test_preview_and_unchanged_rows_write_nothing(self, api_client):
+        TerminalService.objects.create(
+            name="Weighing",
+            container_size="20",
+            container_state="loaded",
+            base_price=10,
+        )
+        response = self._post(
+            api_client,
+            self._xlsx([["Weighing", 20, "loaded", 10], ["Lashing", 40, "empty", 30]]),
+            preview=True,
+        )
+        assert response.data["unchanged"] == 1
+        assert [change["action"] for change in response.data["changes"]] == ["created"]
+        assert TerminalService.objects.count() == 1
+
+    def test_invalid_rows_are_reported_by_row(self, api_client):
+        response = self._post(
+            api_client,
+            self._csv(
+                [
+                    ["Weighing", 21, "loaded", 10, ""],
+                    ["Washing", "any", "any", "free", "Unknown"],
+                    ["Lashing", 40, "empty", 30, ""],
+                    ["Lashing", 40, "empty", 31, ""],
+                ]
+            ),
+        )
+        assert response.status_code == 400
+        errors = response.data["extra"]["fields"]["rows"]
+        assert {number: sorted(fields) for number, fields in errors.items()} == {
+            2: ["container_size"],
+            3: ["base_price", "service_type"],
+            5: ["name"],
+        }
+        assert not TerminalService.objects.exists()
+
+    def test_large_catalogue_imports_in_few_queries(
+        self, django_assert_max_num_queries
+    ):
+        rows = [
+            [f"Service {number}", size, state, number]
+            for number in range(400)
+            for size in ("20", "40")
+            for state in ("loaded", "empty")
+        ] + [[f"Service {number}", "any", "any", number] for number in range(400)]
+        file = self._csv(rows, header=self.HEADER[:4])
+        # SQLite caps the parameters of a statement, so batches are smaller there.
+        with django_assert_max_num_queries(30):
+            result = PriceListImportService().import_price_list(file)
+        assert result["created"] == 2000
+        assert TerminalService.objects.count() == 2000
@@ -0,0 +1,525 @@
+from datetime import timedelta
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from apps.containers.models import ContainerStorage
+from apps.core.choices import ContainerSize, ContainerState, YardChangeAction
+from apps.locations.models import Yard, YardChange, sequence_yard_changes
+from apps.locations.services import yard_change
+from apps.locations.services.yard import YardService
+from apps.locations.services.yard_capacity import YardCapacityService
+from apps.locations.services.yard_change import YardChangeService
+from apps.locations.services.yard_history import YardHistoryService
+from apps.locations.services.yard_snapshot import YardSnapshotService
+
+
+@pytest.mark.django_db
+class TestYardSnapshot:
+    url = reverse("yard_snapshot")
+
+    def test_snapshot_is_columnar(
+        self, authenticated_api_client, place_container, container_terminal_visit
+    ):
+        place_container("CONT0000001", row=2, column_start=3, tier=1, size="40")
+        response = authenticated_api_client.get(self.url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["companies"] == [
+            {
+                "id": container_terminal_visit.company_id,
+                "name": container_terminal_visit.company.name,
+            }
+        ]
+        locations = response.data["yards"][0]["locations"]
+        assert locations["row"] == [1, 2]
+        assert locations["column_end"] == [1, 4]
+        assert [response.data["sizes"][code] for code in locations["size"]] == [
+            ContainerSize.TWENTY,
+            ContainerSize.FORTY,
+        ]
+        assert locations["company"] == [0, None]
+        assert locations["dwell_days"][0] > 0
+        assert locations["dwell_days"][1] is None
+
+    def test_snapshot_is_built_with_fixed_queries(
+        self, django_assert_num_queries, place_container, company
+    ):
+        for row in range(1, 6):
+            location = place_container(f"CONT000000{row}", row, 1, tier=1)
+            ContainerStorage.objects.create(
+                container=location.container,
+                container_location=location,
+                company=company,
+                container_state=ContainerState.LOADED,
+            )
+        service = YardSnapshotService()
+        with django_assert_num_queries(4):
+            yards = service.get_yards()
+            service.get_snapshot(yards, service.get_tag(yards))
+        with django_assert_num_queries(1):
+            yards = service.get_yards()
+            service.get_snapshot(yards, service.get_tag(yards))
+
+    def test_matching_etag_returns_not_modified(
+        self, authenticated_api_client, container_location
+    ):
+        etag = authenticated_api_client.get(self.url)["ETag"]
+        response = authenticated_api_client.get(
+            self.url, HTTP_IF_NONE_MATCH=f"W/{etag}"
+        )
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_moving_a_container_changes_etag(
+        self, authenticated_api_client, container_location
+    ):
+        etag = authenticated_api_client.get(self.url)["ETag"]
+        container_location.row = 2
+        container_location.save()
+        response = authenticated_api_client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response["ETag"] != etag
+        assert response.data["yards"][0]["locations"]["row"] == [2]
+
+    def test_response_is_gzipped(self, authenticated_api_client, place_container):
+        for row in range(1, 6):
+            place_container(f"CONT000000{row}", row, 1, tier=1)
+        response = authenticated_api_client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+        assert response["Content-Encoding"] == "gzip"
+
+
+@pytest.mark.django_db
+class TestYardChangeFeed:
+    url = reverse("yard_change_list")
+
+    def test_changes_are_handed_out_once_committed(
+        self, place_container, django_capture_on_commit_callbacks
+    ):
+        since = YardChangeService().get_last_sequence()
+        with django_capture_on_commit_callbacks() as callbacks:
+            place_container("CONT0000001", row=1, column_start=1, tier=1)
+        # Not committed yet: a change with a lower id may still be on its way.
+        assert YardChangeService().get_changes(since) == []
+        assert YardChangeService().get_last_sequence() == since
+
+        for callback in callbacks:
+            callback()
+        changes = YardChangeService().get_changes(since)
+        assert len(changes) == 1
+        assert YardChangeService().get_last_sequence() == changes[0]["sequence"]
+
+    def test_sequence_follows_commit_order(self, place_container):
+        place_container("CONT0000001", row=1, column_start=1, tier=1)
+        sequence_yard_changes()
+        since = YardChangeService().get_last_sequence()
+        late = place_container("CONT0000002", row=2, column_start=1, tier=1)
+        # Committed after the first change went out, but with a lower id.
+        YardChange.objects.filter(container_location_id=late.id).update(id=0)
+        sequence_yard_changes()
+        changes = YardChangeService().get_changes(since)
+        assert [change["container_name"] for change in changes] == ["CONT0000002"]
+
+    def test_location_lifecycle_is_logged_in_order(
+        self, authenticated_api_client, place_container
+    ):
+        since = YardChangeService().get_last_sequence()
+        location = place_container("CONT0000001", row=1, column_start=1, tier=1)
+        location.refresh_from_db()
+        location.row = 2
+        location.save()
+        location.delete()
+        sequence_yard_changes()
+        response = authenticated_api_client.get(self.url, {"since": since})
+        assert response.status_code == status.HTTP_200_OK
+        changes = response.data["changes"]
+        assert [change["action"] for change in changes] == [
+            YardChangeAction.CREATED,
+            YardChangeAction.MOVED,
+            YardChangeAction.DELETED,
+        ]
+        assert changes[1]["row"] == 2
+        assert response.data["sequence"] == changes[-1]["sequence"]
+
+        response = authenticated_api_client.get(
+            self.url, {"since": response.data["sequence"], "wait": 1}
+        )
+        assert response.data["changes"] == []
+
+    def test_bulk_move_and_dispatch_are_logged(
+        self, authenticated_api_client, container_terminal_visit
+    ):
+        sequence_yard_changes()
+        since = YardChangeService().get_last_sequence()
+        authenticated_api_client.post(
+            reverse("container_location_bulk_move"),
+            [
+                {
+                    "container_id": container_terminal_visit.container_id,
+                    "row": 3,
+                    "column_start": 1,
+                    "tier": 1,
+                }
+            ],
+            format="json",
+        )
+        container_terminal_visit.refresh_from_db()
+        container_terminal_visit.exit_time = timezone.now()
+        container_terminal_visit.save()
+        sequence_yard_changes()
+        changes = YardChangeService().get_changes(since)
+        assert [(change["action"], change["row"]) for change in changes] == [
+            (YardChangeAction.MOVED, 3),
+            (YardChangeAction.DISPATCHED, 3),
+        ]
+
+    def test_move_to_another_yard_is_reported_to_both_yards(
+        self, container_location, yard
+    ):
+        sequence_yard_changes()
+        since = YardChangeService().get_last_sequence()
+        other_yard = Yard.objects.create(
+            name="Other Yard", max_rows=2, max_columns=2, max_tiers=2
+        )
+        container_location.yard = other_yard
+        container_location.save()
+        sequence_yard_changes()
+        for yard_id in (yard.id, other_yard.id):
+            changes = YardChangeService().get_changes(since, yard_id=yard_id)
+            assert [change["previous_yard_id"] for change in changes] == [yard.id]
+
+    def test_stream_resumes_from_last_event_id(
+        self, authenticated_api_client, place_container, monkeypatch
+    ):
+        monkeypatch.setattr(yard_change, "STREAM_LIFETIME", 0.05)
+        monkeypatch.setattr(yard_change, "POLL_INTERVAL", 0.01)
+        first = place_container("CONT0000001", row=1, column_start=1, tier=1)
+        place_container("CONT0000002", row=2, column_start=1, tier=1)
+        sequence_yard_changes()
+        last_event_id = YardChange.objects.get(container_location_id=first.id).sequence
+        response = authenticated_api_client.get(
+            reverse("yard_change_stream"),
+            HTTP_ACCEPT="text/event-stream",
+            HTTP_LAST_EVENT_ID=str(last_event_id),
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response["Content-Type"] == "text/event-stream"
+        body = b"".join(response.streaming_content).decode()
+        assert body.count("event: change") == 1
+        assert "CONT0000002" in body
+
+
+@pytest.mark.django_db
+class TestYardHistory:
+    def _backdate(self, location, at):
+        YardChange.objects.filter(container_location_id=location.id).update(
+            created_at=at
+        )
+
+    def test_yard_is_reconstructed_as_of_a_moment(
+        self, authenticated_api_client, place_container, yard
+    ):
+        now = timezone.now()
+        moved = place_container("CONT0000001", row=1, column_start=1, tier=1)
+        removed = place_container("CONT0000002", row=2, column_start=1, tier=1)
+        self._backdate(moved, now - timedelta(days=3))
+        self._backdate(removed, now - timedelta(days=3))
+        moved.refresh_from_db()
+        moved.row = 5
+        moved.save()
+        removed.delete()
+        url = reverse("yard_history", args=[yard.id])
+
+        response = authenticated_api_client.get(
+            url, {"at": (now - timedelta(days=1)).isoformat()}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert [
+            (location["container_name"], location["row"])
+            for location in response.data["locations"]
+        ] == [("CONT0000001", 1), ("CONT0000002", 2)]
+
+        response = authenticated_api_client.get(
+            url, {"at": (now + timedelta(minutes=1)).isoformat()}
+        )
+        assert [
+            (location["container_name"], location["row"])
+            for location in response.data["locations"]
+        ] == [("CONT0000001", 5)]
+
+    def test_reconstruction_starts_from_checkpoint(self, place_container, yard):
+        service = YardHistoryService()
+        first = place_container("CONT0000001", row=1, column_start=1, tier=1)
+        service.create_checkpoints()
+        # Deltas covered by the checkpoint are no longer needed.
+        YardChange.objects.all().delete()
+        second = place_container("CONT0000002", row=1, column_start=1, tier=2)
+        occupancy = service.get_yard_occupancy(yard.id, timezone.now())
+        assert [location["id"] for location in occupancy["locations"]] == [
+            first.id,
+            second.id,
+        ]
+
+    def test_position_before_any_change_comes_from_checkpoint(self, container_location):
+        # Like locations placed before the history began.
+        YardChange.objects.all().delete()
+        service = YardHistoryService()
+        (checkpoint,) = service.create_checkpoints()
+        name = container_location.container.name
+        position = service.get_container_position(name, timezone.now())["position"]
+        assert (position["yard_id"], position["row"]) == (container_location.yard_id, 1)
+        before = checkpoint.taken_at - timedelta(seconds=1)
+        assert service.get_container_position(name, before)["position"] is None
+
+    def test_checkpoint_position_is_one_query(
+        self, container_location, yard, django_assert_num_queries
+    ):
+        service = YardHistoryService()
+        other_yard = Yard.objects.create(
+            name="Other Yard", max_rows=2, max_columns=2, max_tiers=2
+        )
+        service.create_checkpoints()
+        # The container has left the yard of the older checkpoint since.
+        container_location.yard = other_yard
+        container_location.save()
+        service.create_checkpoints([other_yard])
+        with django_assert_num_queries(1):
+            position = service.get_checkpoint_position(
+                container_location.container_id, timezone.now()
+            )
+        assert position["yard_id"] == other_yard.id
+
+    def test_checkpoint_leaves_recent_changes_to_replay(self, place_container, yard):
+        location = place_container("CONT0000001", row=1, column_start=1, tier=1)
+        (checkpoint,) = YardHistoryService().create_checkpoints()
+        sequence_yard_changes()
+        change = YardChange.objects.get(container_location_id=location.id)
+        assert checkpoint.last_sequence < change.sequence
+        assert checkpoint.taken_at >= change.created_at
+
+    def test_container_position_as_of_a_moment(
+        self, authenticated_api_client, container_location
+    ):
+        now = timezone.now()
+        self._backdate(container_location, now - timedelta(days=3))
+        container_location.refresh_from_db()
+        container_location.row = 4
+        container_location.save()
+        url = reverse("container_position_history")
+        params = {"container_name": container_location.container.name}
+
+        response = authenticated_api_client.get(
+            url, {**params, "at": (now - timedelta(days=1)).isoformat()}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["position"]["row"] == 1
+
+        response = authenticated_api_client.get(
+            url, {**params, "at": (now - timedelta(days=5)).isoformat()}
+        )
+        assert response.data["position"] is None
+
+
+@pytest.mark.django_db
+class TestYardReconciliation:
+    url = reverse("yard_reconcile")
+
+    def _scan(self, yard, name, row, column_start=1, tier=1):
+        return {
+            "container_name": name,
+            "yard_id": yard.id,
+            "row": row,
+            "column_start": column_start,
+            "tier": tier,
+        }
+
+    def _visit(self, location, company):
+        return ContainerStorage.objects.create(
+            container=location.container,
+            container_location=location,
+            company=company,
+            container_state=ContainerState.LOADED,
+        )
+
+    def test_scan_is_classified(
+        self, authenticated_api_client, place_container, company, yard
+    ):
+        in_place = place_container("CONT0000001", row=1, column_start=1, tier=1)
+        moved = place_container("CONT0000002", row=2, column_start=1, tier=1)
+        place_container("CONT0000003", row=3, column_start=1, tier=1)
+        for location in (in_place, moved):
+            self._visit(location, company)
+        data = {
+            "yard_ids": [yard.id],
+            "items": [
+                self._scan(yard, "CONT0000001", row=1),
+                self._scan(yard, "CONT0000002", row=4),
+                self._scan(yard, "UNKN0000001", row=5),
+            ],
+        }
+        response = authenticated_api_client.post(self.url, data, format="json")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["summary"] == {
+            "missing": 1,
+            "unexpected": 1,
+            "misplaced": 1,
+            "orphaned": 1,
+            "visit_mismatches": 0,
+        }
+        assert response.data["missing"][0]["container_name"] == "CONT0000003"
+        assert response.data["orphaned"][0]["container_name"] == "CONT0000003"
+        assert response.data["unexpected"][0]["reason"] == "unknown_container"
+        assert response.data["misplaced"][0]["observed"]["row"] == 4
+        assert response.data["applied"] is False
+
+    def test_misplaced_containers_are_moved_on_apply(
+        self, authenticated_api_client, place_container, company, yard
+    ):
+        moved = place_container("CONT0000001", row=2, column_start=1, tier=1)
+        self._visit(moved, company)
+        data = {
+            "items": [self._scan(yard, "CONT0000001", row=4, column_start=3)],
+            "apply": True,
+        }
+        response = authenticated_api_client.post(self.url, data, format="json")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["applied"] is True
+        moved.refresh_from_db()
+        assert (moved.row, moved.column_start) == (4, 3)
+
+    def test_visit_pointing_at_another_container_is_flagged(
+        self, authenticated_api_client, place_container, company, yard
+    ):
+        first = place_container("CONT0000001", row=1, column_start=1, tier=1)
+        second = place_container("CONT0000002", row=2, column_start=1, tier=1)
+        visit = self._visit(first, company)
+        self._visit(second, company)
+        ContainerStorage.objects.filter(id=visit.id).update(container=second.container)
+        data = {
+            "items": [
+                self._scan(yard, "CONT0000001", row=1),
+                self._scan(yard, "CONT0000002", row=2),
+            ]
+        }
+        response = authenticated_api_client.post(self.url, data, format="json")
+        assert response.data["visit_mismatches"] == [
+            {
+                "visit_id": visit.id,
+                "visit_container_name": "CONT0000002",
+                "location_id": first.id,
+                "location_container_name": "CONT0000001",
+            }
+        ]
+
+    def test_container_scanned_twice_is_rejected(self, authenticated_api_client, yard):
+        data = {
+            "items": [
+                self._scan(yard, "CONT0000001", row=1),
+                self._scan(yard, "CONT0000001", row=2),
+            ]
+        }
+        response = authenticated_api_client.post(self.url, data, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestSpatialQueries:
+    def test_stacks_within_radius(self, authenticated_api_client, yard):
+        response = authenticated_api_client.get(
+            reverse("spatial_stacks"), {"x": 3.05, "z": 1.3, "radius": 1}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert [(stack["row"], stack["column"]) for stack in response.data] == [(1, 1)]
+
+    def test_index_is_rebuilt_when_yard_moves(self, authenticated_api_client, yard):
+        url = reverse("spatial_yards")
+        params = {"min_x": 500, "min_z": 500, "max_x": 510, "max_z": 510}
+        assert authenticated_api_client.get(url, params).data == []
+
+        YardService().update(
+            yard.id,
+            {"x_coordinate": 520.0, "z_coordinate": 490.0, "rotation_degree": 90},
+        )
+        # Rotated by 90 degrees the yard extends towards negative x.
+        response = authenticated_api_client.get(url, params)
+        assert response.data == [{"yard_id": yard.id}]
+
+    def test_yards_within_radius_measure_to_the_footprint(
+        self, authenticated_api_client, yard
+    ):
+        response = authenticated_api_client.get(
+            reverse("spatial_yards"), {"x": 34.4, "z": 10, "radius": 12}
+        )
+        assert response.data[0]["yard_id"] == yard.id
+        assert response.data[0]["distance"] == pytest.approx(10.0)
+
+    def test_query_needs_a_complete_area(self, authenticated_api_client, yard):
+        response = authenticated_api_client.get(
+            reverse("spatial_stacks"), {"x": 1, "z": 1}
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestYardHeatmap:
+    def test_bays_aggregate_dwell_and_height(
+        self, authenticated_api_client, place_container, company, yard
+    ):
+        now = timezone.now()
+        bottom = place_container("CONT0000001", row=1, column_start=1, tier=1)
+        top = place_container("CONT0000002", row=1, column_start=1, tier=2, size="40")
+        for location, days in ((bottom, 10), (top, 4)):
+            ContainerStorage.objects.create(
+                container=location.container,
+                container_location=location,
+                company=company,
+                container_state=ContainerState.LOADED,
+                entry_time=now - timedelta(days=days),
+            )
+        response = authenticated_api_client.get(reverse("yard_heatmap", args=[yard.id]))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["stack_height"][0][:3] == [2, 2, 0]
+        assert response.data["avg_dwell_days"][0][:3] == [7.0, 4.0, None]
+        assert response.data["max_dwell_days"][0][:3] == [10, 4, None]
+        assert len(response.data["stack_height"]) == yard.max_rows
+
+    def test_heatmap_is_rebuilt_after_a_move(
+        self, authenticated_api_client, container_location, yard
+    ):
+        url = reverse("yard_heatmap", args=[yard.id])
+        assert authenticated_api_client.get(url).data["stack_height"][0][0] == 1
+        container_location.refresh_from_db()
+        container_location.row = 2
+        container_location.save()
+        response = authenticated_api_client.get(url)
+        assert response.data["stack_height"][0][0] == 0
+        assert response.data["stack_height"][1][0] == 1
+
+
+@pytest.mark.django_db
+class TestYardCapacity:
+    url = reverse("yard_capacity")
+
+    def test_free_slots_per_size_class(
+        self, authenticated_api_client, place_container, yard
+    ):
+        place_container("CONT0000001", row=1, column_start=1, tier=1)
+        place_container("CONT0000002", row=1, column_start=2, tier=1)
+        place_container("CONT0000003", row=2, column_start=2, tier=1, size="40")
+        response = authenticated_api_client.get(self.url)
+        assert response.status_code == status.HTTP_200_OK
+        capacity = response.data["yards"][0]
+        assert capacity["teu_capacity"] == 400
+        assert capacity["teu_used"] == 4
+        assert capacity["utilisation"] == 1.0
+        # Row 2 keeps a single free cell on either side of the 40ft box.
+        assert capacity["free_ground_slots"] == {"20": 36, "40": 17}
+        assert capacity["free_stackable_slots"] == {"20": 4, "40": 2}
+        assert response.data["totals"]["free_ground_slots"]["40"] == 17
+
+    def test_summary_is_cached_briefly(
+        self, authenticated_api_client, django_assert_num_queries, yard
+    ):
+        YardCapacityService().get_summary()
+        with django_assert_num_queries(0):
+            YardCapacityService().get_summary()